@@ -11,12 +11,14 @@ import json
 API_URL = "http://localhost:8000"  # Change to your production URL
 API_KEY = "YOUR_SECRET_API_KEY_HERE"
 
-def submit_batch(users_data):
+def submit_batch(users_data, callback_url=None):
     """
     Submit a batch of users for card recommendations
     
     Args:
         users_data: List of user spending data
+        callback_url: Optional URL that receives a signed POST when the job finishes
+                      (see webhook_receiver_example.py), instead of polling
         
     Returns:
         job_id for tracking the request
@@ -30,6 +32,8 @@ def submit_batch(users_data):
         "users": users_data,
         "top_n_cards": 10
     }
+    if callback_url:
+        payload["callback_url"] = callback_url
     
     response = requests.post(
         f"{API_URL}/api/v1/recommendations",
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+API Keys, Quotas and Usage for the CardGenius API Server
+
+Each API key belongs to a named client with:
+    weight                Share of upstream CardGenius request slots under contention
+    max_active_jobs       Jobs queued or running at once (None = unlimited)
+    requests_per_minute   API requests per minute (None = unlimited)
+    debug                 May use the /api/v1/debug profiling endpoints (default: false)
+
+Keys are read from the JSON file in CARDGENIUS_API_KEYS_FILE:
+    {"keys": [
+        {"name": "nightly-bulk", "key": "...", "weight": 1, "max_active_jobs": 2},
+        {"name": "analysts", "key": "...", "weight": 4, "requests_per_minute": 600},
+        {"name": "ops", "key": "...", "debug": true}
+    ]}
+Without it, the single CARDGENIUS_API_KEY is used as client "default", which
+gets debug access when CARDGENIUS_DEBUG_ENDPOINTS=1.
+"""
+
+import json
+import os
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ApiClient:
+    """One API key with its quotas and usage counters"""
+
+    def __init__(self, name: str, key: str, weight: float = 1.0,
+                 max_active_jobs: Optional[int] = None, requests_per_minute: Optional[float] = None,
+                 debug: bool = False):
+        self.name = name
+        self.key = key
+        self.weight = float(weight)
+        self.max_active_jobs = max_active_jobs
+        self.requests_per_minute = requests_per_minute
+        self.debug = debug
+        self.active_jobs = 0
+        self.usage: Dict[str, int] = {
+            'requests': 0,
+            'jobs_submitted': 0,
+            'users_submitted': 0,
+            'upstream_calls': 0,
+            'rejected_rate_limit': 0,
+            'rejected_concurrency': 0
+        }
+        self._lock = threading.Lock()
+        self._tokens = float(requests_per_minute or 0)
+        self._refilled = time.monotonic()
+
+    def allow_request(self) -> Tuple[bool, int]:
+        """
+        Count one API request against the rate quota (token bucket, one minute burst)
+
+        Returns:
+            (allowed, retry_after_seconds)
+        """
+        with self._lock:
+            self.usage['requests'] += 1
+            if not self.requests_per_minute:
+                return True, 0
+            now = time.monotonic()
+            rate = self.requests_per_minute / 60.0
+            self._tokens = min(float(self.requests_per_minute), self._tokens + (now - self._refilled) * rate)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True, 0
+            self.usage['rejected_rate_limit'] += 1
+            return False, max(1, int((1 - self._tokens) / rate + 0.999))
+
+    def try_start_job(self, users: int, active_jobs: Optional[int] = None) -> bool:
+        """
+        Reserve an active-job slot; False when max_active_jobs is reached
+
+        Args:
+            users: Users in the job
+            active_jobs: Jobs the client has in a shared job queue, counted instead of
+                this process's own slots (they are released by the worker processes)
+        """
+        with self._lock:
+            active = self.active_jobs if active_jobs is None else active_jobs
+            if self.max_active_jobs is not None and active >= self.max_active_jobs:
+                self.usage['rejected_concurrency'] += 1
+                return False
+            if active_jobs is None:
+                self.active_jobs += 1
+            self.usage['jobs_submitted'] += 1
+            self.usage['users_submitted'] += users
+            return True
+
+    def finish_job(self):
+        """Release an active-job slot"""
+        with self._lock:
+            self.active_jobs = max(0, self.active_jobs - 1)
+
+    def count_upstream_call(self):
+        with self._lock:
+            self.usage['upstream_calls'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Quotas and usage counters for reporting"""
+        with self._lock:
+            return {
+                'client': self.name,
+                'weight': self.weight,
+                'max_active_jobs': self.max_active_jobs,
+                'requests_per_minute': self.requests_per_minute,
+                'active_jobs': self.active_jobs,
+                'usage': dict(self.usage)
+            }
+
+
+class ApiKeyRegistry:
+    """Looks up clients by API key"""
+
+    def __init__(self, clients: List[ApiClient]):
+        self._by_key = {client.key: client for client in clients}
+        self._by_name = {client.name: client for client in clients}
+
+    @classmethod
+    def from_env(cls, default_key: str) -> "ApiKeyRegistry":
+        """Clients from CARDGENIUS_API_KEYS_FILE, or a single 'default' client for default_key"""
+        path = os.getenv("CARDGENIUS_API_KEYS_FILE")
+        if not path:
+            return cls([ApiClient("default", default_key, debug=os.getenv("CARDGENIUS_DEBUG_ENDPOINTS") == "1")])
+
+        with open(path, 'r') as f:
+            entries = json.load(f)['keys']
+        clients = [ApiClient(
+            entry['name'],
+            entry['key'],
+            weight=entry.get('weight', 1.0),
+            max_active_jobs=entry.get('max_active_jobs'),
+            requests_per_minute=entry.get('requests_per_minute'),
+            debug=bool(entry.get('debug', False))
+        ) for entry in entries]
+        logger.info(f"Loaded {len(clients)} API keys from {path}")
+        return cls(clients)
+
+    def authenticate(self, key: Optional[str]) -> Optional[ApiClient]:
+        """Client for an API key, or None if the key is unknown"""
+        return self._by_key.get(key) if key else None
+
+    def get(self, name: str) -> Optional[ApiClient]:
+        return self._by_name.get(name)
+
+    def clients(self) -> List[ApiClient]:
+        return list(self._by_name.values())
@@ -5,19 +5,40 @@ Provides API endpoints for batch card recommendations
 """
 
 import os
-from fastapi import FastAPI, HTTPException, Header, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Dict, Optional, Any
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Dict, Optional, Any, Tuple
 import uuid
 import json
+import hashlib
+import base64
 import os
+import time
+import threading
+import asyncio
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import anyio
 from datetime import datetime
-import pandas as pd
 from cardgenius_batch_runner import CardGeniusBatchRunner
 from cardgenius_batch_runner_v2 import CardGeniusBatchRunnerV2
-import tempfile
+from job_executor import JobProgress, QueueFullError
+from job_runtime import (API_KEY, MAX_CONCURRENT_JOBS, WARMUP_ENABLED, UserSpendingData, build_runner_config,
+                         create_job_runtime, user_records)
+from recommend_cache import RecommendationCache
+from result_retention import FINISHED_STATUSES, RetentionSweeper, output_retention_settings
+from webhooks import validate_callback_url
+from api_keys import ApiClient
+from response_archive import canonical_payload_hash
+from diagnostics import EventLoopLagMonitor, HeapTracker, sample_stacks
+from health import desired_workers, memory_usage, users_per_second
+from result_formats import (MIN_COMPRESS_BYTES, RESULT_FORMATS, ResultFormatError, compress, encode_results,
+                            negotiate_encoding, project_rows)
+from bulk_ingest import (SPEND_COLUMNS, BulkUploadError, UploadTooLargeError, count_users, detect_format,
+                         spool_upload)
 import logging
 
 # Configure logging
@@ -27,11 +48,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up before uvicorn starts accepting requests, and watch event-loop lag while serving"""
+    if WARMUP_ENABLED:
+        await run_in_threadpool(warm_up)
+    loop_lag_monitor.start()
+    yield
+    await loop_lag_monitor.stop()
+
 # CORS middleware for production
 app = FastAPI(
     title="CardGenius Recommendations API",
     description="Batch credit card recommendations API supporting both V1 (full output) and V2 (simplified output) formats",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -43,28 +74,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# API Key from environment variable (production) or fallback
-API_KEY = os.getenv("CARDGENIUS_API_KEY", "cgapi_2025_secure_key_12345")
+# Job store, executor, queue, upstream budget, API keys and webhooks; job_worker.py
+# processes build the same runtime to run queued jobs (see job_runtime.py)
+jobs = create_job_runtime()
+api_keys = jobs.api_keys
+job_store = jobs.job_store
+job_executor = jobs.job_executor
+job_queue = jobs.job_queue
+upstream_budget = jobs.upstream_budget
+upstream_circuit = jobs.upstream_circuit
+upstream_session = jobs.upstream_session
+
+# Live progress and cancellation signals of jobs queued or running in this process
+live_progress = jobs.live_progress
+job_cancellations = jobs.job_cancellations
+
+# Bulk uploads: streamed to a spool file, then processed in chunks (job_runtime.BULK_CHUNK_SIZE)
+BULK_MAX_BYTES = int(os.getenv("CARDGENIUS_BULK_MAX_BYTES", 1024 * 1024 * 1024))
+BULK_SPOOL_DIR = os.getenv("CARDGENIUS_BULK_DIR")
+
+# Result retention: finished jobs expire after a TTL, old dashboard output files are removed
+RESULT_TTL = float(os.getenv("CARDGENIUS_RESULT_TTL", 86400))
+OUTPUT_TTL, OUTPUT_MAX_BYTES = output_retention_settings()
+retention_sweeper = RetentionSweeper(
+    job_store,
+    job_ttl_seconds=RESULT_TTL,
+    interval_seconds=float(os.getenv("CARDGENIUS_RETENTION_INTERVAL", 300)),
+    output_dir=os.getenv("CARDGENIUS_OUTPUT_DIR", "."),
+    output_ttl_seconds=OUTPUT_TTL,
+    output_max_bytes=OUTPUT_MAX_BYTES
+)
+retention_sweeper.start()
+
+# Synchronous single-user endpoint: shared runners and result cache
+RECOMMEND_CACHE_SIZE = int(os.getenv("CARDGENIUS_RECOMMEND_CACHE_SIZE", 10000))
+RECOMMEND_CACHE_TTL = float(os.getenv("CARDGENIUS_RECOMMEND_CACHE_TTL", 3600))
+recommend_cache = RecommendationCache(max_entries=RECOMMEND_CACHE_SIZE, ttl_seconds=RECOMMEND_CACHE_TTL)
+RECOMMEND_RUNNERS_MAX = int(os.getenv("CARDGENIUS_RECOMMEND_RUNNERS", 32))
+recommend_runners: OrderedDict = OrderedDict()
+recommend_runners_lock = threading.Lock()
+
+# Largest top_n_cards a request may ask for
+MAX_TOP_N_CARDS = int(os.getenv("CARDGENIUS_MAX_TOP_N_CARDS", 50))
 
-# Job storage (in-memory for now, can be moved to Redis/DB later)
-jobs = {}
-results_storage = {}
+# Repeated submissions: Idempotency-Key lifetime and identical-payload deduplication window
+IDEMPOTENCY_TTL = float(os.getenv("CARDGENIUS_IDEMPOTENCY_TTL", 86400))
+DEDUP_WINDOW = float(os.getenv("CARDGENIUS_DEDUP_WINDOW", 600))
 
-class UserSpendingData(BaseModel):
-    """User spending data model"""
-    user_id: str
-    avg_amazon_gmv: Optional[float] = 0
-    avg_flipkart_gmv: Optional[float] = 0
-    avg_myntra_gmv: Optional[float] = 0
-    avg_ajio_gmv: Optional[float] = 0
-    avg_confirmed_gmv: Optional[float] = 0
-    avg_grocery_gmv: Optional[float] = 0
+# Batch status/results requests: job ids per request and result rows per response
+BATCH_MAX_JOBS = int(os.getenv("CARDGENIUS_BATCH_MAX_JOBS", 1000))
+BATCH_RESULTS_MAX_ROWS = int(os.getenv("CARDGENIUS_BATCH_RESULTS_MAX_ROWS", 20000))
+
+# Debug endpoints (keys with debug access): profiler limits, heap snapshots, event-loop lag
+PROFILE_MAX_SECONDS = float(os.getenv("CARDGENIUS_PROFILE_MAX_SECONDS", 60))
+profile_lock = threading.Lock()
+heap_tracker = HeapTracker(frames=int(os.getenv("CARDGENIUS_TRACEMALLOC_FRAMES", 10)))
+loop_lag_monitor = EventLoopLagMonitor()
+
+# Readiness and scaling: memory budget (default: the container limit), backlog drain target
+MEMORY_BUDGET_BYTES = int(os.getenv("CARDGENIUS_MEMORY_BUDGET_BYTES", 0)) or None
+MEMORY_READY_FRACTION = float(os.getenv("CARDGENIUS_MEMORY_READY_FRACTION", 0.9))
+SCALE_TARGET_SECONDS = float(os.getenv("CARDGENIUS_SCALE_TARGET_SECONDS", 600))
+SCALE_MIN_WORKERS = int(os.getenv("CARDGENIUS_SCALE_MIN_WORKERS", 1))
+SCALE_MAX_WORKERS = int(os.getenv("CARDGENIUS_SCALE_MAX_WORKERS", 0)) or None
+
+# Queue mode: worker upstream reports older than this are ignored (job_worker.py --stale-after)
+WORKER_STALE_SECONDS = float(os.getenv("CARDGENIUS_WORKER_STALE_SECONDS", 60))
 
 class BatchRecommendationRequest(BaseModel):
     """Batch recommendation request model"""
     users: List[UserSpendingData]
-    top_n_cards: Optional[int] = 10
+    top_n_cards: int = Field(10, ge=1, le=MAX_TOP_N_CARDS)
     version: Optional[str] = "v1"  # "v1" or "v2"
+    callback_url: Optional[str] = None  # POSTed a signed notification when the job finishes
+    fields: Optional[List[str]] = None  # Per-card fields to compute, e.g. ["card_name", "net_savings"] (default: all)
+
+class SingleRecommendationRequest(UserSpendingData):
+    """Synchronous single-user recommendation request"""
+    top_n_cards: int = Field(10, ge=1, le=MAX_TOP_N_CARDS)
+    version: Optional[str] = "v1"  # "v1" or "v2"
+
+class BatchJobsRequest(BaseModel):
+    """Several jobs of the calling client, e.g. the 200-user jobs of one large run"""
+    job_ids: List[str]
+
+class BatchResultsRequest(BatchJobsRequest):
+    """Results of several jobs in one response"""
+    top: Optional[int] = None
+    fields: Optional[List[str]] = None
+    format: str = "json"
 
 class JobResponse(BaseModel):
     """Job creation response"""
@@ -73,6 +171,8 @@ class JobResponse(BaseModel):
     total_users: int
     version: str
     message: str
+    queue_position: Optional[int] = None
+    duplicate: bool = False  # True when an earlier identical submission's job is returned
 
 class StatusResponse(BaseModel):
     """Job status response"""
@@ -84,146 +184,262 @@ class StatusResponse(BaseModel):
     failed: int
     progress_percentage: float
     version: str
+    queue_position: Optional[int] = None
+    rate_per_second: Optional[float] = None
+    eta_seconds: Optional[float] = None
 
 def verify_api_key(x_api_key: str = Header(...)):
     """Verify API key"""
-    if x_api_key != API_KEY:
+    return authenticate(x_api_key).key
+
+def authenticate(api_key: Optional[str]) -> ApiClient:
+    """Client for the API key, enforcing its request rate quota"""
+    client = api_keys.authenticate(api_key)
+    if client is None:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    return x_api_key
+    
+    allowed, retry_after = client.allow_request()
+    if not allowed:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded for client '{client.name}'",
+            headers={"Retry-After": str(retry_after)}
+        )
+    return client
 
-def process_batch(job_id: str, users: List[UserSpendingData], top_n_cards: int, version: str = "v1"):
-    """Process batch of users in background"""
-    try:
-        logger.info(f"Starting job {job_id} with {len(users)} users using {version}")
-        
-        # Update job status
-        jobs[job_id]['status'] = 'processing'
-        jobs[job_id]['started_at'] = datetime.now().isoformat()
-        jobs[job_id]['processed_users'] = 0
-        jobs[job_id]['version'] = version
-        
-        # Convert users to DataFrame
-        user_data = []
-        for user in users:
-            user_data.append({
-                'userid': user.user_id,
-                'avg_amazon_gmv': user.avg_amazon_gmv or 0,
-                'avg_flipkart_gmv': user.avg_flipkart_gmv or 0,
-                'avg_myntra_gmv': user.avg_myntra_gmv or 0,
-                'avg_ajio_gmv': user.avg_ajio_gmv or 0,
-                'avg_confirmed_gmv': user.avg_confirmed_gmv or 0,
-                'avg_grocery_gmv': user.avg_grocery_gmv or 0
-            })
-        
-        df = pd.DataFrame(user_data)
-        
-        # Create temporary files
-        temp_input = f"temp_job_{job_id}_input.xlsx"
-        temp_output = f"temp_job_{job_id}_output.xlsx"
-        temp_config = f"temp_job_{job_id}_config.json"
-        
-        # Save input data
-        df.to_excel(temp_input, index=False)
-        
-        # Create config
-        config = {
-            "api": {
-                "base_url": "https://card-recommendation-api-v2.bankkaro.com/cg/api/pro",
-                "timeout": 30,
-                "sleep_between_requests": 1.2,
-                "max_retries": 3
-            },
-            "excel": {
-                "input_file": temp_input,
-                "output_file": temp_output,
-                "sheet_name": 0
-            },
-            "column_mappings": {
-                "user_id": "userid",
-                "amazon_spends": "avg_amazon_gmv",
-                "flipkart_spends": "avg_flipkart_gmv",
-                "myntra": "avg_myntra_gmv",
-                "ajio": "avg_ajio_gmv",
-                "avg_gmv": "avg_confirmed_gmv",
-                "grocery": "avg_grocery_gmv"
-            },
-            "processing": {
-                "top_n_cards": top_n_cards,
-                "extract_spend_keys": [
-                    "amazon_spends",
-                    "flipkart_spends",
-                    "grocery_spends_online",
-                    "other_online_spends"
-                ],
-                "skip_empty_rows": True,
-                "continue_on_error": True,
-                "other_online_mode": "sum_components"
-            }
-        }
-        
-        with open(temp_config, 'w') as f:
-            json.dump(config, f, indent=2)
-        
-        # Process using appropriate batch runner based on version
-        if version == "v2":
-            runner = CardGeniusBatchRunnerV2(temp_config)
-        else:
-            runner = CardGeniusBatchRunner(temp_config)
-        output_file = runner.process_excel()
-        
-        # Read results
-        result_df = pd.read_excel(output_file)
-        
-        # Replace NaN values appropriately based on column type
-        # For string columns, replace NaN with empty string
-        string_columns = result_df.select_dtypes(include=['object']).columns
-        for col in string_columns:
-            result_df[col] = result_df[col].fillna('')
-        
-        # For numeric columns, replace NaN with 0
-        numeric_columns = result_df.select_dtypes(include=['number']).columns
-        for col in numeric_columns:
-            result_df[col] = result_df[col].fillna(0)
-        
-        # Convert to JSON
-        results = result_df.to_dict('records')
-        
-        # Store results
-        results_storage[job_id] = results
-        
-        # Update job status
-        jobs[job_id]['status'] = 'completed'
-        jobs[job_id]['completed_at'] = datetime.now().isoformat()
-        jobs[job_id]['processed_users'] = len(users)
-        jobs[job_id]['successful'] = len([r for r in results if not r.get('cardgenius_error')])
-        jobs[job_id]['failed'] = len([r for r in results if r.get('cardgenius_error')])
-        
-        # Cleanup temp files
-        try:
-            os.unlink(temp_input)
-            os.unlink(temp_config)
-            # Keep output file for download
-        except:
-            pass
-        
-        logger.info(f"Job {job_id} completed successfully")
-        
-    except Exception as e:
-        logger.error(f"Job {job_id} failed: {e}", exc_info=True)
-        jobs[job_id]['status'] = 'failed'
-        jobs[job_id]['error'] = str(e)
-        jobs[job_id]['completed_at'] = datetime.now().isoformat()
-        
-        # Cleanup temp files on error
+def get_owned_job(job_id: str, client: ApiClient) -> Dict[str, Any]:
+    """Job record if it exists and belongs to the client, else 404"""
+    job = job_store.get_job(job_id)
+    if job is None or job.get('client', client.name) != client.name:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+async def check_callback_url(url: str):
+    """Reject a callback_url that could not be delivered: no webhook secret on the server, or not a public http(s) URL"""
+    if not jobs.webhook_notifier.secret:
+        raise HTTPException(status_code=400,
+                            detail="callback_url is not available: the server has no CARDGENIUS_WEBHOOK_SECRET")
+    # Resolving the host can block
+    if not await run_in_threadpool(validate_callback_url, url, jobs.webhook_notifier.allowed_hosts):
+        raise HTTPException(status_code=400, detail="callback_url must be an absolute http(s) URL of a public host")
+
+def request_fingerprint(client: ApiClient, *parts: Any) -> str:
+    """SHA-256 of a client's canonical request content, used to spot repeated submissions"""
+    canonical = json.dumps([client.name, *parts], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def find_existing_job(client: ApiClient, job_id: str, fingerprint: str,
+                      idempotency_key: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Earlier job for a repeated submission, or None once job_id has claimed it
+    
+    The Idempotency-Key (kept for IDEMPOTENCY_TTL) and the payload fingerprint
+    (kept for DEDUP_WINDOW) are claimed in the job store, so retries on other
+    workers see them too. A claim left by a job that no longer exists, failed
+    or did not finish is taken over and the submission runs again.
+    """
+    claims = []
+    if idempotency_key:
+        claims.append((f"idempotency:{client.name}:{idempotency_key}", IDEMPOTENCY_TTL, True))
+    if DEDUP_WINDOW > 0:
+        claims.append((f"payload:{client.name}:{fingerprint}", DEDUP_WINDOW, False))
+    
+    value = f"{job_id} {fingerprint}"
+    claimed = []
+    for name, ttl, same_request_required in claims:
+        stale = None
+        while True:
+            held = job_store.claim_key(name, value, ttl, stale=stale)
+            if held is None:
+                claimed.append((name, ttl))
+                break
+            existing_id, existing_fingerprint = held.split(' ', 1)
+            if same_request_required and existing_fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            existing = job_store.get_job(existing_id)
+            if existing is not None and existing['status'] not in ('failed', 'cancelled'):
+                # Point claims already taken for job_id at the existing job instead
+                for claimed_name, claimed_ttl in claimed:
+                    job_store.claim_key(claimed_name, held, claimed_ttl, stale=value)
+                return existing
+            stale = held
+    return None
+
+def duplicate_job_response(job: Dict[str, Any]) -> JobResponse:
+    """Response for a resubmission that was matched to an earlier job"""
+    job_id = job['job_id']
+    if job['status'] == 'completed':
+        message = f"Identical request already completed. Results are available at /api/v1/results/{job_id}"
+    else:
+        message = f"Identical request already submitted. Use /api/v1/status/{job_id} to check progress"
+    logger.info(f"Returning existing job {job_id} for a repeated submission")
+    return JobResponse(
+        job_id=job_id,
+        status=job['status'],
+        total_users=job['total_users'],
+        version=job.get('version', 'v1'),
+        message=message,
+        queue_position=queue_position(job_id) if job['status'] == 'queued' else None,
+        duplicate=True
+    )
+
+# Columns of every result row besides the per-card ones
+BASE_RESULT_COLUMNS = ['userid', *SPEND_COLUMNS, 'cardgenius_error']
+
+# Per-card output fields of each version, filled on first use
+card_field_names: Dict[str, List[str]] = {}
+
+def card_fields(version: str) -> List[str]:
+    """Per-card result fields of an output version, without the topN_ prefix"""
+    fields = card_field_names.get(version)
+    if fields is None:
+        runner_class = CardGeniusBatchRunnerV2 if version == "v2" else CardGeniusBatchRunner
+        columns = runner_class(build_runner_config(1))._build_result_columns()
+        fields = card_field_names.setdefault(version, [column[len("top1_"):] for column in columns
+                                                       if column.startswith("top1_")])
+    return fields
+
+def parse_fields(fields: Any, version: str, allowed_columns: Optional[List[str]] = None) -> Optional[List[str]]:
+    """
+    Validated field names from a comma-separated string or a list, or None for all fields
+    
+    Raises:
+        HTTPException: 400 for names that are neither per-card fields of the version nor allowed_columns
+    """
+    if fields is None:
+        return None
+    names = [name.strip() for name in (fields.split(',') if isinstance(fields, str) else fields) if name.strip()]
+    if not names:
+        return None
+    
+    known = set(card_fields(version)) | set(allowed_columns or [])
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields for {version}: {', '.join(unknown)}. Available: {', '.join(card_fields(version))}"
+        )
+    return list(dict.fromkeys(names))
+
+def queue_position(job_id: str) -> Optional[int]:
+    """Position of a waiting job in the job queue, or in this process's executor"""
+    if job_queue is not None:
+        return job_queue.position(job_id)
+    return job_executor.queue_position(job_id)
+
+def retry_after() -> int:
+    """Seconds a client rejected for a full queue or an exhausted quota should wait"""
+    return job_queue.retry_after() if job_queue is not None else job_executor.retry_after()
+
+def queue_saturated() -> bool:
+    """True when no more jobs can be queued"""
+    stats = job_queue.stats() if job_queue is not None else job_executor.stats()
+    return stats['queued_jobs'] >= stats['max_queued_jobs']
+
+def try_start_client_job(client: ApiClient, users: int) -> bool:
+    """Reserve one of the client's active-job slots, counted across worker processes in queue mode"""
+    if job_queue is not None:
+        return client.try_start_job(users, active_jobs=job_queue.active_jobs(client.name))
+    return client.try_start_job(users)
+
+def enqueue_batch_job(job_id: str, users: List[UserSpendingData], top_n_cards: int, version: str,
+                      client: ApiClient, fields: Optional[List[str]] = None) -> int:
+    """
+    Queue a batch job for a worker process, or on this process's executor
+    
+    Returns:
+        1-based queue position
+    
+    Raises:
+        QueueFullError: when the queue is full
+    """
+    if job_queue is not None:
+        return job_queue.enqueue(job_id, 'batch', {
+            'users': [user.model_dump() for user in users],
+            'top_n_cards': top_n_cards,
+            'version': version,
+            'fields': fields
+        }, client=client.name)
+    return job_executor.submit(job_id, jobs.process_batch, job_id, users, top_n_cards, version, client, fields)
+
+def dequeue_job(job_id: str) -> bool:
+    """Remove a job that has not started yet; False when it is already running"""
+    if job_queue is None:
+        return job_executor.cancel(job_id)
+    
+    entry = job_queue.cancel(job_id)
+    if entry is None:
+        return False
+    if entry['kind'] == 'bulk':
         try:
-            if 'temp_input' in locals():
-                os.unlink(temp_input)
-            if 'temp_config' in locals():
-                os.unlink(temp_config)
-            if 'temp_output' in locals() and os.path.exists(temp_output):
-                os.unlink(temp_output)
-        except:
-            pass
+            os.remove(entry['payload']['spool_path'])
+        except OSError as e:
+            logger.warning(f"Could not remove bulk spool file of job {job_id}: {e}")
+    return True
+
+def cancel_job(job: Dict[str, Any]) -> str:
+    """
+    Ask a queued or running job to stop
+    
+    A queued job is removed from the executor or job queue at once. A running job finishes
+    the upstream request in flight, stops before the next user (giving up any
+    wait for an upstream slot) and ends as 'cancelled'.
+    
+    Returns:
+        'cancelled', or 'cancelling' while a running job drains
+    """
+    job_id = job['job_id']
+    job_store.update_job(job_id, cancel_requested=True)
+    cancel_event = job_cancellations.get(job_id)
+    if cancel_event is not None:
+        cancel_event.set()
+    
+    if dequeue_job(job_id):
+        # Never started, so process_batch will not release the client's slot or notify
+        job_cancellations.pop(job_id, None)
+        client = api_keys.get(job.get('client', 'default'))
+        if client is not None:
+            client.finish_job()
+        jobs.finish_cancelled_job(job_id)
+        jobs.notify_job_finished(job_id)
+        return 'cancelled'
+    return 'cancelling'
+
+def build_status(job: Dict[str, Any], progress: Optional[JobProgress] = None) -> StatusResponse:
+    """
+    Status of a stored job, using live counters when it runs in this process
+    
+    Pass the job's live_progress entry when it was looked up before the job was
+    read: looked up afterwards, it is gone for a job that finished in between,
+    and the status would fall back to the older flushed counters.
+    """
+    job_id = job['job_id']
+    
+    # Prefer live counters when the job runs in this process, else the last flushed ones
+    progress = progress or live_progress.get(job_id)
+    if progress is not None and job['status'] == 'processing':
+        job = {**job, **progress.snapshot()}
+    elif job.get('bulk') and job['status'] == 'processing' and job.get('started_at'):
+        # Bulk jobs aggregate several chunks: average rate since the first chunk started
+        elapsed = (datetime.now() - datetime.fromisoformat(job['started_at'])).total_seconds()
+        rate = job.get('processed_users', 0) / elapsed if elapsed > 0 else 0.0
+        remaining = max(job['total_users'] - job.get('processed_users', 0), 0)
+        job['rate_per_second'] = round(rate, 3)
+        job['eta_seconds'] = round(remaining / rate, 1) if rate > 0 else None
+    
+    return StatusResponse(
+        job_id=job_id,
+        status=job['status'],
+        total_users=job['total_users'],
+        processed_users=job.get('processed_users', 0),
+        successful=job.get('successful', 0),
+        failed=job.get('failed', 0),
+        progress_percentage=(job.get('processed_users', 0) / job['total_users'] * 100) if job['total_users'] > 0 else 0,
+        version=job.get('version', 'v1'),
+        queue_position=queue_position(job_id) if job['status'] == 'queued' else None,
+        rate_per_second=job.get('rate_per_second') if job['status'] == 'processing' else None,
+        eta_seconds=job.get('eta_seconds') if job['status'] == 'processing' else None
+    )
 
 @app.get("/")
 async def root():
@@ -236,6 +452,99 @@ async def root():
         "description": "Supports both V1 (full output) and V2 (simplified output) recommendation formats"
     }
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and its event loop answers"""
+    return {"status": "ok"}
+
+def upstream_check() -> Dict[str, Any]:
+    """
+    CardGenius circuit as seen by the processes that call it
+    
+    In queue mode only the workers do, so their reported circuits are used:
+    not ok once every worker that reported recently has its circuit open.
+    """
+    if job_queue is None:
+        circuit = upstream_circuit.snapshot()
+        return {"ok": circuit['state'] != 'open', "source": "api_server", **circuit}
+    
+    reports = job_queue.upstream_reports(WORKER_STALE_SECONDS)
+    open_workers = sorted(worker for worker, circuit in reports.items() if circuit['state'] == 'open')
+    errors = [reports[worker]['last_error'] for worker in open_workers if reports[worker].get('last_error')]
+    return {
+        "ok": not reports or len(open_workers) < len(reports),
+        "source": "workers",
+        "workers": len(reports),
+        "open_workers": open_workers,
+        "last_error": errors[0] if errors else None
+    }
+
+def readiness_checks() -> Dict[str, Dict[str, Any]]:
+    """Each readiness condition with its measurements and whether it passes"""
+    queue_stats = job_queue.stats() if job_queue is not None else job_executor.stats()
+    memory = memory_usage(MEMORY_BUDGET_BYTES)
+    return {
+        "job_queue": {
+            "ok": not queue_saturated(),
+            "queued_jobs": queue_stats['queued_jobs'],
+            "max_queued_jobs": queue_stats['max_queued_jobs']
+        },
+        "upstream": upstream_check(),
+        "memory": {
+            "ok": memory['fraction'] is None or memory['fraction'] < MEMORY_READY_FRACTION,
+            **memory,
+            "max_fraction": MEMORY_READY_FRACTION
+        }
+    }
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: 503 while the job queue is full, the CardGenius circuit is open
+    or memory is above CARDGENIUS_MEMORY_READY_FRACTION of its budget
+    """
+    checks = await run_in_threadpool(readiness_checks)
+    ready = all(check['ok'] for check in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
+
+def scaling_signal() -> Dict[str, Any]:
+    """Desired worker count from the unprocessed users of active jobs and the measured throughput"""
+    counts = {status: job_store.count_jobs(status) for status in ('queued', 'processing')}
+    active_jobs = sum(counts.values())
+    backlog_users = 0
+    for status, count in counts.items():
+        if not count:
+            continue
+        for job in job_store.list_jobs(status=status, limit=count):
+            progress = live_progress.get(job['job_id'])
+            processed = progress.processed if progress is not None else job.get('processed_users', 0)
+            backlog_users += max(job['total_users'] - processed, 0)
+    
+    # Throughput of recent jobs, per job slot
+    rate = users_per_second(job_store.list_jobs(status='completed', limit=50))
+    return {
+        "desired_workers": desired_workers(
+            backlog_users, active_jobs, MAX_CONCURRENT_JOBS, rate, SCALE_TARGET_SECONDS,
+            min_workers=SCALE_MIN_WORKERS, max_workers=SCALE_MAX_WORKERS
+        ),
+        "backlog_users": backlog_users,
+        "active_jobs": active_jobs,
+        "users_per_second_per_job": round(rate, 3) if rate else None,
+        "jobs_per_worker": MAX_CONCURRENT_JOBS,
+        "target_seconds": SCALE_TARGET_SECONDS
+    }
+
+@app.get("/scaling")
+async def scaling():
+    """
+    Autoscaling signal: desired_workers processes (each running CARDGENIUS_MAX_CONCURRENT_JOBS
+    jobs) finish the queued and running users within CARDGENIUS_SCALE_TARGET_SECONDS
+    """
+    return await run_in_threadpool(scaling_signal)
+
 @app.get("/api/v1/versions")
 async def get_version_info():
     """Get information about supported API versions"""
@@ -254,22 +563,26 @@ async def get_version_info():
 @app.post("/api/v1/recommendations", response_model=JobResponse)
 async def create_recommendation_job(
     request: BatchRecommendationRequest,
-    background_tasks: BackgroundTasks,
-    api_key: str = Header(None, alias="X-API-Key")
+    api_key: str = Header(None, alias="X-API-Key"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Create a new batch recommendation job
     
+    Resubmitting the same request (same Idempotency-Key, or identical users,
+    top_n_cards and version within the deduplication window) returns the
+    existing job instead of creating a new one.
+    
     Args:
         request: Batch recommendation request with user spending data
         X-API-Key: API key for authentication
+        Idempotency-Key: Optional client-chosen key identifying this submission
         
     Returns:
         Job ID and status
     """
     # Verify API key
-    if api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    client = authenticate(api_key)
     
     # Validate request
     if not request.users:
@@ -282,10 +595,29 @@ async def create_recommendation_job(
     if request.version not in ["v1", "v2"]:
         raise HTTPException(status_code=400, detail="Version must be 'v1' or 'v2'")
     
-    # Create job
+    if request.callback_url:
+        await check_callback_url(request.callback_url)
+    
+    fields = parse_fields(request.fields, request.version)
+    
+    # Retried or repeated submissions get the existing job
     job_id = str(uuid.uuid4())
+    fingerprint = request_fingerprint(client, user_records(request.users), request.top_n_cards, request.version,
+                                      fields)
+    existing = find_existing_job(client, job_id, fingerprint, idempotency_key)
+    if existing is not None:
+        return duplicate_job_response(existing)
+    
+    # Per-client concurrency quota
+    if not try_start_client_job(client, len(request.users)):
+        raise HTTPException(
+            status_code=429,
+            detail=f"Client '{client.name}' already has {client.max_active_jobs} active jobs",
+            headers={"Retry-After": str(retry_after())}
+        )
     
-    jobs[job_id] = {
+    # Create job
+    job_store.create_job({
         'job_id': job_id,
         'status': 'queued',
         'total_users': len(request.users),
@@ -293,19 +625,26 @@ async def create_recommendation_job(
         'successful': 0,
         'failed': 0,
         'version': request.version,
+        'fields': fields,
+        'client': client.name,
+        'callback_url': request.callback_url,
         'created_at': datetime.now().isoformat(),
         'started_at': None,
         'completed_at': None
-    }
+    })
     
-    # Schedule background processing
-    background_tasks.add_task(
-        process_batch,
-        job_id,
-        request.users,
-        request.top_n_cards,
-        request.version
-    )
+    # Schedule on the job queue or executor; reject with 429 when it is full
+    try:
+        position = enqueue_batch_job(job_id, request.users, request.top_n_cards, request.version, client, fields)
+    except QueueFullError as e:
+        client.finish_job()
+        job_store.delete_job(job_id)
+        logger.warning(f"Rejected job with {len(request.users)} users: queue full")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queued jobs, please retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     
     logger.info(f"Created job {job_id} with {len(request.users)} users")
     
@@ -314,7 +653,237 @@ async def create_recommendation_job(
         status="queued",
         total_users=len(request.users),
         version=request.version,
-        message=f"Job created successfully using {request.version}. Use /api/v1/status/{job_id} to check progress"
+        message=f"Job created successfully using {request.version}. Use /api/v1/status/{job_id} to check progress",
+        queue_position=position
+    )
+
+def recommend_runner(version: str, top_n_cards: int, client: ApiClient):
+    """
+    Long-lived runner for the synchronous endpoint, one per client, version and top-N
+    
+    At most RECOMMEND_RUNNERS_MAX runners are kept; the least recently used one is dropped first.
+    """
+    key = (client.name, version, top_n_cards)
+    with recommend_runners_lock:
+        runner = recommend_runners.get(key)
+        if runner is not None:
+            recommend_runners.move_to_end(key)
+            return runner
+    
+    runner = jobs.create_runner(version, top_n_cards, client=client)
+    with recommend_runners_lock:
+        runner = recommend_runners.setdefault(key, runner)
+        recommend_runners.move_to_end(key)
+        while len(recommend_runners) > RECOMMEND_RUNNERS_MAX:
+            recommend_runners.popitem(last=False)
+    return runner
+
+def warm_up():
+    """Load what the first requests would otherwise wait for"""
+    started = time.perf_counter()
+    
+    # pandas, the card registry and a pooled connection to CardGenius
+    jobs.warm_up()
+    
+    # Runners of the synchronous endpoint for every client at the default top-N
+    for client in api_keys.clients():
+        for version in ("v1", "v2"):
+            recommend_runner(version, 10, client)
+    
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+@app.post("/api/v1/recommend")
+async def recommend(
+    request: SingleRecommendationRequest,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Get recommendations for one user inline, without creating a job
+    
+    Results are cached in-process by canonical payload, so repeated spend
+    profiles are served without calling CardGenius, and concurrent identical
+    requests share a single upstream call.
+    
+    Args:
+        request: One user's spending data plus top_n_cards and version
+        X-API-Key: API key for authentication
+        
+    Returns:
+        The user's result row in the v1 or v2 shape
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    # Validate version
+    if request.version not in ["v1", "v2"]:
+        raise HTTPException(status_code=400, detail="Version must be 'v1' or 'v2'")
+    
+    record = user_records([request])[0]
+    runner = recommend_runner(request.version, request.top_n_cards, client)
+    payload = runner.prepare_record_payload(record)
+    cache_key = f"{request.version}:{request.top_n_cards}:{canonical_payload_hash(payload)}"
+    
+    # Fast path on the event loop; misses go to the threadpool with singleflight
+    result = recommend_cache.get(cache_key)
+    cached = result is not None
+    if not cached:
+        def compute():
+            response = runner._call_cardgenius_api(payload, request.user_id)
+            return runner.build_record_result(response, request.user_id) if response else None
+        
+        try:
+            result, cached = await run_in_threadpool(recommend_cache.get_or_compute, cache_key, compute)
+        except Exception as e:
+            logger.error(f"Recommendation failed for user {request.user_id}: {e}")
+            result = None
+        if result is None:
+            raise HTTPException(status_code=502, detail="CardGenius API call failed")
+    
+    # Plain JSON rows: skip FastAPI's generic encoder, which dominates the cached-path latency
+    return JSONResponse({
+        "user_id": request.user_id,
+        "version": request.version,
+        "cached": cached,
+        "result": {**record, **result}
+    })
+
+@app.post("/api/v1/bulk-recommendations", response_model=JobResponse)
+async def create_bulk_recommendation_job(
+    request: Request,
+    top_n_cards: int = Query(10, ge=1, le=MAX_TOP_N_CARDS),
+    version: str = "v1",
+    format: Optional[str] = None,
+    callback_url: Optional[str] = None,
+    fields: Optional[str] = None,
+    api_key: str = Header(None, alias="X-API-Key"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """
+    Create a recommendation job from a large CSV, NDJSON or Parquet upload
+    
+    The request body is the raw file (not multipart). It is streamed to disk,
+    split into chunks of 200 users and processed on the shared job executor;
+    the returned job is polled and read like any other job.
+    
+    Args:
+        request: Raw upload with columns user_id and the avg_*_gmv spend fields
+        top_n_cards: Number of cards per user
+        version: "v1" or "v2" output format
+        format: csv, ndjson or parquet (default: from Content-Type)
+        callback_url: Optional URL notified with a signed POST when the job finishes
+        fields: Comma-separated per-card fields to compute (default: all)
+        X-API-Key: API key for authentication
+        Idempotency-Key: Optional client-chosen key identifying this submission
+        
+    Returns:
+        Job ID and status (the existing job for a repeated upload)
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    # Validate version
+    if version not in ["v1", "v2"]:
+        raise HTTPException(status_code=400, detail="Version must be 'v1' or 'v2'")
+    
+    if callback_url:
+        await check_callback_url(callback_url)
+    
+    output_fields = parse_fields(fields, version)
+    
+    # Reject before reading the upload when the queue is already saturated
+    if queue_saturated():
+        raise HTTPException(
+            status_code=429,
+            detail="Too many queued jobs, please retry later",
+            headers={"Retry-After": str(retry_after())}
+        )
+    
+    try:
+        upload_format = detect_format(request.headers.get('content-type'), format)
+        spool_path, size, upload_digest = await spool_upload(request.stream(), BULK_SPOOL_DIR, BULK_MAX_BYTES)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BulkUploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # Retried or repeated uploads get the existing job
+    job_id = str(uuid.uuid4())
+    fingerprint = request_fingerprint(client, upload_digest, upload_format, top_n_cards, version, output_fields)
+    existing = find_existing_job(client, job_id, fingerprint, idempotency_key)
+    if existing is not None:
+        os.remove(spool_path)
+        return duplicate_job_response(existing)
+    
+    try:
+        total_users = await run_in_threadpool(count_users, spool_path, upload_format)
+    except BulkUploadError as e:
+        os.remove(spool_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if total_users == 0:
+        os.remove(spool_path)
+        raise HTTPException(status_code=400, detail="No users provided")
+    
+    # Per-client concurrency quota (a bulk job counts as one active job)
+    if not try_start_client_job(client, total_users):
+        os.remove(spool_path)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Client '{client.name}' already has {client.max_active_jobs} active jobs",
+            headers={"Retry-After": str(retry_after())}
+        )
+    
+    # Create the parent job; chunks add their counters and results to it
+    job_store.create_job({
+        'job_id': job_id,
+        'status': 'queued',
+        'total_users': total_users,
+        'processed_users': 0,
+        'successful': 0,
+        'failed': 0,
+        'version': version,
+        'fields': output_fields,
+        'client': client.name,
+        'bulk': True,
+        'chunks_completed': 0,
+        'callback_url': callback_url,
+        'created_at': datetime.now().isoformat(),
+        'started_at': None,
+        'completed_at': None
+    })
+    
+    if job_queue is None:
+        await run_in_threadpool(jobs.start_bulk_job, job_id, spool_path, upload_format, top_n_cards, version, client,
+                                output_fields)
+    else:
+        # A worker process reads the spool file, so it must be on a path they share
+        try:
+            position = job_queue.enqueue(job_id, 'bulk', {
+                'spool_path': os.path.abspath(spool_path),
+                'format': upload_format,
+                'top_n_cards': top_n_cards,
+                'version': version,
+                'fields': output_fields
+            }, client=client.name)
+        except QueueFullError as e:
+            client.finish_job()
+            job_store.delete_job(job_id)
+            os.remove(spool_path)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many queued jobs, please retry later",
+                headers={"Retry-After": str(e.retry_after)}
+            )
+    
+    logger.info(f"Created bulk job {job_id} with {total_users} users from a {size} byte {upload_format} upload")
+    
+    return JobResponse(
+        job_id=job_id,
+        status="queued",
+        total_users=total_users,
+        version=version,
+        message=f"Bulk job created successfully using {version}. Use /api/v1/status/{job_id} to check progress",
+        queue_position=position if job_queue is not None else None
     )
 
 @app.get("/api/v1/status/{job_id}", response_model=StatusResponse)
@@ -333,93 +902,641 @@ async def get_job_status(
         Job status and progress
     """
     # Verify API key
-    if api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    client = authenticate(api_key)
     
     # Check if job exists
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
+    progress = live_progress.get(job_id)
+    job = get_owned_job(job_id, client)
     
-    job = jobs[job_id]
-    
-    return StatusResponse(
-        job_id=job_id,
-        status=job['status'],
-        total_users=job['total_users'],
-        processed_users=job.get('processed_users', 0),
-        successful=job.get('successful', 0),
-        failed=job.get('failed', 0),
-        progress_percentage=(job.get('processed_users', 0) / job['total_users'] * 100) if job['total_users'] > 0 else 0,
-        version=job.get('version', 'v1')
-    )
+    return build_status(job, progress)
 
 @app.get("/api/v1/results/{job_id}")
 async def get_job_results(
     job_id: str,
-    api_key: str = Header(None, alias="X-API-Key")
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    top: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    format: str = Query("json"),
+    api_key: str = Header(None, alias="X-API-Key"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
 ):
     """
-    Get results of a completed recommendation job
+    Get results of a completed recommendation job (or the partial results of a cancelled one)
     
     Args:
         job_id: Job ID returned from create_recommendation_job
+        offset: Index of the first result row to return
+        limit: Maximum number of result rows (default: all remaining)
+        top: Only return the first `top` ranked cards of each user
+        fields: Comma-separated per-card fields (card_name, net_savings, ...) or columns
+            (avg_amazon_gmv, ...) to return; userid and cardgenius_error are always included
+        format: json (list of per-user objects), columnar (one array per column),
+            msgpack (columnar as MessagePack) or arrow (Arrow IPC stream)
         X-API-Key: API key for authentication
+        Accept-Encoding: br or gzip compresses the response
         
     Returns:
-        Recommendation results for all users
+        Recommendation results for the requested page of users
     """
     # Verify API key
-    if api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    client = authenticate(api_key)
     
-    # Check if job exists
-    if job_id not in jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
+    if format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESULT_FORMATS)}")
     
-    job = jobs[job_id]
+    # Check if job exists
+    job = get_owned_job(job_id, client)
+    fields = parse_fields(fields, job.get('version', 'v1'), BASE_RESULT_COLUMNS)
     
     # Check if job is completed
-    if job['status'] != 'completed':
+    if job['status'] not in ('completed', 'cancelled'):
         raise HTTPException(
             status_code=400,
             detail=f"Job is not completed yet. Current status: {job['status']}"
         )
     
     # Get results
-    if job_id not in results_storage:
+    results = job_store.get_results(job_id, offset, limit)
+    if not results and offset == 0 and job['total_users'] > 0:
         raise HTTPException(status_code=404, detail="Results not found")
     
-    return {
+    # Unrequested columns are dropped before serialization
+    results = project_rows(results, top, fields)
+    
+    # A cancelled job only has rows for the users processed (or skipped) before it stopped
+    available = job['total_users'] if job['status'] == 'completed' else job_store.count_results(job_id)
+    next_offset = offset + len(results)
+    # Rows are read up to the first missing position: flag a page cut short by a hole
+    expected = max(available - offset, 0) if limit is None else min(limit, max(available - offset, 0))
+    partial = len(results) < expected
+    envelope = {
         "job_id": job_id,
-        "status": "completed",
+        "status": job['status'],
         "version": job.get('version', 'v1'),
         "total_users": job['total_users'],
         "successful": job['successful'],
         "failed": job['failed'],
-        "results": results_storage[job_id]
+        "offset": offset,
+        "next_offset": next_offset if (limit is not None or partial) and next_offset < available else None,
+        "partial": partial
+    }
+    
+    return await encoded_response(envelope, results, format, accept_encoding)
+
+async def encoded_response(envelope: Dict[str, Any], rows: List[Dict[str, Any]], format: str,
+                           accept_encoding: Optional[str]) -> Response:
+    """Result rows serialized in format and compressed as the client accepts, off the event loop"""
+    try:
+        body = await run_in_threadpool(encode_results, envelope, rows, format)
+    except ResultFormatError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = negotiate_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding:
+        body = await run_in_threadpool(compress, body, encoding)
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=RESULT_FORMATS[format], headers=headers)
+
+def owned_jobs(job_ids: List[str], client: ApiClient) -> Dict[str, Dict[str, Any]]:
+    """
+    Stored records of the client's jobs among job_ids, in request order
+    
+    Raises:
+        HTTPException: 400 for an empty list or more than BATCH_MAX_JOBS ids
+    """
+    job_ids = list(dict.fromkeys(job_ids))
+    if not job_ids or len(job_ids) > BATCH_MAX_JOBS:
+        raise HTTPException(status_code=400, detail=f"job_ids must list between 1 and {BATCH_MAX_JOBS} jobs")
+    
+    found = job_store.get_jobs(job_ids)
+    return {job_id: found[job_id] for job_id in job_ids
+            if job_id in found and found[job_id].get('client', client.name) == client.name}
+
+@app.post("/api/v1/status:batch")
+async def get_batch_status(
+    request: BatchJobsRequest,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Status of many jobs in one call, with totals across them
+    
+    Args:
+        request: job_ids of the calling client (at most BATCH_MAX_JOBS)
+        X-API-Key: API key for authentication
+        
+    Returns:
+        Per-job status keyed by job_id, unknown job ids, and a summary with
+        job counts by status and user counters summed over the found jobs
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    jobs = await run_in_threadpool(owned_jobs, request.job_ids, client)
+    
+    statuses = {}
+    summary = {"jobs": len(jobs), "by_status": {}, "total_users": 0, "processed_users": 0,
+               "successful": 0, "failed": 0}
+    for job_id, job in jobs.items():
+        status = build_status(job).model_dump(exclude_none=True)
+        del status['job_id']
+        statuses[job_id] = status
+        summary['by_status'][status['status']] = summary['by_status'].get(status['status'], 0) + 1
+        for counter in ('total_users', 'processed_users', 'successful', 'failed'):
+            summary[counter] += status[counter]
+    
+    summary['progress_percentage'] = (
+        round(summary['processed_users'] / summary['total_users'] * 100, 2) if summary['total_users'] else 0
+    )
+    summary['finished'] = all(status['status'] in FINISHED_STATUSES for status in statuses.values())
+    
+    return {
+        "jobs": statuses,
+        "not_found": [job_id for job_id in dict.fromkeys(request.job_ids) if job_id not in jobs],
+        "summary": summary
+    }
+
+@app.post("/api/v1/results:batch")
+async def get_batch_results(
+    request: BatchResultsRequest,
+    api_key: str = Header(None, alias="X-API-Key"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
+    """
+    Results of many finished jobs in one response
+    
+    Rows of completed and cancelled jobs are concatenated in request order,
+    each with its job_id, up to BATCH_RESULTS_MAX_ROWS rows; jobs that did
+    not fit are listed under "remaining" for the next call.
+    
+    Args:
+        request: job_ids, plus top, fields and format as for /api/v1/results
+        X-API-Key: API key for authentication
+        Accept-Encoding: br or gzip compresses the response
+        
+    Returns:
+        Result rows and the job ids that are included, pending, failed,
+        remaining, too large for one response or not found
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    if request.format not in RESULT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(RESULT_FORMATS)}")
+    if request.top is not None and request.top < 1:
+        raise HTTPException(status_code=400, detail="top must be at least 1")
+    
+    jobs = await run_in_threadpool(owned_jobs, request.job_ids, client)
+    
+    # Fields may name per-card fields of any version among the jobs
+    versions = sorted({job.get('version', 'v1') for job in jobs.values()}) or ['v1']
+    allowed = BASE_RESULT_COLUMNS + [field for version in versions for field in card_fields(version)]
+    fields = parse_fields(request.fields, versions[0], allowed)
+    
+    envelope = {"included": [], "pending": [], "failed": {}, "remaining": [], "too_large": [], "partial": [],
+                "not_found": [job_id for job_id in dict.fromkeys(request.job_ids) if job_id not in jobs]}
+    
+    # A cancelled job only has the rows stored before it stopped, counted as for /api/v1/results
+    available = await run_in_threadpool(lambda: {
+        job_id: job['total_users'] if job['status'] == 'completed' else job_store.count_results(job_id)
+        for job_id, job in jobs.items() if job['status'] in ('completed', 'cancelled')
+    })
+    
+    selected = []
+    budget = BATCH_RESULTS_MAX_ROWS
+    for job_id, job in jobs.items():
+        if job['status'] == 'failed':
+            envelope['failed'][job_id] = job.get('error')
+            continue
+        if job['status'] not in ('completed', 'cancelled'):
+            envelope['pending'].append(job_id)
+            continue
+        
+        rows = available[job_id]
+        if rows > BATCH_RESULTS_MAX_ROWS:
+            envelope['too_large'].append(job_id)  # page through /api/v1/results/{job_id} instead
+        elif rows > budget:
+            envelope['remaining'].append(job_id)
+        else:
+            budget -= rows
+            selected.append(job_id)
+    
+    def collect_rows() -> List[Dict[str, Any]]:
+        collected = []
+        for job_id in selected:
+            rows = project_rows(job_store.get_results(job_id, 0, None), request.top, fields)
+            if len(rows) < available[job_id]:
+                # Cut short by a missing row, as flagged by /api/v1/results
+                envelope['partial'].append(job_id)
+            collected.extend({'job_id': job_id, **row} for row in rows)
+        return collected
+    
+    results = await run_in_threadpool(collect_rows)
+    envelope['included'] = selected
+    
+    return await encoded_response(envelope, results, request.format, accept_encoding)
+
+def encode_cursor(job: Dict[str, Any]) -> str:
+    """Opaque listing cursor pointing after a job"""
+    return base64.urlsafe_b64encode(json.dumps([job['created_at'], job['job_id']]).encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, job_id) of a listing cursor, or 400 if it was not issued by encode_cursor"""
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(created_at), str(job_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/api/v1/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Jobs of the calling client, newest first
+    
+    Args:
+        status: Only jobs with this status (queued, processing, completed, failed, cancelled)
+        limit: Jobs per page
+        cursor: next_cursor of the previous page
+        X-API-Key: API key for authentication
+        
+    Returns:
+        A page of jobs and the cursor of the next page (None on the last page)
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    before = decode_cursor(cursor) if cursor else None
+    
+    # One extra job tells whether another page follows
+    jobs = await run_in_threadpool(job_store.list_jobs, status=status, limit=limit + 1, client=client.name,
+                                   before=before)
+    page = jobs[:limit]
+    
+    listed = []
+    for job in page:
+        summary = build_status(job).model_dump(exclude_none=True)
+        summary['created_at'] = job.get('created_at')
+        if job.get('completed_at'):
+            summary['completed_at'] = job['completed_at']
+        listed.append(summary)
+    
+    return {
+        "jobs": listed,
+        "next_cursor": encode_cursor(page[-1]) if len(jobs) > limit else None
     }
 
+def result_lines(job_id: str, offset: int, limit: int, top: Optional[int] = None,
+                 fields: Optional[List[str]] = None) -> Tuple[int, str]:
+    """One page of stored result rows as NDJSON lines, and the number of rows in it"""
+    rows = job_store.get_results(job_id, offset, limit)
+    return len(rows), "".join(json.dumps(row, default=str) + "\n" for row in project_rows(rows, top, fields))
+
+async def stream_results(job_id: str, offset: int, limit: Optional[int], follow: bool, request: Request,
+                         page_size: int = 500, top: Optional[int] = None, fields: Optional[List[str]] = None):
+    """Yield stored result rows as NDJSON lines, page by page, optionally until the job finishes"""
+    sent = 0
+    final_read = False
+    while limit is None or sent < limit:
+        if await request.is_disconnected():
+            return
+        page_limit = page_size if limit is None else min(page_size, limit - sent)
+        count, lines = await run_in_threadpool(result_lines, job_id, offset + sent, page_limit, top, fields)
+        if lines:
+            yield lines
+        sent += count
+        if count == page_limit:
+            continue
+        
+        # Caught up with the stored rows: stop, or wait for more while the job is running
+        job = await run_in_threadpool(job_store.get_job, job_id)
+        if not follow or job is None or job['status'] not in ('queued', 'processing'):
+            # A job that just finished may have stored its last rows after this page was read: read once more,
+            # but never loop on a missing row
+            if not final_read and job is not None and job['status'] in FINISHED_STATUSES and \
+                    await run_in_threadpool(job_store.count_results, job_id) > offset + sent:
+                final_read = True
+                continue
+            return
+        await asyncio.sleep(1)
+
+@app.get("/api/v1/results/{job_id}/stream")
+async def stream_job_results(
+    job_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    follow: bool = False,
+    top: Optional[int] = Query(None, ge=1),
+    fields: Optional[str] = None,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Stream result rows as NDJSON (one JSON object per line)
+    
+    Works while the job is still running: rows for users that already
+    finished are returned, and with follow=true the stream stays open
+    until the job is done.
+    
+    Args:
+        job_id: Job ID returned from create_recommendation_job
+        offset: Index of the first result row to stream
+        limit: Maximum number of result rows (default: all)
+        follow: Keep streaming new rows until the job completes or fails
+        top: Only return the first `top` ranked cards of each user
+        fields: Comma-separated per-card fields or columns to return (as for /api/v1/results)
+        X-API-Key: API key for authentication
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    job = get_owned_job(job_id, client)
+    fields = parse_fields(fields, job.get('version', 'v1'), BASE_RESULT_COLUMNS)
+    
+    return StreamingResponse(
+        stream_results(job_id, offset, limit, follow, request, top=top, fields=fields),
+        media_type="application/x-ndjson",
+        headers={"X-Job-Status": job['status']}
+    )
+
+SSE_POLL_INTERVAL = float(os.getenv("CARDGENIUS_SSE_POLL_INTERVAL", 0.5))
+SSE_HEARTBEAT_SECONDS = 15
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def job_events(job_id: str, request: Request):
+    """Progress events while the job changes, then one final completed/failed/cancelled event"""
+    last_sent = None
+    last_write = time.monotonic()
+    
+    # Tell EventSource clients how long to wait before reconnecting
+    yield "retry: 3000\n\n"
+    
+    while True:
+        if await request.is_disconnected():
+            return
+        
+        progress = live_progress.get(job_id)
+        job = await run_in_threadpool(job_store.get_job, job_id)
+        if job is None:
+            yield sse_event("error", {"job_id": job_id, "detail": "Job not found"})
+            return
+        
+        status = build_status(job, progress).model_dump()
+        if status['status'] in FINISHED_STATUSES:
+            if job.get('error'):
+                status['error'] = job['error']
+            yield sse_event(status['status'], status)
+            return
+        
+        counters = (status['status'], status['processed_users'], status['queue_position'])
+        if counters != last_sent:
+            yield sse_event("progress", status)
+            last_sent = counters
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= SSE_HEARTBEAT_SECONDS:
+            # Comment line keeps proxies from closing an idle connection
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+        
+        await asyncio.sleep(SSE_POLL_INTERVAL)
+
+@app.get("/api/v1/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    request: Request,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Stream job progress as Server-Sent Events
+    
+    Sends a "progress" event (same fields as the status endpoint) whenever
+    the counters change, then a final "completed", "failed" or "cancelled" event, and
+    closes the stream.
+    
+    Args:
+        job_id: Job ID returned from create_recommendation_job
+        X-API-Key: API key for authentication
+    """
+    # Verify API key
+    client = authenticate(api_key)
+    
+    get_owned_job(job_id, client)
+    
+    return StreamingResponse(
+        job_events(job_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/v1/usage")
+async def get_usage(
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Quotas and usage counters of the calling API key
+    
+    Args:
+        X-API-Key: API key for authentication
+    """
+    client = authenticate(api_key)
+    usage = client.snapshot()
+    usage['upstream_slots_in_use'] = upstream_budget.in_use_by_tenant.get(client.name, 0)
+    if job_queue is not None:
+        # Jobs run in worker processes; their upstream counters are not visible here
+        usage['active_jobs'] = job_queue.active_jobs(client.name)
+    return usage
+
+def authenticate_debug(api_key: Optional[str]) -> ApiClient:
+    """Client for the API key if it has debug access, else 403"""
+    client = authenticate(api_key)
+    if not client.debug:
+        raise HTTPException(status_code=403, detail="This API key has no debug access")
+    return client
+
+def run_profile(seconds: float, interval: float, lines: bool) -> str:
+    """One profile at a time: overlapping samplers would mostly sample each other"""
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    try:
+        logger.info(f"Profiling all threads for {seconds}s")
+        return sample_stacks(seconds, interval, lines)
+    finally:
+        profile_lock.release()
+
+@app.get("/api/v1/debug/profile")
+async def debug_profile(
+    seconds: float = Query(10, gt=0),
+    interval_ms: float = Query(10, ge=1, le=1000),
+    lines: bool = True,
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Sample the stacks of all threads and return them as collapsed stacks
+    
+    Each line is "thread;outer frame;...;inner frame count"; feed the file to
+    flamegraph.pl, speedscope or inferno to get a flamegraph.
+    
+    Args:
+        seconds: Sampling duration (at most PROFILE_MAX_SECONDS)
+        interval_ms: Milliseconds between samples
+        lines: Include line numbers in frame labels
+        X-API-Key: API key with debug access
+    """
+    authenticate_debug(api_key)
+    
+    if seconds > PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {PROFILE_MAX_SECONDS:g}")
+    
+    stacks = await run_in_threadpool(run_profile, seconds, interval_ms / 1000, lines)
+    return Response(
+        content=stacks,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="cardgenius-{int(time.time())}.collapsed"'}
+    )
+
+@app.post("/api/v1/debug/heap/snapshots")
+async def debug_heap_snapshot(
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Take a tracemalloc snapshot to diff against later
+    
+    Tracing starts with the first snapshot (only allocations made after it are
+    seen) and costs memory and CPU until DELETE /api/v1/debug/heap stops it.
+    
+    Args:
+        X-API-Key: API key with debug access
+    """
+    authenticate_debug(api_key)
+    return await run_in_threadpool(heap_tracker.take)
+
+@app.get("/api/v1/debug/heap/top")
+async def debug_heap_top(
+    limit: int = Query(20, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Allocation sites holding the most memory now
+    
+    Args:
+        limit: Sites to return
+        group_by: lineno, filename or traceback
+        X-API-Key: API key with debug access
+    """
+    authenticate_debug(api_key)
+    try:
+        return await run_in_threadpool(heap_tracker.top, limit, group_by)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/api/v1/debug/heap/diff")
+async def debug_heap_diff(
+    from_id: int = Query(..., alias="from"),
+    to_id: Optional[int] = Query(None, alias="to"),
+    limit: int = Query(20, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Allocation sites that grew most between two snapshots
+    
+    Args:
+        from: Earlier snapshot_id
+        to: Later snapshot_id (default: the heap now)
+        limit: Sites to return
+        group_by: lineno, filename or traceback
+        X-API-Key: API key with debug access
+    """
+    authenticate_debug(api_key)
+    try:
+        return await run_in_threadpool(heap_tracker.diff, from_id, to_id, limit, group_by)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.delete("/api/v1/debug/heap")
+async def debug_heap_stop(
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Stop tracemalloc and drop all snapshots
+    
+    Args:
+        X-API-Key: API key with debug access
+    """
+    authenticate_debug(api_key)
+    heap_tracker.stop()
+    return {"message": "tracemalloc stopped"}
+
+@app.get("/api/v1/debug/runtime")
+async def debug_runtime(
+    api_key: str = Header(None, alias="X-API-Key")
+):
+    """
+    Event-loop lag and saturation of the threadpool, job executor and upstream slots
+    
+    Args:
+        X-API-Key: API key with debug access
+    """
+    authenticate_debug(api_key)
+    
+    # Sync endpoints and run_in_threadpool calls share this limiter
+    threadpool = anyio.to_thread.current_default_thread_limiter().statistics()
+    runtime = {
+        "event_loop_lag": loop_lag_monitor.stats(),
+        "threadpool": {
+            "busy_threads": threadpool.borrowed_tokens,
+            "max_threads": threadpool.total_tokens,
+            "waiting_tasks": threadpool.tasks_waiting,
+            "saturation": round(threadpool.borrowed_tokens / threadpool.total_tokens, 3)
+        },
+        "job_executor": job_executor.stats(),
+        "upstream": upstream_budget.stats(),
+        "threads": threading.active_count()
+    }
+    if job_queue is not None:
+        runtime["job_queue"] = job_queue.stats()
+    return runtime
+
 @app.delete("/api/v1/job/{job_id}")
 async def delete_job(
     job_id: str,
     api_key: str = Header(None, alias="X-API-Key")
 ):
     """
-    Delete a job and its results
+    Cancel a queued or running job, or delete a finished job and its results
+    
+    A cancelled job stops calling CardGenius and keeps the results of the
+    users processed before it stopped; delete it again to remove them.
     
     Args:
         job_id: Job ID to delete
         X-API-Key: API key for authentication
     """
     # Verify API key
-    if api_key != API_KEY:
-        raise HTTPException(status_code=401, detail="Invalid API key")
+    client = authenticate(api_key)
+    
+    # Delete job and results (other clients' jobs are left alone)
+    job = job_store.get_job(job_id)
+    if job is not None and job.get('client', client.name) != client.name:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job is not None and job['status'] in ('queued', 'processing'):
+        status = cancel_job(job)
+        return {
+            "message": f"Job {job_id} cancelled, results of users processed so far remain available",
+            "status": status
+        }
     
-    # Delete job and results
-    if job_id in jobs:
-        del jobs[job_id]
-    if job_id in results_storage:
-        del results_storage[job_id]
+    job_store.delete_job(job_id)
     
     return {"message": f"Job {job_id} deleted successfully"}
 
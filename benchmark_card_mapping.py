@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Card Name Mapping Benchmark
+
+Maps the CashKaro card list (create_card_mapping.py) to cardgenius_all_cards.json
+with CardNameMapper.find_best_match, using the CardNameIndex, and compares it
+with scoring every pair with calculate_similarity as before the index. Both
+must return the same match and score for every CashKaro name.
+
+--catalog-copies appends renamed copies of the CardGenius list to show how
+each approach grows with the catalog. --aliases N also maps N generated partner
+aliases with the vectorized matcher (CardNameMapper.top_matches) and reports how
+often its best match, and its top k, contain the indexed exact best match.
+
+Usage:
+    python benchmark_card_mapping.py --repeats 5 --catalog-copies 10
+    python benchmark_card_mapping.py --aliases 5000 --top-k 5
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from card_name_mapper import CardNameMapper
+from create_card_mapping import cashkaro_cards
+
+
+def pairwise_best_match(mapper: CardNameMapper, cashkaro_name: str, cardgenius_names: List[str],
+                        threshold: float) -> Optional[Tuple[str, float]]:
+    """find_best_match as it was before the index: calculate_similarity against every name"""
+    best_match, best_score = None, 0.0
+    for cg_name in cardgenius_names:
+        score = mapper.calculate_similarity(cashkaro_name, cg_name)
+        if score > best_score:
+            best_match, best_score = cg_name, score
+    return (best_match, best_score) if best_score >= threshold else None
+
+
+def time_mapping(match: Callable[[str], Optional[Tuple[str, float]]], names: List[str],
+                 repeats: int) -> Tuple[float, Dict[str, Optional[Tuple[str, float]]]]:
+    """Median seconds to match every name, and the matches"""
+    timings, matches = [], {}
+    for _ in range(repeats):
+        start = time.perf_counter()
+        matches = {name: match(name) for name in names}
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), matches
+
+
+def partner_aliases(names: List[str], count: int, seed: int = 7) -> List[str]:
+    """Names as a new partner catalog might spell them: reordered, abbreviated, suffixed, misspelt"""
+    rng = random.Random(seed)
+    suffixes = ['Credit Card', 'Card', 'Visa', 'Mastercard', 'Rupay', 'Signature', 'Platinum', 'Bank']
+    aliases = []
+    for _ in range(count):
+        words = rng.choice(names).split()
+        if len(words) > 2 and rng.random() < 0.3:
+            words.pop(rng.randrange(len(words)))
+        if rng.random() < 0.3:
+            words.append(rng.choice(suffixes))
+        if len(words) > 1 and rng.random() < 0.2:
+            words[0], words[1] = words[1], words[0]
+        alias = ' '.join(words)
+        if rng.random() < 0.3 and len(alias) > 4:
+            position = rng.randrange(len(alias))
+            alias = alias[:position] + alias[position + 1:]
+        aliases.append(alias.upper() if rng.random() < 0.3 else alias.title())
+    return aliases
+
+
+def benchmark_aliases(cardgenius_names: List[str], count: int, top_k: int, threshold: float):
+    """Vectorized top-k matching of many aliases, checked against the indexed exact best match"""
+    aliases = partner_aliases(cashkaro_cards + cardgenius_names, count)
+    print(f"\n🧮 {len(aliases)} partner aliases x {len(cardgenius_names)} CardGenius names")
+
+    mapper = CardNameMapper()
+    start = time.perf_counter()
+    top_matches = mapper.top_matches(aliases, cardgenius_names, k=top_k)
+    vector_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact = {alias: mapper.find_best_match(alias, cardgenius_names, threshold) for alias in aliases}
+    exact_seconds = time.perf_counter() - start
+
+    matched = [alias for alias in aliases if exact[alias]]
+    top1 = sum(1 for alias in matched if top_matches[alias] and top_matches[alias][0][0] == exact[alias][0])
+    in_top_k = sum(1 for alias in matched if exact[alias][0] in [name for name, _ in top_matches[alias]])
+    print(f"   Vectorized top {top_k}: {vector_seconds * 1000:8.1f} ms (including building the vectors)")
+    print(f"   Indexed exact best:  {exact_seconds * 1000:8.1f} ms")
+    print(f"   Of {len(matched)} aliases with an exact match above {threshold}: "
+          f"{top1 / max(len(matched), 1):.1%} same best match, {in_top_k / max(len(matched), 1):.1%} in the top {top_k}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark indexed vs pairwise card name matching')
+    parser.add_argument('--cards', default='cardgenius_all_cards.json', help='CardGenius card names (JSON list)')
+    parser.add_argument('--threshold', type=float, default=0.5, help='Minimum similarity for a match')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per approach')
+    parser.add_argument('--catalog-copies', type=int, default=0,
+                        help='Renamed copies of the CardGenius list to append')
+    parser.add_argument('--aliases', type=int, default=0, help='Generated partner aliases to map with top_matches')
+    parser.add_argument('--top-k', type=int, default=5, help='Matches per alias for --aliases')
+    args = parser.parse_args()
+
+    with open(args.cards, 'r') as f:
+        cardgenius_names = json.load(f)
+    base = list(cardgenius_names)
+    for copy in range(1, args.catalog_copies + 1):
+        cardgenius_names += [f"{name} Series {copy}" for name in base]
+
+    print(f"\n🔍 {len(cashkaro_cards)} CashKaro names x {len(cardgenius_names)} CardGenius names")
+
+    mapper = CardNameMapper()
+    pairwise_seconds, expected = time_mapping(
+        lambda name: pairwise_best_match(mapper, name, cardgenius_names, args.threshold), cashkaro_cards, args.repeats
+    )
+
+    build_start = time.perf_counter()
+    mapper.build_index(cardgenius_names)
+    build_seconds = time.perf_counter() - build_start
+
+    # The first call builds the index that the timed calls reuse
+    mapper = CardNameMapper()
+    mapper.find_best_match(cashkaro_cards[0], cardgenius_names, args.threshold)
+    indexed_seconds, actual = time_mapping(
+        lambda name: mapper.find_best_match(name, cardgenius_names, args.threshold), cashkaro_cards, args.repeats
+    )
+
+    print(f"   Pairwise:  {pairwise_seconds * 1000:10.1f} ms")
+    print(f"   Indexed:   {indexed_seconds * 1000:10.1f} ms  (+{build_seconds * 1000:.1f} ms to build the index once)")
+    print(f"   Speedup:   {pairwise_seconds / max(indexed_seconds, 1e-9):10.1f}x")
+
+    differences = [name for name in cashkaro_cards if expected[name] != actual[name]]
+    if differences:
+        print(f"❌ {len(differences)} names matched differently, e.g. {differences[0]!r}: "
+              f"{expected[differences[0]]} vs {actual[differences[0]]}")
+        raise SystemExit(1)
+    print(f"✅ Same match and score for all {len(cashkaro_cards)} names "
+          f"({sum(1 for match in actual.values() if match)} above threshold {args.threshold})")
+
+    if args.aliases:
+        benchmark_aliases(cardgenius_names, args.aliases, args.top_k, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
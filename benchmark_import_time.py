@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Import Time Benchmark
+
+Measures how long a fresh interpreter takes to import the API server and the
+CLI runners, lists the slowest imports (python -X importtime), and checks that
+heavy dependencies such as pandas are not loaded at import time. Exits with
+status 1 on a regression, so it can run in CI.
+
+Usage:
+    python benchmark_import_time.py --repeats 5
+    python benchmark_import_time.py --module api_server --max-seconds 1.5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+DEFAULT_MODULES = ['api_server', 'cardgenius_batch_runner', 'cardgenius_batch_runner_v2', 'bulk_ingest']
+
+# Loaded lazily on first use; importing any of DEFAULT_MODULES must not pull them in
+LAZY_DEPENDENCIES = ['pandas', 'numpy', 'pyarrow', 'openpyxl']
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(name for name in {lazy!r} if name in sys.modules))
+"""
+
+
+def time_import(module: str) -> Tuple[float, List[str]]:
+    """Seconds to import module in a fresh interpreter, and the lazy dependencies it loaded"""
+    env = dict(os.environ, CARDGENIUS_JOB_STORE='memory://', CARDGENIUS_RETENTION_INTERVAL='3600')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(module=module, lazy=LAZY_DEPENDENCIES)],
+        capture_output=True, text=True, check=True, env=env
+    ).stdout.splitlines()
+    return float(output[-2]), [name for name in output[-1].split(',') if name]
+
+
+def slowest_imports(module: str, count: int) -> List[Tuple[int, str]]:
+    """(cumulative microseconds, package) of the slowest top-level imports, from -X importtime"""
+    env = dict(os.environ, CARDGENIUS_JOB_STORE='memory://', CARDGENIUS_RETENTION_INTERVAL='3600')
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env
+    ).stderr
+
+    top_level: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:]
+        # Two-space indent steps mark nesting; depth 1 is imported directly by the module
+        if name.startswith('  ') and not name.startswith('   '):
+            top_level[name.strip()] = int(cumulative)
+    return sorted(((us, name) for name, us in top_level.items()), reverse=True)[:count]
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark cold import time of the API server and runners')
+    parser.add_argument('--module', action='append', help='Module to import (repeatable, default: server and runners)')
+    parser.add_argument('--repeats', type=int, default=5, help='Fresh interpreters per module')
+    parser.add_argument('--top', type=int, default=8, help='Slowest direct imports to list')
+    parser.add_argument('--max-seconds', type=float, default=None,
+                        help='Fail when a median import time exceeds this many seconds')
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    failures = []
+    for module in args.module or DEFAULT_MODULES:
+        timings = []
+        loaded = []
+        for _ in range(args.repeats):
+            elapsed, loaded = time_import(module)
+            timings.append(elapsed)
+        median = statistics.median(timings)
+
+        print(f"\n📦 import {module}: median {median * 1000:.0f} ms, min {min(timings) * 1000:.0f} ms "
+              f"({args.repeats} runs)")
+        for us, name in slowest_imports(module, args.top):
+            print(f"   {us / 1000:8.1f} ms  {name}")
+
+        if loaded:
+            failures.append(f"{module} imports {', '.join(loaded)} at import time")
+        if args.max_seconds is not None and median > args.max_seconds:
+            failures.append(f"{module} takes {median:.2f}s to import (limit {args.max_seconds:.2f}s)")
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ No heavy dependencies loaded at import time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+API Job Overhead Benchmark
+
+Compares the per-job overhead of the old api_server.process_batch path
+(temp input xlsx + JSON config -> process_excel -> output xlsx -> read_excel)
+with the in-memory runner API (process_records). The CardGenius API call is
+replaced by a canned response so only local overhead is measured.
+
+Usage:
+    python benchmark_job_overhead.py --users 200 --repeats 5 --version v1
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Any
+
+import pandas as pd
+
+from job_runtime import build_runner_config
+from cardgenius_batch_runner import CardGeniusBatchRunner
+from cardgenius_batch_runner_v2 import CardGeniusBatchRunnerV2
+
+
+def canned_response(num_cards: int = 30) -> Dict[str, Any]:
+    """Synthetic CardGenius response shaped like the real API output"""
+    with open('commissionable_cards.json', 'r') as f:
+        card_names = list(json.load(f)['cards'].keys())
+
+    rnd = random.Random(7)
+    cards = []
+    for name in rnd.sample(card_names, min(num_cards, len(card_names))):
+        cards.append({
+            'card_name': name,
+            'total_savings_yearly': rnd.randint(500, 20000),
+            'joining_fees': rnd.choice([0, 499, 999, 2500]),
+            'total_extra_benefits': rnd.choice([0, 500, 1000]),
+            'welcomeBenefits': [{'cash_value': 500}],
+            'milestone_benefits': [{'eligible': True, 'rpBonus': '1000', 'cash_conversion': 0.25, 'voucherBonus': ''}],
+            'redemption_options': [{'id': 1, 'method': 'Vouchers', 'brand': 'Amazon', 'conversion_rate': 0.25}],
+            'recommended_redemption_options': [{'redemption_option_id': 1, 'note': 'Best value'}],
+            'spending_breakdown': {
+                key: {'points_earned': rnd.randint(0, 400), 'savings': rnd.randint(0, 2000), 'explanation': ['...']}
+                for key in ['amazon_spends', 'flipkart_spends', 'grocery_spends_online', 'other_online_spends']
+            }
+        })
+    return {'savings': cards}
+
+
+def sample_users(count: int) -> List[Dict[str, Any]]:
+    """User records in the shape api_server builds from the request"""
+    rnd = random.Random(11)
+    return [{
+        'userid': f"bench_user_{i:05d}",
+        'avg_amazon_gmv': rnd.randint(0, 50000),
+        'avg_flipkart_gmv': rnd.randint(0, 30000),
+        'avg_myntra_gmv': rnd.randint(0, 5000),
+        'avg_ajio_gmv': rnd.randint(0, 5000),
+        'avg_confirmed_gmv': rnd.randint(0, 80000),
+        'avg_grocery_gmv': rnd.randint(0, 10000)
+    } for i in range(count)]
+
+
+def bench_config(top_n: int) -> Dict[str, Any]:
+    """API job config without rate limiting, so only local overhead is measured"""
+    config = build_runner_config(top_n)
+    config['api']['sleep_between_requests'] = 0
+    return config
+
+
+def run_xlsx_round_trip(runner_class, users: List[Dict[str, Any]], top_n: int, workdir: str) -> List[Dict[str, Any]]:
+    """The pre-in-memory process_batch path: two Excel encodes and two decodes per job"""
+    temp_input = os.path.join(workdir, 'temp_job_bench_input.xlsx')
+    temp_output = os.path.join(workdir, 'temp_job_bench_output.xlsx')
+    temp_config = os.path.join(workdir, 'temp_job_bench_config.json')
+
+    pd.DataFrame(users).to_excel(temp_input, index=False)
+    config = bench_config(top_n)
+    config['excel'] = {'input_file': temp_input, 'output_file': temp_output, 'sheet_name': 0}
+    with open(temp_config, 'w') as f:
+        json.dump(config, f, indent=2)
+
+    output_file = runner_class(temp_config).process_excel()
+    result_df = pd.read_excel(output_file)
+    for col in result_df.select_dtypes(include=['object']).columns:
+        result_df[col] = result_df[col].fillna('')
+    for col in result_df.select_dtypes(include=['number']).columns:
+        result_df[col] = result_df[col].fillna(0)
+    return result_df.to_dict('records')
+
+
+def run_in_memory(runner_class, users: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+    """The current process_batch path"""
+    return runner_class(bench_config(top_n)).process_records(users)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark per-job overhead of the API batch path')
+    parser.add_argument('--users', type=int, default=200, help='Users per job')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed repetitions per path')
+    parser.add_argument('--top-n', type=int, default=10, help='top_n_cards')
+    parser.add_argument('--version', choices=['v1', 'v2'], default='v1', help='Runner version')
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    runner_class = CardGeniusBatchRunnerV2 if args.version == 'v2' else CardGeniusBatchRunner
+    response = canned_response()
+    runner_class._call_cardgenius_api = lambda self, payload, user_id: response
+
+    users = sample_users(args.users)
+    timings = {'xlsx round trip': [], 'in-memory': []}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            run_xlsx_round_trip(runner_class, users, args.top_n, workdir)
+            timings['xlsx round trip'].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            run_in_memory(runner_class, users, args.top_n)
+            timings['in-memory'].append(time.perf_counter() - start)
+
+    print(f"\n📊 Per-job overhead ({args.users} users, top {args.top_n}, {args.version}, {args.repeats} runs)")
+    medians = {}
+    for name, values in timings.items():
+        medians[name] = statistics.median(values)
+        print(f"   {name:<16} median {medians[name] * 1000:8.1f} ms   min {min(values) * 1000:8.1f} ms")
+    saved = medians['xlsx round trip'] - medians['in-memory']
+    print(f"\n✅ In-memory path saves {saved * 1000:.1f} ms per job "
+          f"({medians['xlsx round trip'] / max(medians['in-memory'], 1e-9):.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
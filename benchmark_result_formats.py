@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Result Format Benchmark
+
+Builds the results of one API job with a canned CardGenius response, encodes
+them in every /api/v1/results format and compression, and reports the payload
+size and the time a Python client needs to decompress and decode it.
+
+Usage:
+    python benchmark_result_formats.py --users 200 --version v1
+"""
+
+import argparse
+import gzip
+import json
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmark_job_overhead import canned_response, run_in_memory, sample_users
+from cardgenius_batch_runner import CardGeniusBatchRunner
+from cardgenius_batch_runner_v2 import CardGeniusBatchRunnerV2
+from result_formats import RESULT_FORMATS, ResultFormatError, available_encodings, compress, encode_results
+
+
+def decoder(format: str) -> Callable[[bytes], Any]:
+    """How a Python client turns a body of the given format into usable data"""
+    if format == 'arrow':
+        import pyarrow as pa
+        return lambda body: pa.ipc.open_stream(body).read_all()
+    if format == 'msgpack':
+        import msgpack
+        return lambda body: msgpack.unpackb(body, raw=False)
+    return json.loads
+
+
+def decompressor(encoding: str) -> Callable[[bytes], bytes]:
+    if encoding == 'br':
+        import brotli
+        return brotli.decompress
+    if encoding == 'gzip':
+        return gzip.decompress
+    return lambda body: body
+
+
+def time_decode(body: bytes, decode: Callable[[bytes], Any], decompress: Callable[[bytes], bytes],
+                repeats: int) -> float:
+    """Median seconds to decompress and decode body"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        decode(decompress(body))
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark payload size and decode time of result formats')
+    parser.add_argument('--users', type=int, default=200, help='Users in the job')
+    parser.add_argument('--top-n', type=int, default=10, help='top_n_cards')
+    parser.add_argument('--version', choices=['v1', 'v2'], default='v1', help='Runner version')
+    parser.add_argument('--repeats', type=int, default=20, help='Timed decodes per combination')
+    args = parser.parse_args()
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+
+    runner_class = CardGeniusBatchRunnerV2 if args.version == 'v2' else CardGeniusBatchRunner
+    response = canned_response()
+    runner_class._call_cardgenius_api = lambda self, payload, user_id: response
+    rows: List[Dict[str, Any]] = run_in_memory(runner_class, sample_users(args.users), args.top_n)
+    envelope = {'job_id': 'bench', 'status': 'completed', 'version': args.version,
+                'total_users': len(rows), 'offset': 0, 'next_offset': None}
+
+    encodings = [None] + available_encodings()[::-1]
+    print(f"\n📦 Results of {len(rows)} users ({args.version}, top {args.top_n}, "
+          f"{len(rows[0]) if rows else 0} fields per user)")
+    print(f"   {'format':<10} {'encoding':<9} {'bytes':>12} {'decode ms':>10}")
+
+    baseline = None
+    for format in RESULT_FORMATS:
+        try:
+            body = encode_results(envelope, rows, format)
+            decode = decoder(format)
+        except (ResultFormatError, ImportError) as e:
+            print(f"   {format:<10} skipped: {e}")
+            continue
+        for encoding in encodings:
+            payload = compress(body, encoding)
+            seconds = time_decode(payload, decode, decompressor(encoding), args.repeats)
+            if baseline is None:
+                baseline = (len(payload), seconds)
+            print(f"   {format:<10} {encoding or 'identity':<9} {len(payload):>12,} {seconds * 1000:>10.2f}"
+                  f"   ({baseline[0] / len(payload):.1f}x smaller, {baseline[1] / max(seconds, 1e-9):.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Bulk Job Ingestion for the CardGenius API Server
+
+Large uploads (CSV, NDJSON or Parquet) are streamed to a spool file on disk,
+read back lazily in chunks of at most 200 users, and fed to the shared job
+executor a few chunks at a time by a BulkJobFeeder. Chunk results are written
+into the parent job at their row offset, so the parent job's status, results
+and results stream work exactly like a regular job.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+import logging
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from job_executor import QueueFullError
+
+# pandas is imported when an upload is parsed, not when the API server starts
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ('csv', 'ndjson', 'parquet')
+
+CONTENT_TYPE_FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/vnd.apache.parquet': 'parquet',
+    'application/x-parquet': 'parquet'
+}
+
+# Spend fields of UserSpendingData; missing columns are filled with 0
+SPEND_COLUMNS = ['avg_amazon_gmv', 'avg_flipkart_gmv', 'avg_myntra_gmv',
+                 'avg_ajio_gmv', 'avg_confirmed_gmv', 'avg_grocery_gmv']
+
+
+class BulkUploadError(Exception):
+    """Raised for uploads that cannot be ingested (bad format, missing columns)"""
+
+
+class UploadTooLargeError(BulkUploadError):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+def detect_format(content_type: Optional[str], explicit: Optional[str] = None) -> str:
+    """Upload format from the ?format= parameter or the Content-Type header"""
+    if explicit:
+        if explicit not in SUPPORTED_FORMATS:
+            raise BulkUploadError(f"Unsupported format '{explicit}', use one of {', '.join(SUPPORTED_FORMATS)}")
+        return explicit
+
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    if media_type in CONTENT_TYPE_FORMATS:
+        return CONTENT_TYPE_FORMATS[media_type]
+    raise BulkUploadError("Cannot detect upload format; set Content-Type or ?format=csv|ndjson|parquet")
+
+
+async def spool_upload(body: AsyncIterator[bytes], directory: Optional[str] = None,
+                       max_bytes: Optional[int] = None) -> Tuple[str, int, str]:
+    """
+    Write a streamed request body to a spool file without holding it in memory
+
+    Returns:
+        Spool file path, number of bytes written and SHA-256 hex digest of the body
+    """
+    directory = directory or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"cardgenius_bulk_{uuid.uuid4().hex}.upload")
+
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'wb') as f:
+            async for chunk in body:
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the {max_bytes} byte limit")
+                f.write(chunk)
+                digest.update(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size, digest.hexdigest()
+
+
+def normalize_chunk(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert an uploaded chunk into runner input records (userid + avg_* spend columns)"""
+    import pandas as pd
+
+    if 'user_id' in df.columns:
+        df = df.rename(columns={'user_id': 'userid'})
+    if 'userid' not in df.columns:
+        raise BulkUploadError("Upload must contain a 'user_id' column")
+
+    records = pd.DataFrame({'userid': df['userid'].fillna('').astype(str)})
+    for col in SPEND_COLUMNS:
+        values = pd.to_numeric(df[col], errors='coerce') if col in df.columns else 0
+        records[col] = pd.Series(values, index=df.index).fillna(0)
+    return records.to_dict('records')
+
+
+def iter_user_chunks(path: str, fmt: str, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Lazily read the spool file, yielding runner input records chunk_size users at a time"""
+    import pandas as pd
+
+    if fmt == 'csv':
+        for df in pd.read_csv(path, chunksize=chunk_size, dtype={'user_id': str, 'userid': str}):
+            yield normalize_chunk(df)
+    elif fmt == 'ndjson':
+        for df in pd.read_json(path, lines=True, chunksize=chunk_size, dtype={'user_id': str, 'userid': str}):
+            yield normalize_chunk(df)
+    elif fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise BulkUploadError("Parquet uploads need the 'pyarrow' package")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield normalize_chunk(batch.to_pandas())
+    else:
+        raise BulkUploadError(f"Unsupported format '{fmt}'")
+
+
+def count_users(path: str, fmt: str) -> int:
+    """Number of users in the spool file; also validates that it parses"""
+    if fmt == 'parquet':
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise BulkUploadError("Parquet uploads need the 'pyarrow' package")
+        columns = pq.read_schema(path).names
+        if 'user_id' not in columns and 'userid' not in columns:
+            raise BulkUploadError("Upload must contain a 'user_id' column")
+        return pq.ParquetFile(path).metadata.num_rows
+
+    try:
+        return sum(len(chunk) for chunk in iter_user_chunks(path, fmt, 10000))
+    except BulkUploadError:
+        raise
+    except Exception as e:
+        raise BulkUploadError(f"Could not parse {fmt} upload: {e}")
+
+
+class BulkJobFeeder:
+    """
+    Feeds the chunks of one bulk job to the job executor
+
+    At most `parallel` chunks are queued or running at a time, so a 200K-user
+    upload does not fill the executor queue and starve regular jobs. Each
+    finished chunk calls chunk_done(), which submits the next one; when the
+    executor queue is full the submission is retried after Retry-After.
+    Once cancel_event is set no further chunks are submitted, and on_finished
+    runs when the chunks already handed out are done.
+    """
+
+    def __init__(self, job_id: str, chunks: Iterator[List[Dict[str, Any]]],
+                 submit: Callable[[int, int, List[Dict[str, Any]]], None],
+                 on_finished: Callable[[], None], parallel: int = 2,
+                 cancel_event: Optional[threading.Event] = None):
+        self.job_id = job_id
+        self.parallel = parallel
+        self.cancel_event = cancel_event
+        self._chunks = chunks
+        self._submit = submit
+        self._on_finished = on_finished
+        self._lock = threading.Lock()
+        self._next_index = 0
+        self._next_start = 0
+        self._in_flight = 0
+        self._exhausted = False
+        self._finished = False
+        self.error: Optional[str] = None
+
+    def start(self):
+        """Submit the first `parallel` chunks"""
+        for _ in range(self.parallel):
+            self._submit_next()
+
+    def chunk_done(self):
+        """Called by a chunk when it finishes (successfully or not)"""
+        with self._lock:
+            self._in_flight -= 1
+        self._submit_next()
+
+    def _submit_next(self):
+        with self._lock:
+            if self._cancelled():
+                self._exhausted = True
+            if self._exhausted:
+                chunk = None
+            else:
+                try:
+                    chunk = next(self._chunks)
+                except StopIteration:
+                    chunk = None
+                    self._exhausted = True
+                except Exception as e:
+                    logger.error(f"Bulk job {self.job_id}: failed to read chunk {self._next_index}: {e}")
+                    self.error = f"Failed to read upload after {self._next_start} users: {e}"
+                    chunk = None
+                    self._exhausted = True
+
+            if chunk is None:
+                done = self._exhausted and self._in_flight == 0 and not self._finished
+                if done:
+                    self._finished = True
+            else:
+                index, start = self._next_index, self._next_start
+                self._next_index += 1
+                self._next_start += len(chunk)
+                self._in_flight += 1
+
+        if chunk is None:
+            if done:
+                self._on_finished()
+            return
+
+        self._submit_chunk(index, start, chunk)
+
+    def _cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def _submit_chunk(self, index: int, start: int, chunk: List[Dict[str, Any]]):
+        if self._cancelled():
+            self.chunk_done()
+            return
+        try:
+            self._submit(index, start, chunk)
+        except QueueFullError as e:
+            logger.info(f"Bulk job {self.job_id}: queue full, retrying chunk {index} in {e.retry_after}s")
+            timer = threading.Timer(e.retry_after, self._submit_chunk, args=(index, start, chunk))
+            timer.daemon = True
+            timer.start()
@@ -2,9 +2,19 @@
 """
 Card Name Mapping System
 Maps CashKaro card names to CardGenius card names using fuzzy matching
+
+CardGenius names are normalized once into a CardNameIndex. A trigram inverted
+index shortlists likely matches, and every other name is only scored with
+SequenceMatcher when upper bounds on its ratio (from lengths and character
+counts) show it could still beat the best score, so results are identical to
+scoring every pair.
+
+For large batches, top_matches and map_all_cards(method="vector") score all
+names at once with trigram TF-IDF vectors (card_name_vectors.py, needs numpy).
 """
 
 import re
+from collections import Counter, defaultdict
 from difflib import SequenceMatcher
 from typing import Dict, List, Tuple, Optional
 
@@ -33,8 +43,17 @@ class CardNameMapper:
         'first', 'the', 'new', 'plus'
     }
     
+    # Number of trigram-shortlisted names scored before the bounded scan
+    SHORTLIST_SIZE = 8
+    
     def __init__(self):
         self.manual_mappings = {}
+        self._index: Optional["CardNameIndex"] = None
+        self._vectors = None
+        self._abbreviation_pattern = re.compile(
+            r'\b(' + '|'.join(self.ABBREVIATIONS) + r')\b', flags=re.IGNORECASE
+        )
+        self._abbreviations = {abbr.lower(): full for abbr, full in self.ABBREVIATIONS.items()}
     
     def normalize_name(self, name: str) -> str:
         """Normalize card name for comparison"""
@@ -61,24 +80,27 @@ class CardNameMapper:
     
     def expand_abbreviations(self, name: str) -> str:
         """Expand known abbreviations"""
-        expanded = name
-        for abbr, full in self.ABBREVIATIONS.items():
-            # Case-insensitive replacement
-            expanded = re.sub(rf'\b{abbr}\b', full, expanded, flags=re.IGNORECASE)
-        return expanded
+        # One case-insensitive pass; no expansion contains another abbreviation
+        return self._abbreviation_pattern.sub(lambda m: self._abbreviations[m.group(1).lower()], name)
+    
+    def comparison_key(self, name: str) -> str:
+        """Normalized name with abbreviations expanded, as compared by calculate_similarity"""
+        return self.expand_abbreviations(self.normalize_name(name))
     
     def calculate_similarity(self, name1: str, name2: str) -> float:
         """Calculate similarity score between two names (0-1)"""
-        # Normalize both names
-        norm1 = self.normalize_name(name1)
-        norm2 = self.normalize_name(name2)
-        
-        # Expand abbreviations
-        norm1 = self.expand_abbreviations(norm1)
-        norm2 = self.expand_abbreviations(norm2)
-        
-        # Calculate sequence similarity
-        return SequenceMatcher(None, norm1, norm2).ratio()
+        # Calculate sequence similarity of the normalized, expanded names
+        return SequenceMatcher(None, self.comparison_key(name1), self.comparison_key(name2)).ratio()
+    
+    def build_index(self, cardgenius_names: List[str]) -> "CardNameIndex":
+        """Index of CardGenius names for repeated find_best_match calls"""
+        return CardNameIndex(self, cardgenius_names)
+    
+    def _index_for(self, cardgenius_names: List[str]) -> "CardNameIndex":
+        """Index of the names, rebuilt only when the list differs from the last call's"""
+        if self._index is None or self._index.names != tuple(cardgenius_names):
+            self._index = self.build_index(cardgenius_names)
+        return self._index
     
     def find_best_match(self, cashkaro_name: str, cardgenius_names: List[str], threshold: float = 0.6) -> Optional[Tuple[str, float]]:
         """
@@ -99,14 +121,7 @@ class CardNameMapper:
                 return (manual_match, 1.0)
         
         # Find best fuzzy match
-        best_match = None
-        best_score = 0.0
-        
-        for cg_name in cardgenius_names:
-            score = self.calculate_similarity(cashkaro_name, cg_name)
-            if score > best_score:
-                best_score = score
-                best_match = cg_name
+        best_match, best_score = self._index_for(cardgenius_names).best_match(cashkaro_name)
         
         # Only return if above threshold
         if best_score >= threshold:
@@ -118,15 +133,64 @@ class CardNameMapper:
         """Add a manual mapping override"""
         self.manual_mappings[cashkaro_name] = cardgenius_name
     
-    def map_all_cards(self, cashkaro_names: List[str], cardgenius_names: List[str], threshold: float = 0.6) -> Dict[str, Tuple[str, float]]:
+    def _vectors_for(self, cardgenius_names: List[str]):
+        """Trigram vectors of the names, rebuilt only when the list differs from the last call's"""
+        from card_name_vectors import CardNameVectors
+        
+        names = tuple(cardgenius_names)
+        if self._vectors is None or self._vectors[0] != names:
+            self._vectors = (names, CardNameVectors([self.comparison_key(name) for name in names]))
+        return self._vectors[1]
+    
+    def top_matches(self, cashkaro_names: List[str], cardgenius_names: List[str],
+                    k: int = 5) -> Dict[str, List[Tuple[str, float]]]:
+        """
+        The k most similar CardGenius names of every CashKaro name, scored all at once
+        
+        Scores are cosine similarities of trigram TF-IDF vectors, not SequenceMatcher
+        ratios; names sharing no trigram are left out, and a manual mapping is listed
+        first with score 1.0.
+        
+        Returns:
+            Dictionary of {cashkaro_name: [(cardgenius_name, score), ...]}, best first
+        """
+        if not cardgenius_names:
+            return {ck_name: [] for ck_name in cashkaro_names}
+        
+        positions, scores = self._vectors_for(cardgenius_names).top_k(
+            [self.comparison_key(name) for name in cashkaro_names], k
+        )
+        matches = {}
+        for ck_name, row_positions, row_scores in zip(cashkaro_names, positions.tolist(), scores.tolist()):
+            ranked = [(cardgenius_names[position], round(score, 6))
+                      for position, score in zip(row_positions, row_scores) if score > 0]
+            manual_match = self.manual_mappings.get(ck_name)
+            if manual_match in cardgenius_names:
+                ranked = [(manual_match, 1.0)] + [match for match in ranked if match[0] != manual_match][:k - 1]
+            matches[ck_name] = ranked
+        return matches
+    
+    def map_all_cards(self, cashkaro_names: List[str], cardgenius_names: List[str], threshold: float = 0.6,
+                      method: str = "sequence") -> Dict[str, Tuple[str, float]]:
         """
         Map all CashKaro names to CardGenius names
         
+        Args:
+            method: "sequence" scores names like find_best_match; "vector" scores all
+                names in one pass with top_matches (much faster for thousands of names,
+                threshold then applies to its cosine scores)
+        
         Returns:
             Dictionary of {cashkaro_name: (cardgenius_name, similarity_score)}
         """
         mappings = {}
         
+        if method == "vector":
+            for ck_name, ranked in self.top_matches(cashkaro_names, cardgenius_names, k=1).items():
+                if ranked and ranked[0][1] >= threshold:
+                    mappings[ck_name] = ranked[0]
+            return mappings
+        
         for ck_name in cashkaro_names:
             match = self.find_best_match(ck_name, cardgenius_names, threshold)
             if match:
@@ -135,6 +199,93 @@ class CardNameMapper:
         return mappings
 
 
+class CardNameIndex:
+    """
+    CardGenius names prepared for CardNameMapper.find_best_match
+    
+    Holds each name's comparison key, its length and character counts, a
+    trigram inverted index for shortlisting, and the names grouped by key
+    length for the bounded scan. Not thread-safe: each name keeps one
+    SequenceMatcher whose analysis of the name is reused by every query.
+    """
+    
+    def __init__(self, mapper: CardNameMapper, cardgenius_names: List[str]):
+        self.mapper = mapper
+        self.names = tuple(cardgenius_names)
+        self.keys = [mapper.comparison_key(name) for name in self.names]
+        self.char_counts = [dict(Counter(key)) for key in self.keys]
+        self.matchers = [SequenceMatcher(None, '', key) for key in self.keys]
+        
+        self.trigrams: Dict[str, List[int]] = defaultdict(list)
+        self.by_length: Dict[int, List[int]] = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            for trigram in self._trigrams(key):
+                self.trigrams[trigram].append(position)
+            self.by_length[len(key)].append(position)
+    
+    @staticmethod
+    def _trigrams(key: str) -> set:
+        padded = f"  {key.lower()} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+    
+    @staticmethod
+    def _ratio_bound(matches: int, length: int) -> float:
+        # Same arithmetic as SequenceMatcher.ratio(), so bounds and scores compare exactly
+        return 2.0 * matches / length if length else 1.0
+    
+    def shortlist(self, key: str, size: int) -> List[int]:
+        """Positions of the names sharing the most trigrams with key"""
+        shared: Counter = Counter()
+        for trigram in self._trigrams(key):
+            shared.update(self.trigrams.get(trigram, ()))
+        return [position for position, _ in shared.most_common(size)]
+    
+    def best_match(self, cashkaro_name: str) -> Tuple[Optional[str], float]:
+        """
+        Highest-scoring name and its score, as a scan of calculate_similarity over all names
+        
+        Ties go to the earliest name; (None, 0.0) when no name scores above 0.
+        """
+        key = self.mapper.comparison_key(cashkaro_name)
+        counts = Counter(key).items()
+        best_position, best_score = None, 0.0
+        scored = set()
+        
+        def consider(position: int, bound: float):
+            nonlocal best_position, best_score
+            # Only names that could still win (a higher score, or an equal one earlier in the list)
+            if bound < best_score or (bound == best_score and (best_position is None or position > best_position)):
+                return
+            scored.add(position)
+            matcher = self.matchers[position]
+            matcher.set_seq1(key)
+            score = matcher.ratio()
+            if score > best_score or (score == best_score and score > 0 and position < best_position):
+                best_position, best_score = position, score
+        
+        # Likely winners first, so the bounds below prune most of the rest
+        for position in self.shortlist(key, self.mapper.SHORTLIST_SIZE):
+            consider(position, 1.0)
+        
+        # Matching characters cannot exceed the shorter key, nor the shared character counts
+        lengths = sorted(self.by_length, key=lambda length: -self._ratio_bound(min(len(key), length),
+                                                                               len(key) + length))
+        for length in lengths:
+            total = len(key) + length
+            if self._ratio_bound(min(len(key), length), total) < best_score:
+                break
+            for position in self.by_length[length]:
+                if position in scored:
+                    continue
+                other = self.char_counts[position]
+                shared = sum(min(count, other.get(char, 0)) for char, count in counts)
+                consider(position, self._ratio_bound(shared, total))
+        
+        if best_position is None:
+            return None, 0.0
+        return self.names[best_position], best_score
+
+
 def test_mapper():
     """Test the card name mapper"""
     mapper = CardNameMapper()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Vectorized Card Name Similarity
+
+Scores many card names against a catalog in one pass: every name becomes a
+character-trigram TF-IDF vector (L2-normalized), and the similarity matrix of
+queries x catalog is a single matrix product, computed in chunks of rows. The
+scores are cosine similarities in [0, 1]; they rank like the SequenceMatcher
+scores of CardNameMapper.calculate_similarity but are not on the same scale.
+
+Only trigrams that occur in the catalog get a column, since no other trigram
+can add to a dot product; query vectors are still normalized over all of their
+trigrams, so unmatched text lowers the score.
+"""
+
+import math
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def name_trigrams(key: str) -> Counter:
+    """Trigram counts of a comparison key, padded so word starts and ends count"""
+    padded = f"  {key.lower()} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CardNameVectors:
+    """Trigram TF-IDF matrix of a catalog of card names"""
+
+    def __init__(self, keys: List[str]):
+        """
+        Args:
+            keys: Comparison keys of the catalog names (CardNameMapper.comparison_key)
+        """
+        counts = [name_trigrams(key) for key in keys]
+        document_frequency: Counter = Counter()
+        for trigrams in counts:
+            document_frequency.update(trigrams.keys())
+
+        self.size = len(keys)
+        self.columns: Dict[str, int] = {trigram: column for column, trigram in enumerate(document_frequency)}
+        # Smoothed IDF; trigrams missing from the catalog get the weight of one seen nowhere
+        self.idf = np.array([math.log((1 + self.size) / (1 + document_frequency[trigram])) + 1
+                             for trigram in self.columns], dtype=np.float32)
+        self.unseen_idf = math.log(1 + self.size) + 1
+        self.matrix = self._vectorize(counts)
+
+    def _vectorize(self, counts: List[Counter]) -> np.ndarray:
+        """Rows of L2-normalized TF-IDF weights over the catalog's trigram columns"""
+        rows, columns, values = [], [], []
+        norms = np.ones(len(counts), dtype=np.float32)
+        for row, trigrams in enumerate(counts):
+            squared = 0.0
+            for trigram, count in trigrams.items():
+                column = self.columns.get(trigram)
+                weight = count * (self.idf[column] if column is not None else self.unseen_idf)
+                squared += weight * weight
+                if column is not None:
+                    rows.append(row)
+                    columns.append(column)
+                    values.append(weight)
+            if squared > 0:
+                norms[row] = math.sqrt(squared)
+
+        matrix = np.zeros((len(counts), len(self.columns)), dtype=np.float32)
+        if values:
+            np.add.at(matrix, (np.array(rows), np.array(columns)), np.array(values, dtype=np.float32))
+        return matrix / norms[:, None]
+
+    def similarity(self, keys: List[str]) -> np.ndarray:
+        """Cosine similarity of each key (rows) to each catalog name (columns)"""
+        return self._vectorize([name_trigrams(key) for key in keys]) @ self.matrix.T
+
+    def top_k(self, keys: List[str], k: int = 5, chunk_rows: int = 4096) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        The k most similar catalog names of every key
+
+        Args:
+            keys: Comparison keys to match
+            k: Matches per key (at most the catalog size)
+            chunk_rows: Keys scored per matrix product, bounding memory to chunk_rows x catalog
+
+        Returns:
+            (positions, scores): arrays of shape (len(keys), k), best first; equal
+            scores, also at the k-th place, go to the earlier catalog position
+        """
+        k = min(k, self.size)
+        positions = np.zeros((len(keys), k), dtype=np.int64)
+        scores = np.zeros((len(keys), k), dtype=np.float32)
+        if k == 0:
+            return positions, scores
+
+        for start in range(0, len(keys), chunk_rows):
+            block = self.similarity(keys[start:start + chunk_rows])
+            if k < self.size:
+                candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+                # argpartition keeps an arbitrary subset of the names tied with the k-th score;
+                # rows with such ties take the first k of a stable sort instead
+                kth = np.take_along_axis(block, candidates, axis=1).min(axis=1)
+                tied = np.flatnonzero((block >= kth[:, None]).sum(axis=1) > k)
+                if len(tied):
+                    candidates[tied] = np.argsort(-block[tied], axis=1, kind='stable')[:, :k]
+            else:
+                candidates = np.broadcast_to(np.arange(self.size), block.shape)
+            candidate_scores = np.take_along_axis(block, candidates, axis=1)
+            # Best first, earlier catalog position on ties
+            order = np.lexsort((candidates, -candidate_scores), axis=1)
+            positions[start:start + len(block)] = np.take_along_axis(candidates, order, axis=1)
+            scores[start:start + len(block)] = np.take_along_axis(candidate_scores, order, axis=1)
+        return positions, scores
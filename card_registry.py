@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Card Registry
+
+Commission and display-name configuration shared by the batch runners
+(commissionable_cards.json, cashkaro_display_names.json). Each file is parsed
+once per process and re-read only when it changes on disk, so API jobs do not
+reload it for every runner, and the API server can preload it during its
+startup warm-up.
+"""
+
+import json
+import os
+import threading
+import logging
+from typing import Any, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+COMMISSIONABLE_CARDS_FILE = 'commissionable_cards.json'
+DISPLAY_NAMES_FILE = 'cashkaro_display_names.json'
+
+_cache: Dict[str, Tuple[float, Any]] = {}
+_lock = threading.Lock()
+
+
+def load_registry_file(path: str) -> Any:
+    """
+    Parsed JSON content of path, cached until the file's modification time changes
+
+    The returned object is shared between callers and must not be modified.
+    Raises the same errors as open() and json.load().
+    """
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    with _lock:
+        _cache[path] = (mtime, data)
+    return data
+
+
+def preload():
+    """Parse the registry files now; missing files are reported later by the runners"""
+    for path in (COMMISSIONABLE_CARDS_FILE, DISPLAY_NAMES_FILE):
+        try:
+            load_registry_file(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not preload {path}: {e}")
@@ -0,0 +1,744 @@
+#!/usr/bin/env python3
+"""
+CardGenius Batch Runner Base
+
+Everything the V1 and V2 batch runners share: config and registry loading,
+column mapping, payload preparation, the CardGenius API call with retries,
+response filtering and ranking, and the per-row loop with incremental reuse,
+spend bucketing, response archiving, upstream budget, progress and
+cancellation hooks. A runner subclass only decides which columns a card
+becomes (_extract_card_data and _build_result_columns).
+"""
+
+from __future__ import annotations
+
+import requests
+import contextlib
+import copy
+import json
+import threading
+import time
+import argparse
+import sys
+import re
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Union
+import logging
+import math
+from response_archive import ResponseArchive, default_archive_path, canonical_payload_hash, load_previous_run
+import spend_bucketing
+from card_registry import COMMISSIONABLE_CARDS_FILE, DISPLAY_NAMES_FILE, load_registry_file
+
+# pandas is imported where it is used, so importing the runner stays cheap
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def configure_logging():
+    """Log to stdout and cardgenius_batch.log; only the CLI does this, so importing the runner writes no file"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('cardgenius_batch.log'),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+
+class CardGeniusBatchRunnerBase:
+    """Shared processing of CardGenius batch recommendations; subclasses define the output columns"""
+    
+    def __init__(self, config: Union[str, Dict[str, Any]], upstream_budget: Optional[Any] = None,
+                 progress: Optional[Any] = None, cancel_event: Optional[threading.Event] = None,
+                 session: Optional[requests.Session] = None):
+        """
+        Initialize the runner with a configuration file path or an in-memory config dict
+        
+        upstream_budget is an optional shared limiter (job_executor.UpstreamBudget)
+        that caps concurrent CardGenius API calls across runners; progress is an
+        optional job_executor.JobProgress updated after every user. Setting
+        cancel_event stops processing before the next user; the request in
+        flight is allowed to finish. session is an optional shared HTTP session,
+        so runners can reuse pooled upstream connections.
+        
+        processing.output_fields optionally lists the per-card fields to output
+        (e.g. ["card_name", "net_savings"], without the topN_ prefix); fields
+        that are not listed are neither computed nor added as columns.
+        """
+        self.config = copy.deepcopy(config) if isinstance(config, dict) else self._load_config(config)
+        self.upstream_budget = upstream_budget
+        self.progress = progress
+        self.cancel_event = cancel_event
+        self._record_columns = None
+        self._fill_values = {}
+        output_fields = self.config['processing'].get('output_fields')
+        self.output_fields = set(output_fields) if output_fields else None
+        self.commissionable_cards = self._load_commissionable_cards()
+        self.display_names = self._load_display_names()
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'CardGenius-Batch-Runner/1.0'
+        })
+        
+    def _load_config(self, config_path: str) -> Dict[str, Any]:
+        """Load configuration from JSON file"""
+        try:
+            with open(config_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load config from {config_path}: {e}")
+            raise
+    
+    def _load_commissionable_cards(self) -> Dict[str, Any]:
+        """Load commissionable cards configuration"""
+        try:
+            config = load_registry_file(COMMISSIONABLE_CARDS_FILE)
+            logger.info(f"Loaded {len(config.get('cards', {}))} card commission mappings")
+            return config
+        except FileNotFoundError:
+            logger.error("commissionable_cards.json not found - all cards will be treated as non-commissionable")
+            return {"cards": {}, "default_policy": {"unknown_cards_commissionable": False, "log_unknown_cards": True}}
+        except Exception as e:
+            logger.error(f"Failed to load commissionable cards config: {e}")
+            return {"cards": {}, "default_policy": {"unknown_cards_commissionable": False, "log_unknown_cards": True}}
+    
+    def _load_display_names(self) -> Dict[str, str]:
+        """Load CashKaro display name mappings"""
+        try:
+            mappings = load_registry_file(DISPLAY_NAMES_FILE).get('name_mappings', {})
+            logger.info(f"Loaded {len(mappings)} display name mappings")
+            return mappings
+        except FileNotFoundError:
+            logger.warning("cashkaro_display_names.json not found - using original card names")
+            return {}
+        except Exception as e:
+            logger.error(f"Failed to load display names config: {e}")
+            return {}
+    
+    def _get_display_name(self, cardgenius_name: str) -> str:
+        """Get the CashKaro display name for a CardGenius card name, or return original if no mapping exists"""
+        if not cardgenius_name:
+            return cardgenius_name
+        
+        # Check if mapping exists
+        display_name = self.display_names.get(cardgenius_name)
+        if display_name:
+            logger.debug(f"Name mapping: '{cardgenius_name}' → '{display_name}'")
+            return display_name
+        
+        # No mapping, return original name
+        return cardgenius_name
+    
+    def _is_card_commissionable(self, card_name: str) -> bool:
+        """Check if a card is commissionable based on the configuration"""
+        if not card_name:
+            return False
+        
+        # Check exact match first
+        card_config = self.commissionable_cards.get('cards', {}).get(card_name)
+        if card_config is not None:
+            is_commissionable = card_config.get('commissionable', False)
+            logger.debug(f"Card '{card_name}': {'commissionable' if is_commissionable else 'non-commissionable'}")
+            return is_commissionable
+        
+        # If not found, use default policy
+        default_policy = self.commissionable_cards.get('default_policy', {})
+        default_commissionable = default_policy.get('unknown_cards_commissionable', False)
+        
+        # Log unknown cards if enabled
+        if default_policy.get('log_unknown_cards', True):
+            logger.warning(f"Unknown card '{card_name}' - treating as {'commissionable' if default_commissionable else 'non-commissionable'}")
+        
+        return default_commissionable
+    
+    def _safe_float(self, value: Any) -> float:
+        """Safely convert value to float, returning 0 for invalid values"""
+        import pandas as pd
+        
+        try:
+            if pd.isna(value) or value is None:
+                return 0.0
+            # Strip common currency symbols and commas
+            if isinstance(value, str):
+                value = re.sub(r'[₹,\s]', '', value)
+            return float(value)
+        except (ValueError, TypeError):
+            return 0.0
+    
+    def _fuzzy_column_match(self, target_column: str, available_columns: List[str]) -> Optional[str]:
+        """Find the best matching column using case-insensitive fuzzy matching"""
+        target_lower = target_column.lower()
+        
+        # Exact match (case-insensitive)
+        for col in available_columns:
+            if col.lower() == target_lower:
+                logger.debug(f"Exact match found: '{target_column}' -> '{col}'")
+                return col
+        
+        # Partial match
+        for col in available_columns:
+            if target_lower in col.lower() or col.lower() in target_lower:
+                logger.debug(f"Partial match found: '{target_column}' -> '{col}'")
+                return col
+        
+        # Regex-based matching for common patterns
+        patterns = {
+            'amazon': r'amazon.*gmv',
+            'flipkart': r'flipkart.*gmv',
+            'myntra': r'myntra.*gmv',
+            'ajio': r'ajio.*gmv',
+            'grocery': r'grocery.*gmv',
+            'confirmed_gmv': r'(confirmed|avg_confirmed).*gmv',
+            'user_id': r'user.*id'
+        }
+        
+        for key, pattern in patterns.items():
+            if key in target_lower:
+                for col in available_columns:
+                    if re.search(pattern, col.lower()):
+                        logger.debug(f"Regex match found: '{target_column}' -> '{col}'")
+                        return col
+        
+        logger.warning(f"No match found for column: '{target_column}'")
+        return None
+    
+    def _prepare_payload(self, row: pd.Series, available_columns: List[str]) -> Dict[str, float]:
+        """Prepare API payload from Excel row using new authoritative mapping"""
+        mappings = self.config['column_mappings']
+        
+        # Extract individual spend values using fuzzy matching
+        amazon_spends = self._safe_float(row.get(mappings['amazon_spends'], 0))
+        flipkart_spends = self._safe_float(row.get(mappings['flipkart_spends'], 0))
+        myntra = self._safe_float(row.get(mappings['myntra'], 0))
+        ajio = self._safe_float(row.get(mappings['ajio'], 0))
+        avg_confirmed_gmv = self._safe_float(row.get(mappings['avg_gmv'], 0))
+        grocery = self._safe_float(row.get(mappings['grocery'], 0))
+        
+        # Calculate other_online_spends based on configuration
+        other_online_mode = self.config['processing'].get('other_online_mode', 'sum_components')
+        
+        if other_online_mode == 'sum_components':
+            # New authoritative mapping: myntra + ajio + avg_confirmed_gmv
+            other_online_spends = myntra + ajio + avg_confirmed_gmv
+            logger.debug(f"Using sum_components mode: other_online_spends = {myntra} + {ajio} + {avg_confirmed_gmv} = {other_online_spends}")
+        else:
+            # Fallback to confirmed_only mode
+            other_online_spends = avg_confirmed_gmv
+            logger.debug(f"Using confirmed_only mode: other_online_spends = {avg_confirmed_gmv}")
+        
+        # Prepare payload with all required fields
+        payload = {
+            "amazon_spends": amazon_spends,
+            "flipkart_spends": flipkart_spends,
+            "grocery_spends_online": grocery,
+            "other_online_spends": other_online_spends,
+            "selected_card_id": None
+        }
+        
+        # Add all other supported keys as 0 (as per requirements)
+        additional_keys = [
+            "dining_spends", "fuel_spends", "travel_spends", "utility_spends",
+            "entertainment_spends", "healthcare_spends", "education_spends",
+            "insurance_spends", "investment_spends", "other_spends"
+        ]
+        
+        for key in additional_keys:
+            payload[key] = 0.0
+        
+        # Optional approximate mode: round spends so similar users share one API call
+        if spend_bucketing.is_enabled(self.config['processing']):
+            payload = spend_bucketing.apply_bucketing(payload, self.config['processing']['spend_bucketing'])
+            
+        return payload
+    
+    def _call_cardgenius_api(self, payload: Dict[str, float], user_id: str) -> Optional[Dict[str, Any]]:
+        """Call CardGenius API with retry logic"""
+        api_config = self.config['api']
+        url = api_config['base_url']
+        
+        for attempt in range(api_config['max_retries']):
+            try:
+                logger.info(f"Calling API for user {user_id} (attempt {attempt + 1})")
+                
+                with (self.upstream_budget.slot() if self.upstream_budget else contextlib.nullcontext()):
+                    response = self.session.post(
+                        url,
+                        json=payload,
+                        timeout=api_config['timeout']
+                    )
+                
+                if response.status_code == 200:
+                    return response.json()
+                else:
+                    logger.warning(f"API returned status {response.status_code} for user {user_id}")
+                    if attempt < api_config['max_retries'] - 1 and not self._pause(2 ** attempt):  # Exponential backoff
+                        break
+                    
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"API call failed for user {user_id} (attempt {attempt + 1}): {e}")
+                if attempt == api_config['max_retries'] - 1 or not self._pause(2 ** attempt):
+                    raise
+        
+        return None
+    
+    def _wants(self, *fields: str) -> bool:
+        """Whether any of the per-card fields (without the topN_ prefix) is part of the output"""
+        return self.output_fields is None or any(field in self.output_fields for field in fields)
+    
+    def _project_card_fields(self, columns: Dict[str, Any], prefix: str) -> Dict[str, Any]:
+        """Drop the per-card columns that are not in processing.output_fields"""
+        if self.output_fields is None:
+            return columns
+        return {key: value for key, value in columns.items() if key[len(prefix):] in self.output_fields}
+    
+    def _extract_card_data(self, card: Dict[str, Any], card_rank: int) -> Dict[str, Any]:
+        """Output columns of one ranked card, prefixed with topN_ (implemented by each runner version)"""
+        raise NotImplementedError
+    
+    def _process_api_response(self, response: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Process API response and extract top N cards"""
+        result = {}
+        
+        # Handle different response formats
+        cards = []
+        if 'savings' in response:
+            cards = response['savings']
+        elif 'cards' in response:
+            cards = response['cards']
+        elif isinstance(response, list):
+            cards = response
+        else:
+            logger.warning(f"Unexpected response format for user {user_id}: {list(response.keys())}")
+            return result
+        
+        if not cards:
+            logger.warning(f"No cards returned for user {user_id}")
+            return result
+        
+        # Filter out cards with null values in key fields
+        valid_cards = []
+        for card in cards:
+            # Check for null values in key fields
+            if (card.get('total_savings_yearly') is not None and 
+                card.get('joining_fees') is not None and 
+                card.get('total_extra_benefits') is not None):
+                valid_cards.append(card)
+            else:
+                logger.warning(f"Skipping card {card.get('card_name', 'Unknown')} for user {user_id} due to null values")
+        
+        # Filter out non-commissionable cards
+        commissionable_cards = []
+        non_commissionable_count = 0
+        for card in valid_cards:
+            card_name = card.get('card_name', '')
+            if self._is_card_commissionable(card_name):
+                commissionable_cards.append(card)
+            else:
+                non_commissionable_count += 1
+                logger.debug(f"Filtered out non-commissionable card: {card_name} for user {user_id}")
+        
+        logger.info(f"User {user_id}: {len(commissionable_cards)} commissionable cards, {non_commissionable_count} non-commissionable cards filtered out")
+        
+        if not commissionable_cards:
+            logger.warning(f"No commissionable cards found for user {user_id} after filtering")
+            return result
+        
+        # Calculate correct ROI using only Vouchers/Cashback conversion rates
+        def calculate_correct_roi(card):
+            try:
+                # Get the highest Vouchers/Cashback conversion rate
+                redemption_options = card.get('redemption_options', [])
+                voucher_cashback_rates = []
+                
+                for opt in redemption_options:
+                    method = opt.get('method', '')
+                    if method in ['Vouchers', 'Cashback']:
+                        rate = opt.get('conversion_rate', 0)
+                        if rate and rate > 0:
+                            voucher_cashback_rates.append(float(str(rate)))
+                
+                # Calculate base net savings
+                base_net_savings = (float(str(card.get('total_savings_yearly', 0) or 0)) - 
+                                   float(str(card.get('joining_fees', 0) or 0)) + 
+                                   float(str(card.get('total_extra_benefits', 0) or 0)))
+                
+                if voucher_cashback_rates:
+                    # Use highest Vouchers/Cashback rate for ROI calculation
+                    highest_rate = max(voucher_cashback_rates)
+                    return base_net_savings * highest_rate
+                else:
+                    # Fallback to base net savings if no Vouchers/Cashback options
+                    return base_net_savings
+            except Exception as e:
+                logger.warning(f"Error calculating ROI for card {card.get('card_name', 'Unknown')}: {e}")
+                # Fallback to simple net savings calculation
+                return (float(str(card.get('total_savings_yearly', 0) or 0)) - 
+                       float(str(card.get('joining_fees', 0) or 0)) + 
+                       float(str(card.get('total_extra_benefits', 0) or 0)))
+        
+        # Sort by net savings (highest to lowest) - this matches what's displayed in the output
+        def calculate_net_savings(card):
+            try:
+                return (float(str(card.get('total_savings_yearly', 0) or 0)) - 
+                       float(str(card.get('joining_fees', 0) or 0)) + 
+                       float(str(card.get('total_extra_benefits', 0) or 0)))
+            except Exception as e:
+                logger.warning(f"Error calculating net savings for card {card.get('card_name', 'Unknown')}: {e}")
+                return 0
+        
+        cards_sorted = sorted(commissionable_cards, key=calculate_net_savings, reverse=True)
+        
+        # Log the top card's ROI for verification
+        if cards_sorted:
+            top_card_roi = calculate_correct_roi(cards_sorted[0])
+            logger.info(f"Top card for user {user_id}: {cards_sorted[0].get('card_name', 'Unknown')} with ROI: {top_card_roi}")
+        
+        # Extract top N cards
+        top_n = self.config['processing']['top_n_cards']
+        for i, card in enumerate(cards_sorted[:top_n], 1):
+            card_data = self._extract_card_data(card, i)
+            result.update(card_data)
+        
+        return result
+    
+    def _resolve_column_mappings(self, available_columns: List[str]):
+        """Resolve configured column mappings against the input columns with fuzzy matching"""
+        resolved_mappings = {}
+        mappings = self.config['column_mappings']
+        
+        for key, target_column in mappings.items():
+            resolved_column = self._fuzzy_column_match(target_column, available_columns)
+            if resolved_column:
+                resolved_mappings[key] = resolved_column
+                logger.info(f"Resolved mapping: {key} -> '{resolved_column}'")
+            else:
+                logger.warning(f"Could not resolve column mapping for: {key} (target: '{target_column}')")
+        
+        # Update config with resolved mappings
+        self.config['column_mappings'] = resolved_mappings
+    
+    def _build_result_columns(self) -> Dict[str, Any]:
+        """Result columns with their default values, in output order (implemented by each runner version)"""
+        raise NotImplementedError
+    
+    def process_excel(self) -> str:
+        """Process the Excel file and generate recommendations"""
+        import pandas as pd
+        
+        excel_config = self.config['excel']
+        
+        # Load Excel file
+        logger.info(f"Loading Excel file: {excel_config['input_file']}")
+        try:
+            df = pd.read_excel(
+                excel_config['input_file'], 
+                sheet_name=excel_config['sheet_name']
+            )
+        except Exception as e:
+            logger.error(f"Failed to load Excel file: {e}")
+            raise
+        
+        logger.info(f"Loaded {len(df)} rows from Excel file")
+        
+        df = self.process_dataframe(df)
+        
+        # Save results
+        output_file = excel_config['output_file']
+        logger.info(f"Saving results to {output_file}")
+        df.to_excel(output_file, index=False)
+        logger.info(f"Results saved to: {output_file}")
+        
+        return output_file
+    
+    def process_records(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process user records in memory, without reading or writing Excel files
+        
+        Args:
+            records: One dict per user, keyed by input column name
+            
+        Returns:
+            One dict per user with the input columns followed by the result columns
+        """
+        import pandas as pd
+        
+        df = pd.DataFrame(records)
+        return [self._fill_missing(record) for record in self.process_dataframe(df).to_dict('records')]
+    
+    def prepare_record_payload(self, record: Dict[str, Any]) -> Dict[str, float]:
+        """API payload for a single input record (column mappings are resolved on first use)"""
+        available_columns = list(record.keys())
+        if available_columns != self._record_columns:
+            self._resolve_column_mappings(available_columns)
+            self._record_columns = available_columns
+        return self._prepare_payload(record, available_columns)
+    
+    def build_record_result(self, response: Optional[Dict[str, Any]], user_id: str) -> Dict[str, Any]:
+        """Result columns for a single user from an API response (error row when response is None)"""
+        result = self._build_result_columns()
+        if response:
+            result.update(self._process_api_response(response, user_id))
+        else:
+            result['cardgenius_error'] = f"API call failed for user {user_id}"
+        return result
+    
+    def _cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+    
+    def _pause(self, seconds: float) -> bool:
+        """Sleep between requests; returns False early if the run was cancelled"""
+        if self.cancel_event is None:
+            time.sleep(seconds)
+            return True
+        return not self.cancel_event.wait(seconds)
+    
+    def _report_progress(self, df: pd.DataFrame, idx: Any, success: bool):
+        """Hand a finished row to the progress tracker, if one is attached"""
+        if self.progress:
+            self.progress.record(success, df.index.get_loc(idx), self._fill_missing(df.loc[[idx]].to_dict('records')[0]))
+    
+    def _fill_missing(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace None/NaN in a result row: 0 in numeric columns, '' everywhere else"""
+        return {
+            col: self._fill_values.get(col, '') if value is None or (isinstance(value, float) and math.isnan(value)) else value
+            for col, value in record.items()
+        }
+    
+    def process_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Generate recommendations for every row of the input DataFrame and return it with result columns"""
+        import pandas as pd
+        
+        processing_config = self.config['processing']
+        
+        # Resolve column mappings with fuzzy matching
+        available_columns = list(df.columns)
+        logger.info(f"Available columns: {available_columns}")
+        
+        self._resolve_column_mappings(available_columns)
+        
+        # Initialize result columns
+        result_columns = self._build_result_columns()
+        
+        input_columns = list(df.columns)
+        
+        # Add result columns to dataframe efficiently (object dtype so numeric columns accept floats row by row)
+        result_df = pd.DataFrame({
+            col: pd.Series(default_val, index=df.index, dtype=object)
+            for col, default_val in result_columns.items()
+        })
+        
+        # Concatenate original dataframe with result columns
+        df = pd.concat([df, result_df], axis=1)
+        
+        # What a missing value becomes in result rows (see _fill_missing)
+        self._fill_values = {col: 0 if pd.api.types.is_numeric_dtype(df[col]) else '' for col in input_columns}
+        self._fill_values.update({
+            col: 0 if isinstance(default_val, (int, float)) and not isinstance(default_val, bool) else ''
+            for col, default_val in result_columns.items()
+        })
+        
+        # Process each row
+        total_rows = len(df)
+        successful_calls = 0
+        failed_calls = 0
+        
+        reused_users = 0
+        recomputed_users = 0
+        self.cancelled = False
+        
+        # Incremental mode: reuse results for users whose payload is unchanged since the previous run
+        previous_run = {}
+        if processing_config.get('previous_run'):
+            previous_run = load_previous_run(self, processing_config['previous_run'])
+        
+        # Bucketed mode: users in the same spend bucket share one API response
+        shared_responses = {} if spend_bucketing.is_enabled(processing_config) else None
+        shared_users = 0
+        
+        # Raw response archive for offline re-projection (see response_archive.py)
+        archive = None
+        if processing_config.get('archive_responses', False):
+            archive_path = processing_config.get('archive_file') or default_archive_path(self.config['excel']['output_file'])
+            archive = ResponseArchive(archive_path)
+            archive.open()
+        
+        position = 0
+        try:
+            for position, (idx, row) in enumerate(df.iterrows()):
+                if self._cancelled():
+                    self.cancelled = True
+                    logger.info(f"Run cancelled before row {idx + 1}/{total_rows}")
+                    break
+                
+                user_id = str(row.get(self.config['column_mappings']['user_id'], ''))
+                
+                # Skip empty rows if configured
+                if processing_config['skip_empty_rows'] and not user_id.strip():
+                    logger.info(f"Skipping empty row {idx + 1}")
+                    # Still a result row, so the stored results have no hole at this position
+                    df.at[idx, 'cardgenius_error'] = "skipped: empty user_id"
+                    self._report_progress(df, idx, False)
+                    if archive:
+                        archive.append(idx, user_id, row[input_columns].to_dict(), None, None, skipped=True)
+                    continue
+                
+                logger.info(f"Processing row {idx + 1}/{total_rows} - User ID: {user_id}")
+                
+                payload = None
+                api_called = False
+                try:
+                    # Prepare payload
+                    payload = self._prepare_payload(row, available_columns)
+                    logger.debug(f"Payload for user {user_id}: {payload}")
+                    
+                    payload_hash = canonical_payload_hash(payload)
+                    
+                    # Reuse the previous run's result without calling the API
+                    previous = previous_run.get(user_id)
+                    if previous and previous['payload_hash'] == payload_hash:
+                        if previous.get('response') is not None:
+                            card_data = self._process_api_response(previous['response'], user_id)
+                        else:
+                            card_data = {k: v for k, v in previous['result'].items() if k in result_columns}
+                        
+                        for col, value in card_data.items():
+                            df.at[idx, col] = value
+                        
+                        successful_calls += 1
+                        reused_users += 1
+                        logger.info(f"Reused previous result for unchanged user {user_id}")
+                        self._report_progress(df, idx, True)
+                        
+                        if archive:
+                            archive.append(idx, user_id, row[input_columns].to_dict(), payload,
+                                           previous.get('response'), result=previous.get('result'))
+                        continue
+                    
+                    # Call API
+                    if shared_responses is not None and payload_hash in shared_responses:
+                        response = shared_responses[payload_hash]
+                        shared_users += 1
+                    else:
+                        api_called = True
+                        recomputed_users += 1
+                        response = self._call_cardgenius_api(payload, user_id)
+                        if shared_responses is not None and response:
+                            shared_responses[payload_hash] = response
+                    
+                    if response:
+                        # Process response
+                        card_data = self._process_api_response(response, user_id)
+                        
+                        # Update dataframe
+                        for col, value in card_data.items():
+                            df.at[idx, col] = value
+                        
+                        successful_calls += 1
+                        logger.info(f"Successfully processed user {user_id}")
+                        self._report_progress(df, idx, True)
+                        
+                        if archive:
+                            archive.append(idx, user_id, row[input_columns].to_dict(), payload, response)
+                    elif self._cancelled():
+                        # Retries were abandoned by the cancellation: the user was never processed
+                        self.cancelled = True
+                        logger.info(f"Run cancelled at row {idx + 1}/{total_rows}")
+                        break
+                    else:
+                        error_msg = f"API call failed for user {user_id}"
+                        df.at[idx, 'cardgenius_error'] = error_msg
+                        failed_calls += 1
+                        logger.error(error_msg)
+                        self._report_progress(df, idx, False)
+                        
+                        if archive:
+                            archive.append(idx, user_id, row[input_columns].to_dict(), payload, None, error_msg)
+                
+                except Exception as e:
+                    if self._cancelled():
+                        # Interrupted while waiting to call the API: the user was never processed
+                        self.cancelled = True
+                        logger.info(f"Run cancelled at row {idx + 1}/{total_rows}")
+                        break
+                    
+                    error_msg = f"Error processing user {user_id}: {str(e)}"
+                    df.at[idx, 'cardgenius_error'] = error_msg
+                    failed_calls += 1
+                    logger.error(error_msg)
+                    self._report_progress(df, idx, False)
+                    
+                    if archive:
+                        archive.append(idx, user_id, row[input_columns].to_dict(), payload, None, error_msg)
+                    
+                    if not processing_config['continue_on_error']:
+                        raise
+                
+                # Rate limiting
+                if api_called and idx < total_rows - 1:  # Don't sleep after the last row or without a call
+                    sleep_time = self.config['api']['sleep_between_requests']
+                    logger.debug(f"Sleeping for {sleep_time} seconds...")
+                    self._pause(sleep_time)
+            
+            if archive and self.cancelled:
+                # The rows the run stopped before are archived too, so a rebuild lists them as cancelled
+                for idx, row in df.iloc[position:].iterrows():
+                    user_id = str(row.get(self.config['column_mappings']['user_id'], ''))
+                    archive.append(idx, user_id, row[input_columns].to_dict(), None, None, "Run cancelled",
+                                   cancelled=True)
+        finally:
+            if archive:
+                archive.close()
+        
+        # Summary
+        logger.info(f"Processing complete!")
+        logger.info(f"Total rows processed: {total_rows}")
+        logger.info(f"Successful API calls: {successful_calls}")
+        logger.info(f"Failed API calls: {failed_calls}")
+        if shared_responses is not None:
+            logger.info(f"Spend bucketing: {len(shared_responses)} unique API calls, {shared_users} users served from a shared bucket")
+        if previous_run:
+            logger.info(f"Reused from previous run: {reused_users}")
+            logger.info(f"Recomputed via API: {recomputed_users}")
+        
+        self.run_stats = {
+            'total_rows': total_rows,
+            'successful': successful_calls,
+            'failed': failed_calls,
+            'reused': reused_users,
+            'bucket_shared': shared_users,
+            'recomputed': recomputed_users,
+            'cancelled': self.cancelled
+        }
+        
+        return df
+
+
+def run_cli(runner_class: type, done_message: str):
+    """Command line entry point of a runner version"""
+    parser = argparse.ArgumentParser(description='CardGenius Batch Recommendation Runner')
+    parser.add_argument('--config', required=True, help='Path to configuration JSON file')
+    parser.add_argument('--previous-run', help='Previous response archive or output file; unchanged users are reused')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose logging')
+    
+    args = parser.parse_args()
+    
+    configure_logging()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    
+    try:
+        runner = runner_class(args.config)
+        if args.previous_run:
+            runner.config['processing']['previous_run'] = args.previous_run
+        output_file = runner.process_excel()
+        print(f"\n{done_message} Results saved to: {output_file}")
+        if args.previous_run:
+            print(f"Reused: {runner.run_stats['reused']} users | Shared bucket: {runner.run_stats['bucket_shared']} users | "
+                  f"Recomputed: {runner.run_stats['recomputed']} users")
+        
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        sys.exit(1)
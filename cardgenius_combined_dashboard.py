@@ -15,6 +15,7 @@ from datetime import datetime
 import subprocess
 import sys
 from pathlib import Path
+from result_retention import cleanup_output_files, output_retention_settings
 
 # Page configuration
 st.set_page_config(
@@ -413,6 +414,9 @@ def main():
         
         if temp_input_path is not None and not has_missing_columns:
             if st.button(f"▶️ Start {version.upper()} Processing", type="primary", use_container_width=True):
+                # Remove output files from earlier runs past their retention (CARDGENIUS_OUTPUT_TTL / _MAX_MB)
+                cleanup_output_files('.', *output_retention_settings())
+                
                 # Create output filename with version prefix
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_file = f"cardgenius_{version}_recommendations_{timestamp}.xlsx"
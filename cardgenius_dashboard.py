@@ -16,6 +16,7 @@ from datetime import datetime
 import subprocess
 import sys
 from pathlib import Path
+from result_retention import cleanup_output_files, output_retention_settings
 
 # Page configuration
 st.set_page_config(
@@ -428,6 +429,9 @@ def main():
         
         if temp_input_path is not None and not has_missing_columns:
             if st.button("▶️ Start Processing", type="primary", use_container_width=True):
+                # Remove output files from earlier runs past their retention (CARDGENIUS_OUTPUT_TTL / _MAX_MB)
+                cleanup_output_files('.', *output_retention_settings())
+                
                 # Create output filename with absolute path
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 output_file = f"cardgenius_recommendations_{timestamp}.xlsx"
@@ -519,7 +523,7 @@ def main():
                     os.unlink("temp_input.xlsx")
                     os.unlink("temp_config.json")
                     if os.path.exists(output_file):
-                        pass  # Keep output file for download
+                        pass  # Keep output file for download (removed later under the output retention policy)
                 except:
                     pass
         
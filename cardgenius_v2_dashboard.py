@@ -64,6 +64,26 @@ def get_job_status(job_id):
         return response.json()
     return None
 
+def follow_job_events(job_id):
+    """Yield (event, status) pairs from the job's Server-Sent Events stream until it finishes"""
+    with requests.get(f"{API_BASE_URL}/jobs/{job_id}/events", headers=get_api_headers(),
+                      stream=True, timeout=(5, 60)) as response:
+        if response.status_code != 200:
+            return
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:") and event:
+                yield event, json.loads(line[len("data:"):])
+
+def cancel_job(job_id):
+    """Cancel a queued or running job"""
+    response = requests.delete(f"{API_BASE_URL}/job/{job_id}", headers=get_api_headers())
+    if response.status_code == 200:
+        return response.json()
+    return None
+
 def get_job_results(job_id):
     """Get job results"""
     response = requests.get(f"{API_BASE_URL}/results/{job_id}", headers=get_api_headers())
@@ -195,6 +215,23 @@ def main():
                 if status:
                     st.session_state.job_status = status
             
+            if st.button("📡 Follow Live Progress"):
+                live_bar = st.progress(0)
+                live_text = st.empty()
+                for event, status in follow_job_events(job_id):
+                    live_bar.progress(status['progress_percentage'] / 100)
+                    rate = f" - {status['rate_per_second']:.1f} users/s" if status.get('rate_per_second') else ""
+                    live_text.text(f"{status['status'].upper()}: {status['processed_users']}/{status['total_users']} users{rate}")
+                    st.session_state.job_status = status
+            
+            if st.button("⏹️ Cancel Job"):
+                cancelled = cancel_job(job_id)
+                if cancelled:
+                    st.info(f"ℹ️ {cancelled['message']}")
+                    status = get_job_status(job_id)
+                    if status:
+                        st.session_state.job_status = status
+            
             if 'job_status' in st.session_state:
                 status = st.session_state.job_status
                 
@@ -216,6 +253,9 @@ def main():
                 if status['status'] == 'completed':
                     st.success("🎉 Job completed successfully!")
                     st.session_state.job_completed = True
+                elif status['status'] == 'cancelled':
+                    st.warning("⏹️ Job cancelled - results of users processed before cancelling are available")
+                    st.session_state.job_completed = True
                 elif status['status'] == 'failed':
                     st.error("❌ Job failed")
     
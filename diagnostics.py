@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Runtime Diagnostics for the CardGenius API Server
+
+Backs the /api/v1/debug endpoints, so a slow or growing production instance
+can be inspected without redeploying it:
+    sample_stacks       Sampling profiler over all threads, as collapsed stacks
+                        ("frame;frame;frame count" lines, the input of
+                        flamegraph.pl, speedscope and inferno)
+    HeapTracker         tracemalloc snapshots, top allocations and diffs
+    EventLoopLagMonitor How late the asyncio event loop wakes up from a sleep
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import logging
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_label(frame, lines: bool) -> str:
+    code = frame.f_code
+    location = f"{os.path.basename(code.co_filename)}:{frame.f_lineno}" if lines else os.path.basename(code.co_filename)
+    return f"{code.co_name} ({location})"
+
+
+def sample_stacks(seconds: float, interval: float = 0.01, lines: bool = True) -> str:
+    """
+    Sample the stacks of every other thread for `seconds`
+
+    Args:
+        seconds: Sampling duration
+        interval: Seconds between samples
+        lines: Include line numbers in frame labels (finer but wider flamegraphs)
+
+    Returns:
+        Collapsed stacks, one "thread;outer;...;inner count" line per distinct stack
+    """
+    me = threading.get_ident()
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame, lines))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}").replace(';', ':').replace(' ', '_'))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class HeapTracker:
+    """Named tracemalloc snapshots of this process (tracing starts with the first snapshot)"""
+
+    def __init__(self, frames: int = 10, max_snapshots: int = 10):
+        self.frames = frames
+        self.max_snapshots = max_snapshots
+        self._snapshots: Dict[int, tracemalloc.Snapshot] = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stats(stats: List[Any], limit: int) -> List[Dict[str, Any]]:
+        entries = []
+        for stat in stats[:limit]:
+            entry = {
+                'location': ' <- '.join(f"{frame.filename}:{frame.lineno}" for frame in stat.traceback),
+                'size_bytes': stat.size,
+                'count': stat.count
+            }
+            if isinstance(stat, tracemalloc.StatisticDiff):
+                entry['size_diff_bytes'] = stat.size_diff
+                entry['count_diff'] = stat.count_diff
+            entries.append(entry)
+        return entries
+
+    def _filtered(self, snapshot: tracemalloc.Snapshot) -> tracemalloc.Snapshot:
+        # Leave out tracemalloc's own bookkeeping
+        return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def take(self) -> Dict[str, Any]:
+        """Store a snapshot; starts tracing first, so an instance only pays for it once asked"""
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.frames)
+            logger.warning(f"Started tracemalloc with {self.frames} frames per allocation")
+        snapshot = self._filtered(tracemalloc.take_snapshot())
+        with self._lock:
+            snapshot_id = self._next_id
+            self._next_id += 1
+            self._snapshots[snapshot_id] = snapshot
+            while len(self._snapshots) > self.max_snapshots:
+                del self._snapshots[min(self._snapshots)]
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'snapshot_id': snapshot_id,
+            'tracing_started': started,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'snapshots': sorted(self._snapshots)
+        }
+
+    def top(self, limit: int = 20, group_by: str = 'lineno') -> Dict[str, Any]:
+        """Largest allocation sites currently alive"""
+        if not tracemalloc.is_tracing():
+            raise LookupError("tracemalloc is not tracing; take a snapshot first")
+        snapshot = self._filtered(tracemalloc.take_snapshot())
+        stats = snapshot.statistics(group_by)
+        current, peak = tracemalloc.get_traced_memory()
+        return {'traced_bytes': current, 'traced_peak_bytes': peak, 'top': self._stats(stats, limit)}
+
+    def diff(self, old_id: int, new_id: Optional[int] = None, limit: int = 20,
+             group_by: str = 'lineno') -> Dict[str, Any]:
+        """
+        Allocation sites that grew most between two snapshots
+
+        Args:
+            old_id: Earlier snapshot
+            new_id: Later snapshot (default: one taken now)
+
+        Raises:
+            LookupError: for unknown snapshot ids
+        """
+        with self._lock:
+            old = self._snapshots.get(old_id)
+            new = self._snapshots.get(new_id) if new_id is not None else None
+        if old is None or (new_id is not None and new is None):
+            raise LookupError(f"Unknown snapshot id; available: {sorted(self._snapshots)}")
+        if new is None:
+            new = self._filtered(tracemalloc.take_snapshot())
+        stats = new.compare_to(old, group_by)
+        return {
+            'from': old_id,
+            'to': new_id,
+            'size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'top': self._stats(stats, limit)
+        }
+
+    def stop(self):
+        """Stop tracing and drop the snapshots"""
+        with self._lock:
+            self._snapshots.clear()
+        tracemalloc.stop()
+
+
+class EventLoopLagMonitor:
+    """Measures how much later than requested the event loop wakes up from a sleep"""
+
+    def __init__(self, interval: float = 0.25, window: int = 240):
+        self.interval = interval
+        self._lags: deque = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self._lags.append(max(loop.time() - started - self.interval, 0.0))
+
+    def start(self):
+        """Start measuring on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Lag over the last window of samples, in milliseconds"""
+        lags = sorted(self._lags)
+        if not lags:
+            return {'samples': 0}
+        return {
+            'samples': len(lags),
+            'window_seconds': round(len(lags) * self.interval, 1),
+            'last_ms': round(self._lags[-1] * 1000, 2),
+            'avg_ms': round(sum(lags) / len(lags) * 1000, 2),
+            'p99_ms': round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2),
+            'max_ms': round(lags[-1] * 1000, 2)
+        }
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Health, Readiness and Scaling Signals for the CardGenius API Server
+
+    UpstreamCircuit     Opens after consecutive failed CardGenius calls, closes
+                        again after a successful one (tried once reset_seconds passed)
+    TrackedHTTPAdapter  Records every upstream call of a requests.Session in a circuit
+    memory_usage        Resident memory of this process and its budget
+    desired_workers     Worker count that drains the backlog within a target time
+                        at the measured per-user throughput
+"""
+
+import math
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamCircuit:
+    """
+    Circuit state of the CardGenius API as seen by this process
+
+    closed     Calls succeed (or fail only occasionally)
+    open       failure_threshold calls in a row failed within the last reset_seconds
+    half_open  reset_seconds passed since the last failure; the next call decides
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.last_failure: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            if self.consecutive_failures >= self.failure_threshold:
+                logger.info("CardGenius API recovered, upstream circuit closed")
+            self.consecutive_failures = 0
+
+    def record_failure(self, error: str):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_failure = time.monotonic()
+            self.last_error = error
+            if self.consecutive_failures == self.failure_threshold:
+                logger.warning(f"Upstream circuit opened after {self.failure_threshold} failed calls: {error}")
+
+    def state(self) -> str:
+        with self._lock:
+            if self.consecutive_failures < self.failure_threshold:
+                return 'closed'
+            if time.monotonic() - self.last_failure >= self.reset_seconds:
+                return 'half_open'
+            return 'open'
+
+    def snapshot(self) -> Dict[str, Any]:
+        state = self.state()
+        return {
+            'state': state,
+            'consecutive_failures': self.consecutive_failures,
+            'last_error': self.last_error if state != 'closed' else None
+        }
+
+
+class TrackedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that records connection errors and 5xx/429 responses in an UpstreamCircuit"""
+
+    def __init__(self, circuit: UpstreamCircuit, **kwargs):
+        self.circuit = circuit
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        try:
+            response = super().send(request, **kwargs)
+        except requests.exceptions.RequestException as e:
+            self.circuit.record_failure(f"{type(e).__name__}: {e}")
+            raise
+        if response.status_code >= 500 or response.status_code == 429:
+            self.circuit.record_failure(f"HTTP {response.status_code}")
+        else:
+            self.circuit.record_success()
+        return response
+
+
+def _cgroup_memory_limit() -> Optional[int]:
+    """Container memory limit (cgroup v2, then v1), or None when unlimited or unknown"""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value)
+    return None
+
+
+def _resident_bytes() -> Optional[int]:
+    """Current resident set size of this process (Linux), or None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory_usage(budget_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Resident memory of this process against its budget
+
+    Args:
+        budget_bytes: Memory budget (default: the container's cgroup limit, if any)
+    """
+    budget = budget_bytes or _cgroup_memory_limit()
+    resident = _resident_bytes()
+    return {
+        'resident_bytes': resident,
+        'budget_bytes': budget,
+        'fraction': round(resident / budget, 3) if resident is not None and budget else None
+    }
+
+
+def users_per_second(finished_jobs: Iterable[Dict[str, Any]]) -> Optional[float]:
+    """Users per second of one job slot, over finished jobs with start and completion times"""
+    users, seconds = 0, 0.0
+    for job in finished_jobs:
+        if not job.get('started_at') or not job.get('completed_at') or job.get('bulk'):
+            continue
+        try:
+            elapsed = (datetime.fromisoformat(job['completed_at']) -
+                       datetime.fromisoformat(job['started_at'])).total_seconds()
+        except ValueError:
+            continue
+        if elapsed > 0 and job.get('processed_users'):
+            users += job['processed_users']
+            seconds += elapsed
+    return users / seconds if seconds > 0 else None
+
+
+def desired_workers(backlog_users: int, active_jobs: int, jobs_per_worker: int,
+                    user_rate: Optional[float], target_seconds: float,
+                    min_workers: int = 1, max_workers: Optional[int] = None) -> int:
+    """
+    Workers needed to finish the backlog within target_seconds
+
+    Args:
+        backlog_users: Users of queued and running jobs not processed yet
+        active_jobs: Jobs queued or running
+        jobs_per_worker: Jobs one worker runs at once
+        user_rate: Measured users per second of one job slot (None: not measured yet)
+        target_seconds: Time the backlog should take to drain
+        min_workers: Lower bound
+        max_workers: Upper bound (None: unbounded)
+    """
+    # Enough slots for every active job, at least
+    needed = math.ceil(active_jobs / max(jobs_per_worker, 1))
+    if user_rate:
+        per_worker = user_rate * jobs_per_worker * target_seconds
+        needed = max(needed, math.ceil(backlog_users / per_worker))
+    needed = max(needed, min_workers)
+    return min(needed, max_workers) if max_workers else needed
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Bounded Job Executor for the CardGenius API Server
+
+Runs recommendation jobs on a fixed number of worker threads with a bounded
+FIFO queue in front of them. Submissions beyond the queue capacity are
+rejected (the API turns that into 429 + Retry-After) instead of piling up in
+the web server's threadpool. A shared UpstreamBudget caps concurrent
+CardGenius API calls across every running job and shares them weighted-fair
+between API clients.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the executor queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobCancelled(Exception):
+    """Raised when a job's cancellation interrupts a wait for upstream capacity"""
+
+
+class UpstreamBudget:
+    """
+    Process-wide limit on concurrent CardGenius API requests, shared by all jobs
+
+    Under contention, free slots are granted weighted-fair across tenants
+    (API clients): each request gets a virtual finish tag advanced by
+    1 / weight, and the waiter with the smallest tag goes next, so a tenant
+    with weight 4 gets four slots for every one of a weight-1 tenant and no
+    tenant can starve another. Requests of one tenant are served FIFO.
+    """
+
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self.in_use = 0
+        self.in_use_by_tenant: Dict[str, int] = {}
+
+    @contextmanager
+    def slot(self, tenant: str = "default", weight: float = 1.0,
+             cancel_event: Optional[threading.Event] = None):
+        """
+        Hold one upstream request slot for the duration of the block
+
+        Raises:
+            JobCancelled: when cancel_event is set while still waiting for a slot
+        """
+        with self._cond:
+            tag = max(self._finish_tags.get(tenant, 0.0), self._virtual_time) + 1.0 / max(weight, 1e-6)
+            self._finish_tags[tenant] = tag
+            entry = (tag, next(self._sequence), tenant)
+            heapq.heappush(self._waiting, entry)
+            while self.in_use >= self.max_concurrent or self._waiting[0] is not entry:
+                if cancel_event is not None and cancel_event.is_set():
+                    # Leave the line without taking a slot; the next waiter may go
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+                    raise JobCancelled("Cancelled while waiting for an upstream slot")
+                self._cond.wait(timeout=0.2 if cancel_event is not None else None)
+            heapq.heappop(self._waiting)
+            self.in_use += 1
+            self.in_use_by_tenant[tenant] = self.in_use_by_tenant.get(tenant, 0) + 1
+            self._virtual_time = tag
+            # Another slot may still be free for the next waiter in line
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= 1
+                self.in_use_by_tenant[tenant] -= 1
+                self._cond.notify_all()
+
+    def for_tenant(self, tenant: str, weight: float = 1.0,
+                   on_acquire: Optional[Callable[[], None]] = None,
+                   cancel_event: Optional[threading.Event] = None) -> "TenantBudget":
+        """View of this budget that schedules every slot for one tenant (and one job's cancel_event)"""
+        return TenantBudget(self, tenant, weight, on_acquire, cancel_event)
+
+    def stats(self) -> Dict[str, Any]:
+        """Slots in use and requests waiting for one"""
+        with self._cond:
+            return {
+                'in_use': self.in_use,
+                'max_concurrent': self.max_concurrent,
+                'waiting': len(self._waiting)
+            }
+
+
+class TenantBudget:
+    """UpstreamBudget bound to one tenant, passed to a runner as its upstream_budget"""
+
+    def __init__(self, budget: UpstreamBudget, tenant: str, weight: float,
+                 on_acquire: Optional[Callable[[], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.budget = budget
+        self.tenant = tenant
+        self.weight = weight
+        self.on_acquire = on_acquire
+        self.cancel_event = cancel_event
+
+    @contextmanager
+    def slot(self):
+        with self.budget.slot(self.tenant, self.weight, self.cancel_event):
+            if self.on_acquire:
+                self.on_acquire()
+            yield
+
+
+class JobProgress:
+    """
+    Live per-job progress counters
+
+    Written only by the runner thread processing the job, so the hot loop
+    just bumps integers; readers (status endpoint) take a snapshot without
+    locking. on_flush is called at most every flush_interval seconds so the
+    shared job store sees progress from other worker processes too, and
+    on_results receives the finished rows buffered since the last flush as
+    (start position, rows) runs so results can be read while the job runs.
+    """
+
+    def __init__(self, total: int, on_flush: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 flush_interval: float = 1.0, rate_window: int = 50,
+                 on_results: Optional[Callable[[int, List[Dict[str, Any]]], None]] = None):
+        self.total = total
+        self.processed = 0
+        self.successful = 0
+        self.failed = 0
+        self.on_flush = on_flush
+        self.on_results = on_results
+        self._pending_rows: List[Tuple[int, Dict[str, Any]]] = []
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self._samples: deque = deque([(self.started, 0)], maxlen=rate_window)
+        self._last_flush = self.started
+
+    def record(self, success: bool, position: Optional[int] = None, row: Optional[Dict[str, Any]] = None):
+        """Count one finished user, buffering its result row when on_results is set"""
+        self.processed += 1
+        if success:
+            self.successful += 1
+        else:
+            self.failed += 1
+        if self.on_results and row is not None:
+            self._pending_rows.append((position, row))
+
+        now = time.monotonic()
+        self._samples.append((now, self.processed))
+        if (self.on_flush or self.on_results) and now - self._last_flush >= self.flush_interval:
+            self._last_flush = now
+            self.flush()
+
+    def flush(self):
+        """Push buffered result rows to on_results and the current snapshot to on_flush"""
+        try:
+            if self._pending_rows:
+                pending, self._pending_rows = self._pending_rows, []
+                start, run = pending[0][0], []
+                for position, row in pending:
+                    if position != start + len(run):
+                        self.on_results(start, run)
+                        start, run = position, []
+                    run.append(row)
+                self.on_results(start, run)
+            if self.on_flush:
+                self.on_flush(self.snapshot())
+        except Exception as e:
+            logger.warning(f"Failed to flush job progress: {e}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters plus current rate (users/s over the recent window) and ETA"""
+        samples = list(self._samples)
+        (first_time, first_count), (last_time, last_count) = samples[0], samples[-1]
+        elapsed = last_time - first_time
+        rate = (last_count - first_count) / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.processed, 0)
+        return {
+            'processed_users': self.processed,
+            'successful': self.successful,
+            'failed': self.failed,
+            'rate_per_second': round(rate, 3),
+            'eta_seconds': round(remaining / rate, 1) if rate > 0 else None
+        }
+
+
+class JobExecutor:
+    """Fixed pool of job worker threads fed by a bounded FIFO queue"""
+
+    def __init__(self, max_concurrent_jobs: int = 4, max_queued_jobs: int = 50):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self._queue: deque = deque()
+        self._running: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._durations: deque = deque(maxlen=50)
+        self._shutdown = False
+
+        self._workers = []
+        for i in range(max_concurrent_jobs):
+            worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, job_id: str, fn: Callable[..., Any], *args: Any) -> int:
+        """
+        Queue a job for execution
+
+        Returns:
+            1-based position in the queue
+
+        Raises:
+            QueueFullError: when max_queued_jobs jobs are already waiting
+        """
+        with self._cond:
+            if len(self._queue) >= self.max_queued_jobs:
+                raise QueueFullError(self._retry_after_locked())
+            self._queue.append((job_id, fn, args))
+            position = len(self._queue)
+            self._cond.notify()
+        logger.info(f"Queued job {job_id} at position {position}")
+        return position
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a job that has not started yet; False if it is running, finished or unknown"""
+        with self._cond:
+            for entry in self._queue:
+                if entry[0] == job_id:
+                    self._queue.remove(entry)
+                    logger.info(f"Removed cancelled job {job_id} from the queue")
+                    return True
+        return False
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """1-based queue position of a waiting job, or None if it is not waiting here"""
+        with self._cond:
+            for position, (queued_id, _, _) in enumerate(self._queue, 1):
+                if queued_id == job_id:
+                    return position
+        return None
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait before resubmitting"""
+        with self._cond:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self) -> int:
+        average = sum(self._durations) / len(self._durations) if self._durations else 60.0
+        waves = (len(self._queue) + 1) / max(self.max_concurrent_jobs, 1)
+        return max(1, math.ceil(average * waves))
+
+    def stats(self) -> Dict[str, Any]:
+        """Current queue depth and worker utilisation"""
+        with self._cond:
+            return {
+                'running_jobs': len(self._running),
+                'queued_jobs': len(self._queue),
+                'max_concurrent_jobs': self.max_concurrent_jobs,
+                'max_queued_jobs': self.max_queued_jobs,
+                'avg_job_seconds': sum(self._durations) / len(self._durations) if self._durations else None
+            }
+
+    def shutdown(self):
+        """Stop accepting work and let idle workers exit"""
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+
+    def _worker_loop(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._cond.wait()
+                if self._shutdown and not self._queue:
+                    return
+                job_id, fn, args = self._queue.popleft()
+                started = time.monotonic()
+                self._running[job_id] = started
+
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error(f"Job {job_id} raised in executor: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._running.pop(job_id, None)
+                    self._durations.append(time.monotonic() - started)
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Durable Job Queue for CardGenius Worker Processes
+
+With CARDGENIUS_JOB_QUEUE=sqlite:///cardgenius_queue.db the API server only
+validates and enqueues jobs here; worker processes (job_worker.py) claim them
+in FIFO order and run the batch runners. The queue is a SQLite file in WAL
+mode, so any number of API and worker processes on one host can share it and
+queued work survives restarts.
+
+Claimed jobs carry the worker's id and a heartbeat. Jobs whose worker stopped
+heartbeating (crash, kill -9) are put back at the front of the queue; after
+max_attempts such failures a job is given up instead of crashing workers forever.
+Workers also report their CardGenius circuit state here, since in this mode
+only they call the CardGenius API (see the /readyz upstream check).
+"""
+
+import json
+import math
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from job_executor import QueueFullError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_QUEUE_URL = "sqlite:///cardgenius_queue.db"
+
+
+class JobQueue:
+    """FIFO of jobs waiting for a worker process, stored in SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS job_queue (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL UNIQUE,
+            kind TEXT NOT NULL,
+            client TEXT,
+            payload TEXT NOT NULL,
+            enqueued_at REAL NOT NULL,
+            claimed_by TEXT,
+            claimed_at REAL,
+            heartbeat_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_job_queue_claimed ON job_queue (claimed_by, seq);
+        CREATE INDEX IF NOT EXISTS idx_job_queue_client ON job_queue (client);
+        CREATE TABLE IF NOT EXISTS job_queue_durations (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            seconds REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS job_queue_workers (
+            worker_id TEXT PRIMARY KEY,
+            reported_at REAL NOT NULL,
+            upstream TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, max_queued: int = 50, max_attempts: int = 3):
+        self.path = path
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        self._connect().executescript(self.SCHEMA)
+        logger.info(f"Using SQLite job queue at {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, as in job_store.SQLiteJobStore"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, work):
+        """Run work(conn) inside one write transaction and return its result"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+        entry = dict(row)
+        entry['payload'] = json.loads(entry['payload'])
+        return entry
+
+    def enqueue(self, job_id: str, kind: str, payload: Dict[str, Any], client: Optional[str] = None) -> int:
+        """
+        Add a job at the back of the queue
+
+        Returns:
+            1-based position among the waiting jobs
+
+        Raises:
+            QueueFullError: when max_queued jobs are already waiting
+        """
+        def work(conn):
+            waiting = conn.execute("SELECT COUNT(*) FROM job_queue WHERE claimed_by IS NULL").fetchone()[0]
+            if waiting >= self.max_queued:
+                return None
+            conn.execute(
+                "INSERT INTO job_queue (job_id, kind, client, payload, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, client, json.dumps(payload, default=str), time.time())
+            )
+            return waiting + 1
+
+        position = self._write(work)
+        if position is None:
+            raise QueueFullError(self.retry_after())
+        logger.info(f"Enqueued {kind} job {job_id} at position {position}")
+        return position
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Take the oldest waiting job for worker_id, or None if the queue is empty"""
+        def work(conn):
+            row = conn.execute(
+                "SELECT * FROM job_queue WHERE claimed_by IS NULL ORDER BY seq LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE job_queue SET claimed_by = ?, claimed_at = ?, heartbeat_at = ?, attempts = attempts + 1 "
+                "WHERE seq = ?",
+                (worker_id, now, now, row['seq'])
+            )
+            entry = self._entry(row)
+            entry.update(claimed_by=worker_id, claimed_at=now, attempts=entry['attempts'] + 1)
+            return entry
+
+        return self._write(work)
+
+    def heartbeat(self, worker_id: str) -> int:
+        """Mark all jobs claimed by worker_id as alive; returns how many it holds"""
+        return self._write(lambda conn: conn.execute(
+            "UPDATE job_queue SET heartbeat_at = ? WHERE claimed_by = ?", (time.time(), worker_id)
+        ).rowcount)
+
+    def report_upstream(self, worker_id: str, circuit: Dict[str, Any]):
+        """Record a worker's upstream circuit snapshot (health.UpstreamCircuit.snapshot)"""
+        self._write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO job_queue_workers (worker_id, reported_at, upstream) VALUES (?, ?, ?)",
+            (worker_id, time.time(), json.dumps(circuit))
+        ))
+
+    def remove_worker(self, worker_id: str):
+        """Forget the upstream report of a worker that stopped"""
+        self._write(lambda conn: conn.execute("DELETE FROM job_queue_workers WHERE worker_id = ?", (worker_id,)))
+
+    def upstream_reports(self, max_age_seconds: float) -> Dict[str, Dict[str, Any]]:
+        """Upstream circuit snapshots of the workers that reported within max_age_seconds, by worker id"""
+        rows = self._connect().execute(
+            "SELECT worker_id, upstream FROM job_queue_workers WHERE reported_at >= ?",
+            (time.time() - max_age_seconds,)
+        ).fetchall()
+        return {row['worker_id']: json.loads(row['upstream']) for row in rows}
+
+    def complete(self, job_id: str):
+        """Remove a finished job and record how long it ran"""
+        def work(conn):
+            row = conn.execute("SELECT claimed_at FROM job_queue WHERE job_id = ?", (job_id,)).fetchone()
+            conn.execute("DELETE FROM job_queue WHERE job_id = ?", (job_id,))
+            if row is not None and row['claimed_at'] is not None:
+                conn.execute("INSERT INTO job_queue_durations (seconds) VALUES (?)", (time.time() - row['claimed_at'],))
+                conn.execute("DELETE FROM job_queue_durations WHERE seq <= "
+                             "(SELECT MAX(seq) FROM job_queue_durations) - 50")
+        self._write(work)
+
+    def release(self, job_id: str):
+        """Put a claimed job back at its original place in the queue (graceful worker shutdown)"""
+        self._write(lambda conn: conn.execute(
+            "UPDATE job_queue SET claimed_by = NULL, claimed_at = NULL, heartbeat_at = NULL, "
+            "attempts = MAX(attempts - 1, 0) WHERE job_id = ?", (job_id,)
+        ))
+
+    def requeue_stale(self, timeout_seconds: float) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Put back jobs whose worker has not heartbeated for timeout_seconds
+
+        Returns:
+            (requeued job ids, abandoned entries that reached max_attempts and were removed)
+        """
+        def work(conn):
+            rows = conn.execute(
+                "SELECT * FROM job_queue WHERE claimed_by IS NOT NULL AND heartbeat_at < ?",
+                (time.time() - timeout_seconds,)
+            ).fetchall()
+            requeued, abandoned = [], []
+            for row in rows:
+                if row['attempts'] >= self.max_attempts:
+                    conn.execute("DELETE FROM job_queue WHERE seq = ?", (row['seq'],))
+                    abandoned.append(self._entry(row))
+                else:
+                    conn.execute(
+                        "UPDATE job_queue SET claimed_by = NULL, claimed_at = NULL, heartbeat_at = NULL WHERE seq = ?",
+                        (row['seq'],)
+                    )
+                    requeued.append(row['job_id'])
+            return requeued, abandoned
+
+        requeued, abandoned = self._write(work)
+        if requeued:
+            logger.warning(f"Requeued {len(requeued)} jobs of unresponsive workers: {', '.join(requeued)}")
+        return requeued, abandoned
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Remove a job that no worker has claimed yet; returns its entry, or None"""
+        def work(conn):
+            row = conn.execute(
+                "SELECT * FROM job_queue WHERE job_id = ? AND claimed_by IS NULL", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM job_queue WHERE seq = ?", (row['seq'],))
+            return self._entry(row)
+
+        return self._write(work)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a waiting job, or None if it is claimed or unknown"""
+        row = self._connect().execute(
+            "SELECT COUNT(*) FROM job_queue WHERE claimed_by IS NULL AND seq <= "
+            "(SELECT seq FROM job_queue WHERE job_id = ? AND claimed_by IS NULL)", (job_id,)
+        ).fetchone()
+        return row[0] or None
+
+    def active_jobs(self, client: str) -> int:
+        """Jobs of a client that are waiting or running"""
+        return self._connect().execute("SELECT COUNT(*) FROM job_queue WHERE client = ?", (client,)).fetchone()[0]
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait: queue depth over running jobs, times the average job duration"""
+        conn = self._connect()
+        average = conn.execute("SELECT AVG(seconds) FROM job_queue_durations").fetchone()[0] or 60.0
+        waiting, running = conn.execute(
+            "SELECT COUNT(*) - COUNT(claimed_by), COUNT(claimed_by) FROM job_queue"
+        ).fetchone()
+        return max(1, math.ceil(average * (waiting + 1) / max(running, 1)))
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, claimed jobs and the workers holding them"""
+        conn = self._connect()
+        waiting, running, workers = conn.execute(
+            "SELECT COUNT(*) - COUNT(claimed_by), COUNT(claimed_by), COUNT(DISTINCT claimed_by) FROM job_queue"
+        ).fetchone()
+        average = conn.execute("SELECT AVG(seconds) FROM job_queue_durations").fetchone()[0]
+        return {
+            'queued_jobs': waiting,
+            'claimed_jobs': running,
+            'busy_workers': workers,
+            'max_queued_jobs': self.max_queued,
+            'avg_job_seconds': average
+        }
+
+
+def create_job_queue(url: Optional[str] = None, max_queued: int = 50) -> JobQueue:
+    """Create a job queue from a URL (sqlite:///path)"""
+    url = url or DEFAULT_JOB_QUEUE_URL
+    if url.startswith("sqlite:///"):
+        return JobQueue(url[len("sqlite:///"):], max_queued=max_queued)
+    raise ValueError(f"Unsupported job queue URL: {url}")
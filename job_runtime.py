@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+CardGenius Job Runtime
+
+The job functions shared by the API server and job worker processes
+(job_worker.py): running batch jobs and bulk chunks through the batch runners,
+recording progress and cancellation in the job store, and sending completion
+webhooks. Importing this module starts nothing; each process builds its own
+JobRuntime with create_job_runtime(), so a worker gets a job executor, upstream
+budget and webhook notifier without the API server's retention sweeper.
+
+Cancellation may be requested through any process sharing the job store: a
+watcher thread polls the store every CARDGENIUS_CANCEL_POLL_SECONDS for the
+jobs queued or running here and stops them before their next CardGenius call,
+independently of the once-a-second progress flush.
+"""
+
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Callable, List, Dict, Optional, Any
+
+import requests
+from pydantic import BaseModel
+
+import card_registry
+from cardgenius_batch_runner import CardGeniusBatchRunner
+from cardgenius_batch_runner_v2 import CardGeniusBatchRunnerV2
+from job_store import create_job_store
+from job_executor import JobExecutor, JobProgress, UpstreamBudget
+from job_queue import JobQueue, create_job_queue
+from webhooks import WebhookNotifier, parse_allowed_hosts
+from api_keys import ApiClient, ApiKeyRegistry
+from health import TrackedHTTPAdapter, UpstreamCircuit
+from bulk_ingest import BulkJobFeeder, iter_user_chunks
+
+logger = logging.getLogger(__name__)
+
+# API Key from environment variable (production) or fallback
+API_KEY = os.getenv("CARDGENIUS_API_KEY", "cgapi_2025_secure_key_12345")
+
+# Dedicated job executor: bounded concurrency and queue, shared upstream request budget
+MAX_CONCURRENT_JOBS = int(os.getenv("CARDGENIUS_MAX_CONCURRENT_JOBS", 4))
+MAX_QUEUED_JOBS = int(os.getenv("CARDGENIUS_MAX_QUEUED_JOBS", 50))
+UPSTREAM_CONCURRENCY = int(os.getenv("CARDGENIUS_UPSTREAM_CONCURRENCY", 4))
+
+# Optional durable job queue (sqlite:///path, see job_queue.py): when set, API
+# processes only validate and enqueue jobs, and job_worker.py processes run them
+JOB_QUEUE_URL = os.getenv("CARDGENIUS_JOB_QUEUE")
+
+# Startup warm-up: preload pandas, the card registry and a connection to CardGenius
+# before the process takes jobs (or, for the API server, reports ready)
+WARMUP_ENABLED = os.getenv("CARDGENIUS_WARMUP", "1") != "0"
+WARMUP_CONNECT = os.getenv("CARDGENIUS_WARMUP_CONNECT", "1") != "0"
+
+# Bulk uploads are processed in chunks of 200 users
+BULK_CHUNK_SIZE = 200
+BULK_PARALLEL_CHUNKS = int(os.getenv("CARDGENIUS_BULK_PARALLEL_CHUNKS", 2))
+
+# Seconds between job store polls for cancellations requested through another process
+CANCEL_POLL_SECONDS = float(os.getenv("CARDGENIUS_CANCEL_POLL_SECONDS", 0.25))
+
+
+class UserSpendingData(BaseModel):
+    """User spending data model"""
+    user_id: str
+    avg_amazon_gmv: Optional[float] = 0
+    avg_flipkart_gmv: Optional[float] = 0
+    avg_myntra_gmv: Optional[float] = 0
+    avg_ajio_gmv: Optional[float] = 0
+    avg_confirmed_gmv: Optional[float] = 0
+    avg_grocery_gmv: Optional[float] = 0
+
+
+def build_runner_config(top_n_cards: int) -> Dict[str, Any]:
+    """In-memory batch runner configuration for API jobs"""
+    return {
+        "api": {
+            "base_url": "https://card-recommendation-api-v2.bankkaro.com/cg/api/pro",
+            "timeout": 30,
+            "sleep_between_requests": 1.2,
+            "max_retries": 3
+        },
+        "column_mappings": {
+            "user_id": "userid",
+            "amazon_spends": "avg_amazon_gmv",
+            "flipkart_spends": "avg_flipkart_gmv",
+            "myntra": "avg_myntra_gmv",
+            "ajio": "avg_ajio_gmv",
+            "avg_gmv": "avg_confirmed_gmv",
+            "grocery": "avg_grocery_gmv"
+        },
+        "processing": {
+            "top_n_cards": top_n_cards,
+            "extract_spend_keys": [
+                "amazon_spends",
+                "flipkart_spends",
+                "grocery_spends_online",
+                "other_online_spends"
+            ],
+            "skip_empty_rows": True,
+            "continue_on_error": True,
+            "other_online_mode": "sum_components"
+        }
+    }
+
+
+def user_records(users: List[UserSpendingData]) -> List[Dict[str, Any]]:
+    """Convert request users to batch runner input records"""
+    return [{
+        'userid': user.user_id,
+        'avg_amazon_gmv': user.avg_amazon_gmv or 0,
+        'avg_flipkart_gmv': user.avg_flipkart_gmv or 0,
+        'avg_myntra_gmv': user.avg_myntra_gmv or 0,
+        'avg_ajio_gmv': user.avg_ajio_gmv or 0,
+        'avg_confirmed_gmv': user.avg_confirmed_gmv or 0,
+        'avg_grocery_gmv': user.avg_grocery_gmv or 0
+    } for user in users]
+
+
+class JobRuntime:
+    """Job store, executor, upstream budget and webhooks of one process, and the jobs run with them"""
+
+    def __init__(self, job_store: Any, job_executor: JobExecutor, upstream_budget: UpstreamBudget,
+                 api_keys: ApiKeyRegistry, webhook_notifier: WebhookNotifier,
+                 job_queue: Optional[JobQueue] = None, upstream_session: Optional[requests.Session] = None,
+                 upstream_circuit: Optional[UpstreamCircuit] = None, cancel_poll_seconds: float = CANCEL_POLL_SECONDS):
+        self.job_store = job_store
+        self.job_executor = job_executor
+        self.upstream_budget = upstream_budget
+        self.api_keys = api_keys
+        self.webhook_notifier = webhook_notifier
+        self.job_queue = job_queue
+        self.upstream_session = upstream_session
+        self.upstream_circuit = upstream_circuit
+        self.cancel_poll_seconds = cancel_poll_seconds
+
+        # Live progress of jobs running in this process; flushed to job_store about once a second
+        self.live_progress: Dict[str, JobProgress] = {}
+
+        # Cancellation signals of jobs queued or running in this process
+        self.job_cancellations: Dict[str, threading.Event] = {}
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_lock = threading.Lock()
+
+    def create_runner(self, version: str, top_n_cards: int, progress: Optional[JobProgress] = None,
+                      client: Optional[ApiClient] = None, cancel_event: Optional[threading.Event] = None,
+                      fields: Optional[List[str]] = None):
+        """In-memory batch runner for the requested output version, scheduled under the client's weight"""
+        config = build_runner_config(top_n_cards)
+        if fields:
+            # Only the requested per-card fields are computed
+            config['processing']['output_fields'] = fields
+        budget = self.upstream_budget
+        if client is not None or cancel_event is not None:
+            budget = self.upstream_budget.for_tenant(
+                client.name if client else "default",
+                client.weight if client else 1.0,
+                on_acquire=client.count_upstream_call if client else None,
+                cancel_event=cancel_event
+            )
+        runner_class = CardGeniusBatchRunnerV2 if version == "v2" else CardGeniusBatchRunner
+        return runner_class(config, upstream_budget=budget, progress=progress, cancel_event=cancel_event,
+                            session=self.upstream_session)
+
+    def warm_up(self):
+        """Load what the first jobs would otherwise wait for"""
+        # Runners and bulk ingestion import pandas lazily
+        import pandas  # noqa: F401
+        card_registry.preload()
+
+        if WARMUP_CONNECT and self.upstream_session is not None:
+            url = build_runner_config(10)['api']['base_url']
+            try:
+                # Any response will do: the TLS connection stays in the pool for the first job
+                self.upstream_session.head(url, timeout=5)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Warm-up could not connect to CardGenius: {e}")
+
+    def cancel_event(self, job_id: str) -> threading.Event:
+        """Cancellation signal of a job in this process, watched against the job store until the job ends"""
+        with self._watcher_lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch_cancellations, name="cancel-watcher",
+                                                 daemon=True)
+                self._watcher.start()
+        return self.job_cancellations.setdefault(job_id, threading.Event())
+
+    def _watch_cancellations(self):
+        """Set the cancel events of jobs cancelled (or deleted) through any process"""
+        while True:
+            time.sleep(self.cancel_poll_seconds)
+            watched = {job_id: event for job_id, event in list(self.job_cancellations.items()) if not event.is_set()}
+            if not watched:
+                continue
+            try:
+                jobs = self.job_store.get_jobs(list(watched))
+            except Exception as e:
+                logger.warning(f"Could not check jobs for cancellation: {e}")
+                continue
+            for job_id, event in watched.items():
+                job = jobs.get(job_id)
+                if job is None or job.get('cancel_requested'):
+                    event.set()
+
+    def watch_cancellation(self, job_id: str, cancel_event: threading.Event):
+        """Set cancel_event when the job was cancelled or deleted, possibly through another worker"""
+        job = self.job_store.get_job(job_id)
+        if job is None or job.get('cancel_requested'):
+            cancel_event.set()
+
+    def finish_cancelled_job(self, job_id: str, counters: Optional[Dict[str, Any]] = None):
+        """Record a job as cancelled; results stored so far stay available"""
+        self.job_store.update_job(job_id, status='cancelled', completed_at=datetime.now().isoformat(),
+                                  **(counters or {}))
+        logger.info(f"Job {job_id} cancelled")
+
+    def notify_job_finished(self, job_id: str):
+        """Send the completion webhook if the job was created with a callback_url"""
+        job = self.job_store.get_job(job_id)
+        if not job or not job.get('callback_url'):
+            return
+
+        event = {
+            'event': f"job.{job['status']}",
+            'job_id': job_id,
+            'status': job['status'],
+            'version': job.get('version', 'v1'),
+            'total_users': job['total_users'],
+            'processed_users': job.get('processed_users', 0),
+            'successful': job.get('successful', 0),
+            'failed': job.get('failed', 0),
+            'error': job.get('error'),
+            'completed_at': job.get('completed_at'),
+            'results_url': f"/api/v1/results/{job_id}"
+        }
+
+        def record_delivery(delivered: bool, attempts: int, error: Optional[str]):
+            self.job_store.update_job(job_id, webhook_status='delivered' if delivered else 'failed',
+                                      webhook_attempts=attempts, webhook_error=error)
+
+        self.webhook_notifier.notify(job['callback_url'], event, on_done=record_delivery)
+
+    def process_batch(self, job_id: str, users: List[UserSpendingData], top_n_cards: int, version: str = "v1",
+                      client: Optional[ApiClient] = None, fields: Optional[List[str]] = None):
+        """Process batch of users in background"""
+        job_store = self.job_store
+        cancel_event = self.cancel_event(job_id)
+        try:
+            # Cancelled while queued behind another worker's executor
+            self.watch_cancellation(job_id, cancel_event)
+            if cancel_event.is_set():
+                self.finish_cancelled_job(job_id)
+                return
+
+            logger.info(f"Starting job {job_id} with {len(users)} users using {version}")
+
+            # Update job status
+            job_store.update_job(
+                job_id,
+                status='processing',
+                started_at=datetime.now().isoformat(),
+                processed_users=0,
+                version=version
+            )
+
+            # Convert users to input records
+            user_data = user_records(users)
+
+            # Live per-user counters, periodically flushed so other workers see them
+            progress = JobProgress(
+                len(users),
+                on_flush=lambda snapshot: job_store.update_job(job_id, **snapshot),
+                on_results=lambda start, rows: job_store.save_results(job_id, rows, start)
+            )
+            self.live_progress[job_id] = progress
+
+            # Process in memory using appropriate batch runner based on version
+            runner = self.create_runner(version, top_n_cards, progress, client, cancel_event, fields)
+            results = runner.process_records(user_data)
+
+            if runner.cancelled:
+                # Only the users processed before the cancellation have results
+                progress.flush()
+                self.finish_cancelled_job(job_id, progress.snapshot())
+                return
+
+            # Store results
+            job_store.save_results(job_id, results)
+
+            # Update job status
+            job_store.update_job(
+                job_id,
+                status='completed',
+                completed_at=datetime.now().isoformat(),
+                processed_users=len(users),
+                successful=len([r for r in results if not r.get('cardgenius_error')]),
+                failed=len([r for r in results if r.get('cardgenius_error')])
+            )
+
+            logger.info(f"Job {job_id} completed successfully")
+
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}", exc_info=True)
+            job_store.update_job(
+                job_id,
+                status='failed',
+                error=str(e),
+                completed_at=datetime.now().isoformat()
+            )
+        finally:
+            self.live_progress.pop(job_id, None)
+            self.job_cancellations.pop(job_id, None)
+            if client is not None:
+                client.finish_job()
+            self.notify_job_finished(job_id)
+
+    def process_bulk_chunk(self, job_id: str, feeder: BulkJobFeeder, start: int, records: List[Dict[str, Any]],
+                           top_n_cards: int, version: str, client: Optional[ApiClient] = None,
+                           fields: Optional[List[str]] = None):
+        """Process one chunk of a bulk job, writing results at the chunk's row offset in the parent job"""
+        job_store = self.job_store
+        counters = {'processed_users': 0, 'successful': 0, 'failed': 0}
+
+        def add_to_parent(snapshot: Dict[str, Any]):
+            # Chunks run concurrently, so the parent's counters are incremented, never overwritten
+            deltas = {key: snapshot[key] - counters[key] for key in counters}
+            counters.update({key: snapshot[key] for key in counters})
+            job_store.increment_job(job_id, **deltas)
+
+        def save_cancelled(remaining: List[Dict[str, Any]], position: int):
+            # Placeholder rows keep the job's rows contiguous when a later chunk got further
+            job_store.save_results(job_id, [
+                {'userid': record['userid'], 'cardgenius_error': "Job cancelled"} for record in remaining
+            ], start + position)
+
+        progress = None
+        try:
+            job = job_store.get_job(job_id)
+            if job is None:
+                feeder.cancel_event.set()
+                return
+            if job.get('cancel_requested'):
+                feeder.cancel_event.set()
+            if feeder.cancel_event.is_set():
+                save_cancelled(records, 0)
+                return
+            if job['status'] == 'queued':
+                job_store.update_job(job_id, status='processing', started_at=datetime.now().isoformat())
+
+            progress = JobProgress(
+                len(records),
+                on_flush=add_to_parent,
+                on_results=lambda position, rows: job_store.save_results(job_id, rows, start + position)
+            )
+            runner = self.create_runner(version, top_n_cards, progress, client, feeder.cancel_event, fields)
+            results = runner.process_records(records)
+            if not runner.cancelled:
+                job_store.save_results(job_id, results, start)
+            progress.flush()
+            if runner.cancelled:
+                save_cancelled(records[progress.processed:], progress.processed)
+
+        except Exception as e:
+            logger.error(f"Bulk job {job_id}: chunk at row {start} failed: {e}", exc_info=True)
+            if progress:
+                progress.flush()
+            remaining = records[counters['processed_users']:]
+            job_store.save_results(job_id, [
+                {'userid': record['userid'], 'cardgenius_error': f"Chunk failed: {e}"} for record in remaining
+            ], start + counters['processed_users'])
+            job_store.increment_job(job_id, processed_users=len(remaining), failed=len(remaining))
+        finally:
+            job_store.increment_job(job_id, chunks_completed=1)
+            feeder.chunk_done()
+
+    def finish_bulk_job(self, job_id: str, feeder: BulkJobFeeder, spool_path: str,
+                        client: Optional[ApiClient] = None, on_finished: Optional[Callable[[], None]] = None):
+        """Mark a bulk job finished once its last chunk is done and remove the spool file"""
+        if client is not None:
+            client.finish_job()
+
+        try:
+            os.remove(spool_path)
+        except OSError as e:
+            logger.warning(f"Could not remove bulk spool file {spool_path}: {e}")
+
+        self.job_cancellations.pop(job_id, None)
+        if feeder.cancel_event.is_set():
+            self.finish_cancelled_job(job_id)
+        elif feeder.error:
+            self.job_store.update_job(job_id, status='failed', error=feeder.error,
+                                      completed_at=datetime.now().isoformat())
+            logger.error(f"Bulk job {job_id} failed: {feeder.error}")
+        else:
+            self.job_store.update_job(job_id, status='completed', completed_at=datetime.now().isoformat())
+            logger.info(f"Bulk job {job_id} completed successfully")
+
+        self.notify_job_finished(job_id)
+        if on_finished is not None:
+            on_finished()
+
+    def start_bulk_job(self, job_id: str, spool_path: str, upload_format: str, top_n_cards: int, version: str,
+                       client: Optional[ApiClient] = None, fields: Optional[List[str]] = None,
+                       on_finished: Optional[Callable[[], None]] = None):
+        """Start feeding the chunks of a spooled upload to this process's executor"""
+        cancel_event = self.cancel_event(job_id)
+        feeder = BulkJobFeeder(
+            job_id,
+            iter_user_chunks(spool_path, upload_format, BULK_CHUNK_SIZE),
+            submit=lambda index, start, records: self.job_executor.submit(
+                f"{job_id}:{index}", self.process_bulk_chunk, job_id, feeder, start, records, top_n_cards, version,
+                client, fields
+            ),
+            on_finished=lambda: self.finish_bulk_job(job_id, feeder, spool_path, client, on_finished),
+            parallel=BULK_PARALLEL_CHUNKS,
+            cancel_event=cancel_event
+        )
+        feeder.start()
+
+
+def create_job_runtime(max_concurrent_jobs: Optional[int] = None) -> JobRuntime:
+    """
+    Job runtime of this process, configured from the environment
+
+    Args:
+        max_concurrent_jobs: Jobs run at once (default: CARDGENIUS_MAX_CONCURRENT_JOBS)
+    """
+    # One HTTP session for all runners, so upstream connections are pooled across jobs;
+    # its calls feed the upstream circuit reported by /readyz
+    upstream_circuit = UpstreamCircuit(
+        failure_threshold=int(os.getenv("CARDGENIUS_CIRCUIT_FAILURES", 5)),
+        reset_seconds=float(os.getenv("CARDGENIUS_CIRCUIT_RESET_SECONDS", 30))
+    )
+    upstream_session = requests.Session()
+    upstream_session.mount("https://", TrackedHTTPAdapter(upstream_circuit, pool_connections=4,
+                                                          pool_maxsize=max(10, UPSTREAM_CONCURRENCY)))
+
+    # Signed completion callbacks for jobs created with a callback_url; without a secret
+    # the API server refuses callback URLs
+    webhook_notifier = WebhookNotifier(
+        os.getenv("CARDGENIUS_WEBHOOK_SECRET") or None,
+        max_attempts=int(os.getenv("CARDGENIUS_WEBHOOK_MAX_ATTEMPTS", 6)),
+        base_delay=float(os.getenv("CARDGENIUS_WEBHOOK_BASE_DELAY", 2)),
+        # Internal hosts and networks callbacks may reach (public hosts only otherwise)
+        allowed_hosts=parse_allowed_hosts(os.getenv("CARDGENIUS_WEBHOOK_ALLOWED_HOSTS", ""))
+    )
+
+    return JobRuntime(
+        # Job storage shared by all worker processes (SQLite by default, see job_store.py)
+        job_store=create_job_store(),
+        job_executor=JobExecutor(max_concurrent_jobs=max_concurrent_jobs or MAX_CONCURRENT_JOBS,
+                                 max_queued_jobs=MAX_QUEUED_JOBS),
+        upstream_budget=UpstreamBudget(UPSTREAM_CONCURRENCY),
+        # Per-client keys with weights, quotas and usage counters (see api_keys.py)
+        api_keys=ApiKeyRegistry.from_env(API_KEY),
+        webhook_notifier=webhook_notifier,
+        job_queue=create_job_queue(JOB_QUEUE_URL, max_queued=MAX_QUEUED_JOBS) if JOB_QUEUE_URL else None,
+        upstream_session=upstream_session,
+        upstream_circuit=upstream_circuit
+    )
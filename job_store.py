@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+"""
+Job Store for the CardGenius API Server
+
+Holds job state, progress counters and per-user results outside the API
+process, so several uvicorn workers can share jobs and a restart does not
+lose them.
+
+Backends (selected with CARDGENIUS_JOB_STORE):
+    sqlite:///cardgenius_jobs.db   Local SQLite file in WAL mode (default)
+    memory://                      In-process dicts (single worker, tests)
+    redis://localhost:6379/0       Redis or any Redis-compatible server
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+
+from result_retention import FINISHED_STATUSES, load_spilled_results, spill_results
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOB_STORE_URL = "sqlite:///cardgenius_jobs.db"
+
+
+class JobStore:
+    """Interface shared by all job store backends"""
+
+    def create_job(self, job: Dict[str, Any]) -> None:
+        """Insert a new job record (must contain job_id, status and created_at)"""
+        raise NotImplementedError
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the job record, or None if it does not exist"""
+        raise NotImplementedError
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Records of the jobs that exist among job_ids, keyed by job_id"""
+        jobs = {}
+        for job_id in job_ids:
+            job = self.get_job(job_id)
+            if job is not None:
+                jobs[job_id] = job
+        return jobs
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        """Merge fields into an existing job record"""
+        raise NotImplementedError
+
+    def increment_job(self, job_id: str, **deltas: float) -> None:
+        """Atomically add deltas to numeric fields of a job record (missing fields count as 0)"""
+        raise NotImplementedError
+
+    def delete_job(self, job_id: str) -> bool:
+        """Delete a job and its results; returns whether the job existed"""
+        raise NotImplementedError
+
+    def save_results(self, job_id: str, results: List[Dict[str, Any]], start: int = 0) -> None:
+        """Store result rows for a job at positions start, start + 1, ..."""
+        raise NotImplementedError
+
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Result rows at positions offset, offset + 1, ... (at most limit of them)
+
+        Stops at the first position not stored yet, which only a running bulk
+        job has (its chunks finish out of order), so a page never skips a row.
+        """
+        raise NotImplementedError
+
+    def count_results(self, job_id: str) -> int:
+        """Number of stored result rows for a job"""
+        raise NotImplementedError
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100, offset: int = 0,
+                  client: Optional[str] = None, before: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Jobs ordered by creation time (newest first), optionally filtered by status and client
+
+        before is a (created_at, job_id) cursor taken from the last job of the
+        previous page; only jobs listed after it are returned, so pages stay
+        stable while new jobs are created.
+        """
+        raise NotImplementedError
+
+    def count_jobs(self, status: Optional[str] = None) -> int:
+        """Number of jobs, optionally only those with status"""
+        raise NotImplementedError
+
+    def claim_key(self, name: str, value: str, ttl_seconds: float, stale: Optional[str] = None) -> Optional[str]:
+        """
+        Atomically store value under name for ttl_seconds unless another value holds it
+
+        A held value equal to stale is overwritten. Returns None when the claim
+        succeeded, else the value currently holding the name.
+        """
+        raise NotImplementedError
+
+
+class MemoryJobStore(JobStore):
+    """
+    In-process store; only valid for a single worker process
+
+    With a memory_budget_bytes, results of finished jobs are evicted least
+    recently used first to gzip files in spill_dir once the results held in
+    memory exceed the budget, and reloaded transparently when read.
+    """
+
+    def __init__(self, memory_budget_bytes: Optional[int] = None, spill_dir: Optional[str] = None):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._results: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), "cardgenius_results")
+        self._result_bytes: "OrderedDict[str, int]" = OrderedDict()
+        self._spilled: Dict[str, str] = {}
+        self._claims: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def _touch_results(self, job_id: str) -> Dict[int, Dict[str, Any]]:
+        """Results of a job in memory (reloading a spilled copy), marked most recently used"""
+        path = self._spilled.pop(job_id, None)
+        if path is not None:
+            self._results[job_id] = load_spilled_results(path)
+            self._result_bytes[job_id] = sum(len(json.dumps(row, default=str))
+                                             for row in self._results[job_id].values())
+            os.remove(path)
+            logger.info(f"Reloaded spilled results for job {job_id}")
+        self._result_bytes.setdefault(job_id, 0)
+        self._result_bytes.move_to_end(job_id)
+        return self._results.setdefault(job_id, {})
+
+    def _enforce_budget(self):
+        """Spill least recently used finished jobs until the in-memory results fit the budget"""
+        if self.memory_budget_bytes is None:
+            return
+        total = sum(self._result_bytes.values())
+        for job_id in list(self._result_bytes):
+            if total <= self.memory_budget_bytes:
+                break
+            if self._jobs.get(job_id, {}).get('status') not in FINISHED_STATUSES:
+                continue
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"{job_id}.results.jsonl.gz")
+            spill_results(path, self._results.pop(job_id))
+            total -= self._result_bytes.pop(job_id)
+            self._spilled[job_id] = path
+            logger.info(f"Spilled results for job {job_id} to {path}")
+
+    def create_job(self, job: Dict[str, Any]) -> None:
+        with self._lock:
+            self._jobs[job['job_id']] = dict(job)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                if fields.get('status') in FINISHED_STATUSES:
+                    self._enforce_budget()
+
+    def increment_job(self, job_id: str, **deltas: float) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                for field, delta in deltas.items():
+                    job[field] = (job.get(field) or 0) + delta
+
+    def delete_job(self, job_id: str) -> bool:
+        with self._lock:
+            self._results.pop(job_id, None)
+            self._result_bytes.pop(job_id, None)
+            path = self._spilled.pop(job_id, None)
+            if path is not None and os.path.exists(path):
+                os.remove(path)
+            return self._jobs.pop(job_id, None) is not None
+
+    def save_results(self, job_id: str, results: List[Dict[str, Any]], start: int = 0) -> None:
+        with self._lock:
+            rows = self._touch_results(job_id)
+            for i, row in enumerate(results, start):
+                if self.memory_budget_bytes is not None:
+                    old = rows.get(i)
+                    self._result_bytes[job_id] += len(json.dumps(row, default=str)) - (
+                        len(json.dumps(old, default=str)) if old is not None else 0)
+                rows[i] = row
+            self._enforce_budget()
+
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            if job_id not in self._results and job_id not in self._spilled:
+                return []
+            rows = self._touch_results(job_id)
+            end = offset + len(rows) if limit is None else offset + limit
+            page = []
+            for position in range(offset, end):
+                row = rows.get(position)
+                if row is None:
+                    break
+                page.append(row)
+            self._enforce_budget()
+        return page
+
+    def count_results(self, job_id: str) -> int:
+        with self._lock:
+            if job_id in self._spilled:
+                return len(self._touch_results(job_id))
+            return len(self._results.get(job_id, {}))
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100, offset: int = 0,
+                  client: Optional[str] = None, before: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = [dict(j) for j in self._jobs.values()
+                    if (status is None or j.get('status') == status) and (client is None or j.get('client') == client)]
+        jobs.sort(key=lambda j: (j.get('created_at') or '', j['job_id']), reverse=True)
+        if before is not None:
+            jobs = [j for j in jobs if (j.get('created_at') or '', j['job_id']) < tuple(before)]
+        return jobs[offset:offset + limit]
+
+    def count_jobs(self, status: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if status is None or j.get('status') == status)
+
+    def claim_key(self, name: str, value: str, ttl_seconds: float, stale: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            now = time.time()
+            # Claims are kept in insertion order, so expired ones collect at the front
+            while self._claims and next(iter(self._claims.values()))[0] <= now:
+                self._claims.popitem(last=False)
+            held = self._claims.get(name)
+            if held is not None and held[0] > now and held[1] != stale:
+                return held[1]
+            self._claims.pop(name, None)
+            self._claims[name] = (now + ttl_seconds, value)
+            return None
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite store in WAL mode, safe for several worker processes on one host"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            data TEXT NOT NULL,
+            client TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+        CREATE TABLE IF NOT EXISTS job_results (
+            job_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (job_id, seq)
+        );
+        CREATE TABLE IF NOT EXISTS job_claims (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_job_claims_expires_at ON job_claims (expires_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(self.SCHEMA)
+        self._add_client_column(conn)
+        logger.info(f"Using SQLite job store at {path}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers proceed while a job writes"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _add_client_column(self, conn: sqlite3.Connection):
+        """Index jobs by client, backfilling stores created before the column existed"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(jobs)")]
+            if 'client' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN client TEXT")
+                rows = conn.execute("SELECT job_id, data FROM jobs").fetchall()
+                conn.executemany("UPDATE jobs SET client = ? WHERE job_id = ?",
+                                 ((json.loads(data).get('client'), job_id) for job_id, data in rows))
+                logger.info(f"Added client column to {len(rows)} stored jobs")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_client ON jobs (client, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_client_status ON jobs (client, status, created_at)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def create_job(self, job: Dict[str, Any]) -> None:
+        self._connect().execute(
+            "INSERT INTO jobs (job_id, status, created_at, data, client) VALUES (?, ?, ?, ?, ?)",
+            (job['job_id'], job['status'], job['created_at'], json.dumps(job), job.get('client'))
+        )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        jobs = {}
+        conn = self._connect()
+        # Stay below SQLite's bound parameter limit
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT job_id, data FROM jobs WHERE job_id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            jobs.update((job_id, json.loads(data)) for job_id, data in rows)
+        return jobs
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        self._modify(job_id, lambda job: job.update(fields))
+
+    def increment_job(self, job_id: str, **deltas: float) -> None:
+        self._modify(job_id, lambda job: job.update(
+            {field: (job.get(field) or 0) + delta for field, delta in deltas.items()}))
+
+    def _modify(self, job_id: str, mutate) -> None:
+        """Read-modify-write a job record inside one write transaction"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row:
+                job = json.loads(row[0])
+                mutate(job)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, data = ? WHERE job_id = ?",
+                    (job['status'], json.dumps(job), job_id)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete_job(self, job_id: str) -> bool:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            deleted = conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,)).rowcount
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return deleted > 0
+
+    def save_results(self, job_id: str, results: List[Dict[str, Any]], start: int = 0) -> None:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, seq, data) VALUES (?, ?, ?)",
+                ((job_id, i, json.dumps(row, default=str)) for i, row in enumerate(results, start))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT seq, data FROM job_results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+            (job_id, offset, -1 if limit is None else limit)
+        ).fetchall()
+        page = []
+        for position, (seq, data) in enumerate(rows, offset):
+            if seq != position:
+                break
+            page.append(json.loads(data))
+        return page
+
+    def count_results(self, job_id: str) -> int:
+        row = self._connect().execute("SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()
+        return row[0]
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100, offset: int = 0,
+                  client: Optional[str] = None, before: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if client:
+            clauses.append("client = ?")
+            params.append(client)
+        if before is not None:
+            clauses.append("(created_at < ? OR (created_at = ? AND job_id < ?))")
+            params.extend([before[0], before[0], before[1]])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"SELECT data FROM jobs {where} ORDER BY created_at DESC, job_id DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset)
+        ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def count_jobs(self, status: Optional[str] = None) -> int:
+        if status:
+            row = self._connect().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()
+        else:
+            row = self._connect().execute("SELECT COUNT(*) FROM jobs").fetchone()
+        return row[0]
+
+    def claim_key(self, name: str, value: str, ttl_seconds: float, stale: Optional[str] = None) -> Optional[str]:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM job_claims WHERE expires_at <= ?", (now,))
+            row = conn.execute("SELECT value FROM job_claims WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != stale:
+                conn.execute("COMMIT")
+                return row[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO job_claims (name, value, expires_at) VALUES (?, ?, ?)",
+                (name, value, now + ttl_seconds)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return None
+
+
+class RedisJobStore(JobStore):
+    """
+    Redis-backed store for running API workers on several hosts
+
+    Works with any client exposing the redis-py command methods, so a
+    Redis-compatible server (or an in-process stand-in) can be used.
+    """
+
+    def __init__(self, client: Any, prefix: str = "cg"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    @staticmethod
+    def _score(created_at: str) -> float:
+        from datetime import datetime
+        return datetime.fromisoformat(created_at).timestamp()
+
+    def create_job(self, job: Dict[str, Any]) -> None:
+        pipe = self.client.pipeline()
+        pipe.set(self._key('job', job['job_id']), json.dumps(job))
+        pipe.zadd(self._key('jobs', 'created'), {job['job_id']: self._score(job['created_at'])})
+        pipe.zadd(self._key('jobs', 'status', job['status']), {job['job_id']: self._score(job['created_at'])})
+        if job.get('client'):
+            pipe.zadd(self._key('jobs', 'client', job['client']), {job['job_id']: self._score(job['created_at'])})
+        pipe.execute()
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.client.get(self._key('job', job_id))
+        return json.loads(data) if data else None
+
+    def get_jobs(self, job_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        if not job_ids:
+            return {}
+        values = self.client.mget([self._key('job', job_id) for job_id in job_ids])
+        return {job_id: json.loads(data) for job_id, data in zip(job_ids, values) if data}
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        self._modify(job_id, lambda job: job.update(fields))
+
+    def increment_job(self, job_id: str, **deltas: float) -> None:
+        self._modify(job_id, lambda job: job.update(
+            {field: (job.get(field) or 0) + delta for field, delta in deltas.items()}))
+
+    def _modify(self, job_id: str, mutate) -> None:
+        key = self._key('job', job_id)
+        # Optimistic transaction so concurrent progress updates do not overwrite each other
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    data = pipe.get(key)
+                    if not data:
+                        pipe.reset()
+                        return
+                    job = json.loads(data)
+                    old_status = job['status']
+                    mutate(job)
+                    pipe.multi()
+                    pipe.set(key, json.dumps(job))
+                    if job['status'] != old_status:
+                        score = self._score(job['created_at'])
+                        pipe.zrem(self._key('jobs', 'status', old_status), job_id)
+                        pipe.zadd(self._key('jobs', 'status', job['status']), {job_id: score})
+                    pipe.execute()
+                    return
+                except Exception as e:
+                    if type(e).__name__ != 'WatchError':
+                        raise
+
+    def delete_job(self, job_id: str) -> bool:
+        job = self.get_job(job_id)
+        pipe = self.client.pipeline()
+        pipe.delete(self._key('job', job_id))
+        pipe.delete(self._key('results', job_id))
+        pipe.zrem(self._key('jobs', 'created'), job_id)
+        if job:
+            pipe.zrem(self._key('jobs', 'status', job['status']), job_id)
+            if job.get('client'):
+                pipe.zrem(self._key('jobs', 'client', job['client']), job_id)
+        pipe.execute()
+        return job is not None
+
+    def save_results(self, job_id: str, results: List[Dict[str, Any]], start: int = 0) -> None:
+        if results:
+            self.client.hset(self._key('results', job_id),
+                             mapping={str(i): json.dumps(row, default=str) for i, row in enumerate(results, start)})
+
+    def get_results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        key = self._key('results', job_id)
+        end = offset + (self.client.hlen(key) if limit is None else limit)
+        if end <= offset:
+            return []
+        page = []
+        for data in self.client.hmget(key, [str(i) for i in range(offset, end)]):
+            if data is None:
+                break
+            page.append(json.loads(data))
+        return page
+
+    def count_results(self, job_id: str) -> int:
+        return self.client.hlen(self._key('results', job_id))
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100, offset: int = 0,
+                  client: Optional[str] = None, before: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        if client:
+            index = self._key('jobs', 'client', client)
+        elif status:
+            index = self._key('jobs', 'status', status)
+        else:
+            index = self._key('jobs', 'created')
+        max_score = '+inf' if before is None else self._score(before[0])
+
+        # Walk the index newest first, filtering what it does not cover
+        jobs, skipped, start, page = [], 0, 0, max(limit + offset, 100)
+        while len(jobs) < limit:
+            job_ids = self.client.zrevrangebyscore(index, max_score, '-inf', start=start, num=page)
+            if not job_ids:
+                break
+            start += len(job_ids)
+            job_ids = [j.decode() if isinstance(j, bytes) else j for j in job_ids]
+            records = self.get_jobs(job_ids)
+            for job_id in job_ids:
+                job = records.get(job_id)
+                if job is None or (status and job['status'] != status):
+                    continue
+                if before is not None and (job['created_at'], job_id) >= tuple(before):
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                jobs.append(job)
+                if len(jobs) == limit:
+                    break
+        return jobs
+
+    def count_jobs(self, status: Optional[str] = None) -> int:
+        return self.client.zcard(self._key('jobs', 'status', status) if status else self._key('jobs', 'created'))
+
+    def claim_key(self, name: str, value: str, ttl_seconds: float, stale: Optional[str] = None) -> Optional[str]:
+        key = self._key('claim', name)
+        # Redis expires the key itself; WATCH makes replacing a stale value atomic
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    held = pipe.get(key)
+                    if isinstance(held, bytes):
+                        held = held.decode()
+                    if held is not None and held != stale:
+                        pipe.reset()
+                        return held
+                    pipe.multi()
+                    pipe.set(key, value, px=max(1, int(ttl_seconds * 1000)))
+                    pipe.execute()
+                    return None
+                except Exception as e:
+                    if type(e).__name__ != 'WatchError':
+                        raise
+
+
+def create_job_store(url: Optional[str] = None) -> JobStore:
+    """Create a job store from a URL (default: CARDGENIUS_JOB_STORE or local SQLite)"""
+    url = url or os.getenv("CARDGENIUS_JOB_STORE", DEFAULT_JOB_STORE_URL)
+
+    if url.startswith("memory://"):
+        budget_mb = float(os.getenv("CARDGENIUS_RESULT_MEMORY_MB", 256))
+        return MemoryJobStore(memory_budget_bytes=int(budget_mb * 1024 * 1024) if budget_mb > 0 else None,
+                              spill_dir=os.getenv("CARDGENIUS_RESULT_SPILL_DIR"))
+
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(url[len("sqlite:///"):])
+
+    if url.startswith(("redis://", "rediss://")):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CARDGENIUS_JOB_STORE uses Redis but the 'redis' package is not installed")
+        return RedisJobStore(redis.Redis.from_url(url))
+
+    raise ValueError(f"Unsupported job store URL: {url}")
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+CardGenius Job Worker
+
+Runs recommendation jobs from the durable job queue (job_queue.py), so the API
+server only validates and enqueues them. Start as many workers as needed, on
+the host that holds the queue and job store; each one runs up to --concurrency
+jobs at a time and shares the job store with the API server.
+
+On SIGTERM or Ctrl+C a worker stops claiming jobs, lets running jobs finish for
+up to --drain-timeout seconds and puts the jobs that have not started back in
+the queue. Jobs still running then, and the jobs of a worker that died, are
+requeued by the other workers once its heartbeat is --stale-after seconds old,
+so a job is never run by two workers at once.
+
+Usage:
+    CARDGENIUS_JOB_QUEUE=sqlite:///cardgenius_queue.db python job_worker.py --concurrency 4
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, Set
+
+from job_store import MemoryJobStore
+from job_runtime import WARMUP_ENABLED, JobRuntime, UserSpendingData, create_job_runtime
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorker:
+    """Claims jobs from the queue and runs them with the shared job functions (job_runtime.py)"""
+
+    def __init__(self, runtime: JobRuntime, concurrency: int = 4, poll_interval: float = 1.0,
+                 heartbeat_interval: float = 10.0, stale_after: float = 60.0, drain_timeout: float = 60.0):
+        """
+        Args:
+            runtime: Job queue, store, executor and job functions of this process
+            concurrency: Jobs run at once by this worker
+            poll_interval: Seconds between queue polls while idle or busy
+            heartbeat_interval: Seconds between heartbeats for claimed jobs
+            stale_after: Seconds without a heartbeat before another worker's jobs are requeued
+            drain_timeout: Seconds to let running jobs finish on shutdown
+        """
+        self.runtime = runtime
+        self.queue = runtime.job_queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.drain_timeout = drain_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._active: Set[str] = set()
+        self._lock = threading.Condition()
+        self._stop = threading.Event()
+
+    def stop(self, *_):
+        """Stop claiming jobs; run() drains and returns"""
+        if not self._stop.is_set():
+            logger.info(f"Worker {self.worker_id} stopping")
+        self._stop.set()
+
+    def run(self):
+        """Claim and run jobs until stop() is called"""
+        logger.info(f"Worker {self.worker_id} started with concurrency {self.concurrency}")
+        last_heartbeat = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now - last_heartbeat >= self.heartbeat_interval:
+                self.queue.heartbeat(self.worker_id)
+                self._report_upstream()
+                self._recover_stale()
+                last_heartbeat = now
+
+            with self._lock:
+                has_capacity = len(self._active) < self.concurrency
+            entry = self.queue.claim(self.worker_id) if has_capacity else None
+            if entry is not None:
+                self._start(entry)
+                continue
+            self._stop.wait(self.poll_interval)
+
+        self._drain()
+
+    def _start(self, entry: Dict[str, Any]):
+        """Hand a claimed job to the executor"""
+        job_id = entry['job_id']
+        payload = entry['payload']
+        client = self.runtime.api_keys.get(entry['client']) if entry['client'] else None
+        with self._lock:
+            self._active.add(job_id)
+        logger.info(f"Worker {self.worker_id} claimed {entry['kind']} job {job_id} (attempt {entry['attempts']})")
+
+        try:
+            if entry['kind'] == 'bulk':
+                if entry['attempts'] > 1:
+                    # Rerun after a worker died: chunks add to the counters, so restart them
+                    self.runtime.job_store.update_job(job_id, processed_users=0, successful=0, failed=0,
+                                                      chunks_completed=0)
+                self.runtime.start_bulk_job(
+                    job_id, payload['spool_path'], payload['format'], payload['top_n_cards'],
+                    payload['version'], client, fields=payload.get('fields'),
+                    on_finished=lambda: self._finished(job_id)
+                )
+            else:
+                users = [UserSpendingData(**user) for user in payload['users']]
+                self.runtime.job_executor.submit(
+                    job_id, self._run_batch, job_id, users, payload['top_n_cards'], payload['version'], client,
+                    payload.get('fields')
+                )
+        except Exception as e:
+            logger.error(f"Could not start job {job_id}: {e}", exc_info=True)
+            self.runtime.job_store.update_job(job_id, status='failed', error=str(e),
+                                              completed_at=datetime.now().isoformat())
+            self.runtime.notify_job_finished(job_id)
+            self._finished(job_id)
+
+    def _run_batch(self, job_id: str, *args):
+        try:
+            self.runtime.process_batch(job_id, *args)
+        finally:
+            self._finished(job_id)
+
+    def _finished(self, job_id: str):
+        """Remove a finished job from the queue, unless shutdown already returned it"""
+        with self._lock:
+            if job_id not in self._active:
+                return
+            self.queue.complete(job_id)
+            self._active.discard(job_id)
+            self._lock.notify_all()
+
+    def _report_upstream(self):
+        """Share this worker's CardGenius circuit state: the API server makes no upstream calls in queue mode"""
+        if self.runtime.upstream_circuit is not None:
+            self.queue.report_upstream(self.worker_id, self.runtime.upstream_circuit.snapshot())
+
+    def _recover_stale(self):
+        """Requeue jobs of workers that stopped heartbeating; fail those that keep killing workers"""
+        requeued, abandoned = self.queue.requeue_stale(self.stale_after)
+        for job_id in requeued:
+            # Waiting for a worker again, as far as status requests can tell
+            self.runtime.job_store.update_job(job_id, status='queued')
+        for entry in abandoned:
+            job_id = entry['job_id']
+            logger.error(f"Giving up on job {job_id} after {entry['attempts']} attempts")
+            self.runtime.job_store.update_job(
+                job_id,
+                status='failed',
+                error=f"Worker stopped responding {entry['attempts']} times while running this job",
+                completed_at=datetime.now().isoformat()
+            )
+            self.runtime.notify_job_finished(job_id)
+            if entry['kind'] == 'bulk':
+                try:
+                    os.remove(entry['payload']['spool_path'])
+                except OSError:
+                    pass
+
+    def _drain(self):
+        """Wait for running jobs, then put back the ones that never started"""
+        deadline = time.monotonic() + self.drain_timeout
+        with self._lock:
+            while self._active and time.monotonic() < deadline:
+                self.queue.heartbeat(self.worker_id)
+                self._lock.wait(min(self.heartbeat_interval, max(deadline - time.monotonic(), 0.01)))
+
+            for job_id in list(self._active):
+                # Taken out of the executor before it started, so no thread of this process runs it
+                if self.runtime.job_executor.cancel(job_id):
+                    logger.warning(f"Job {job_id} did not start before shutdown, returning it to the queue")
+                    self._active.discard(job_id)
+                    self.queue.release(job_id)
+                    self.runtime.job_store.update_job(job_id, status='queued')
+                else:
+                    # Releasing a running job would let another worker run it while this one still writes;
+                    # it is requeued once this worker's heartbeat is stale_after seconds old
+                    logger.warning(f"Job {job_id} still running at shutdown, leaving it to the stale lease recovery")
+        self.runtime.job_executor.shutdown()
+        self.queue.remove_worker(self.worker_id)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='CardGenius job worker')
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv("CARDGENIUS_MAX_CONCURRENT_JOBS", 4)),
+                        help='Jobs run at once by this worker')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between queue polls')
+    parser.add_argument('--heartbeat-interval', type=float, default=10.0, help='Seconds between heartbeats')
+    parser.add_argument('--stale-after', type=float, default=60.0,
+                        help='Seconds without a heartbeat before a dead worker\'s jobs are requeued')
+    parser.add_argument('--drain-timeout', type=float, default=60.0,
+                        help='Seconds to let running jobs finish on shutdown (unfinished ones are requeued '
+                             'once --stale-after expires)')
+    args = parser.parse_args()
+
+    if not os.getenv("CARDGENIUS_JOB_QUEUE"):
+        print("❌ Set CARDGENIUS_JOB_QUEUE (e.g. sqlite:///cardgenius_queue.db) for the API server and workers")
+        sys.exit(1)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    runtime = create_job_runtime(max_concurrent_jobs=args.concurrency)
+    if isinstance(runtime.job_store, MemoryJobStore):
+        print("❌ Workers need a job store shared with the API server (CARDGENIUS_JOB_STORE=sqlite:///... or redis://...)")
+        sys.exit(1)
+
+    if WARMUP_ENABLED:
+        runtime.warm_up()
+
+    worker = JobWorker(
+        runtime,
+        concurrency=args.concurrency,
+        poll_interval=args.poll_interval,
+        heartbeat_interval=args.heartbeat_interval,
+        stale_after=args.stale_after,
+        drain_timeout=args.drain_timeout
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+
+    print(f"🛠️  Worker {worker.worker_id} processing jobs from {os.getenv('CARDGENIUS_JOB_QUEUE')}")
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+CardGenius Raw Response Archive
+
+Stores every raw CardGenius API response (gzip-compressed JSONL) next to the
+batch output, and rebuilds the output offline from that archive. Rebuilding
+re-applies the current commissionable_cards.json, display names, top_n_cards
+and output version without calling the upstream API.
+
+The archive also drives incremental runs: with processing.previous_run set,
+users whose canonical payload hash is unchanged reuse the previous result and
+only new or changed users are sent to the API.
+
+Usage:
+    python response_archive.py --config real_config.json \
+        --archive test_output.responses.jsonl.gz --version v2 --output rebuilt.xlsx
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import os
+import sys
+import argparse
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = '.responses.jsonl.gz'
+
+
+def canonical_payload_hash(payload: Dict[str, Any]) -> str:
+    """Hash an API payload independently of key order and int/float spelling"""
+    canonical = {}
+    for key, value in payload.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        canonical[key] = value
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def default_archive_path(output_file: str) -> str:
+    """Archive path stored alongside an output file (results.xlsx -> results.responses.jsonl.gz)"""
+    base, _ = os.path.splitext(output_file)
+    return base + ARCHIVE_SUFFIX
+
+
+def _json_safe(value: Any) -> Any:
+    """Convert numpy/pandas scalars and NaN to plain JSON values"""
+    if hasattr(value, 'item') and not isinstance(value, (list, dict, str)):
+        try:
+            value = value.item()
+        except (ValueError, TypeError):
+            value = str(value)
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+class ResponseArchive:
+    """Append-only gzip JSONL archive of raw CardGenius responses, one record per user"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self.records_written = 0
+
+    def __enter__(self) -> 'ResponseArchive':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """Open the archive for writing, replacing any previous archive at the same path"""
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+        self.records_written = 0
+        logger.info(f"Archiving raw API responses to {self.path}")
+
+    def close(self):
+        """Flush and close the archive"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"Archived {self.records_written} responses to {self.path}")
+
+    def append(self, row_index: int, user_id: str, row: Dict[str, Any], payload: Optional[Dict[str, Any]],
+               response: Optional[Any], error: str = "", result: Optional[Dict[str, Any]] = None,
+               skipped: bool = False, cancelled: bool = False):
+        """
+        Append one user's input row, payload and raw API response (None on failure)
+
+        result carries already-projected output columns for users reused from a
+        previous Excel output, where no raw response is available. skipped marks
+        a placeholder for an input row that was not processed (empty user ID),
+        and cancelled one for a row the run stopped before, so a rebuild keeps
+        every row in place.
+        """
+        record = {
+            'row_index': int(row_index),
+            'user_id': user_id,
+            'row': {str(k): _json_safe(v) for k, v in row.items()},
+            'payload': payload,
+            'payload_hash': canonical_payload_hash(payload) if payload else None,
+            'response': response,
+            'error': error,
+            'result': {str(k): _json_safe(v) for k, v in result.items()} if result else None,
+            'skipped': skipped,
+            'cancelled': cancelled,
+            'archived_at': datetime.now().isoformat()
+        }
+        line = json.dumps(record, separators=(',', ':'), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.records_written += 1
+
+    @staticmethod
+    def iter_records(path: str) -> Iterator[Dict[str, Any]]:
+        """Yield archived records in the order they were written"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def rebuild_records(runner: Any, archive_path: str) -> List[Dict[str, Any]]:
+    """
+    Re-project archived responses through a runner without any network calls
+
+    Args:
+        runner: CardGeniusBatchRunner or CardGeniusBatchRunnerV2 instance
+        archive_path: Path to a .responses.jsonl.gz archive
+
+    Returns:
+        Output rows (input columns followed by result columns) in input order
+    """
+    records = sorted(ResponseArchive.iter_records(archive_path), key=lambda r: r.get('row_index', 0))
+    result_columns = runner._build_result_columns()
+
+    rows = []
+    for record in records:
+        user_id = record.get('user_id', '')
+        row = dict(record.get('row') or {})
+        row.update(result_columns)
+
+        if record.get('response') is not None:
+            row.update(runner._process_api_response(record['response'], user_id))
+        elif record.get('result'):
+            row.update({k: v for k, v in record['result'].items() if k in result_columns})
+        elif record.get('cancelled'):
+            row['cardgenius_error'] = record.get('error') or "Run cancelled"
+        elif not record.get('skipped'):
+            row['cardgenius_error'] = record.get('error') or f"API call failed for user {user_id}"
+        rows.append(row)
+
+    logger.info(f"Rebuilt {len(rows)} rows from {archive_path}")
+    return rows
+
+
+def load_previous_run(runner: Any, path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Index a previous run by user ID for incremental processing
+
+    Accepts either a response archive (.responses.jsonl.gz) or a previous
+    Excel output. Archived users keep their raw response so they are
+    re-projected with the current commission and display-name config; users
+    from an Excel output keep their already-projected result columns.
+
+    Args:
+        runner: Runner whose column mappings are already resolved
+        path: Previous archive or Excel output
+
+    Returns:
+        Dictionary of {user_id: {'payload_hash', 'response', 'result'}} for
+        users that succeeded in the previous run
+    """
+    previous = {}
+
+    if path.endswith(ARCHIVE_SUFFIX):
+        for record in ResponseArchive.iter_records(path):
+            if record.get('response') is None and not record.get('result'):
+                continue
+            previous[str(record.get('user_id', ''))] = {
+                'payload_hash': record.get('payload_hash'),
+                'response': record.get('response'),
+                'result': record.get('result')
+            }
+        logger.info(f"Loaded {len(previous)} reusable users from archive {path}")
+        return previous
+
+    import pandas as pd
+    df = pd.read_excel(path)
+    result_columns = list(runner._build_result_columns().keys())
+    missing = [c for c in result_columns if c not in df.columns]
+    if missing:
+        logger.warning(f"Previous output {path} lacks {len(missing)} current result columns "
+                       f"(e.g. '{missing[0]}') - recomputing all users")
+        return previous
+
+    available_columns = list(df.columns)
+    user_id_column = runner.config['column_mappings']['user_id']
+    for _, row in df.iterrows():
+        error = row.get('cardgenius_error')
+        if isinstance(error, str) and error.strip():
+            continue
+        payload = runner._prepare_payload(row, available_columns)
+        result = {c: _json_safe(row[c]) for c in result_columns if c != 'cardgenius_error'}
+        previous[str(row.get(user_id_column, ''))] = {
+            'payload_hash': canonical_payload_hash(payload),
+            'response': None,
+            'result': {k: ('' if v is None else v) for k, v in result.items()}
+        }
+    logger.info(f"Loaded {len(previous)} reusable users from previous output {path}")
+    return previous
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Rebuild CardGenius batch output from a raw response archive')
+    parser.add_argument('--config', required=True, help='Path to configuration JSON file')
+    parser.add_argument('--archive', help='Path to the response archive (default: derived from excel.output_file)')
+    parser.add_argument('--output', help='Output Excel file (default: excel.output_file)')
+    parser.add_argument('--version', choices=['v1', 'v2'], default='v1', help='Output format version')
+    parser.add_argument('--top-n', type=int, help='Override processing.top_n_cards')
+    parser.add_argument('--verbose', '-v', action='store_true', help='Enable verbose logging')
+
+    args = parser.parse_args()
+
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    try:
+        import pandas as pd
+        if args.version == 'v2':
+            from cardgenius_batch_runner_v2 import CardGeniusBatchRunnerV2 as runner_class
+        else:
+            from cardgenius_batch_runner import CardGeniusBatchRunner as runner_class
+
+        runner = runner_class(args.config)
+        if args.top_n:
+            runner.config['processing']['top_n_cards'] = args.top_n
+
+        output_file = args.output or runner.config['excel']['output_file']
+        archive_path = args.archive or default_archive_path(runner.config['excel']['output_file'])
+
+        rows = rebuild_records(runner, archive_path)
+        pd.DataFrame(rows).to_excel(output_file, index=False)
+        print(f"\n✅ Rebuilt {len(rows)} rows from {archive_path} -> {output_file} (no API calls)")
+
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
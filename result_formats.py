@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Result Serialization Formats
+
+Encodes a page of job results for /api/v1/results/{job_id}?format=...:
+    json       List of per-user objects (default)
+    columnar   JSON with one array per column, so each of the ~250 v1 keys appears once
+    msgpack    The columnar layout as MessagePack (needs the 'msgpack' package)
+    arrow      Arrow IPC stream, one row per user (needs the 'pyarrow' package)
+
+Bodies are compressed with Brotli (needs the 'brotli' package) or gzip when the
+client's Accept-Encoding allows it.
+"""
+
+import functools
+import gzip
+import json
+import re
+from typing import Any, Dict, Iterable, List, Optional
+
+RESULT_FORMATS = {
+    'json': 'application/json',
+    'columnar': 'application/json',
+    'msgpack': 'application/msgpack',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+
+# Smaller bodies are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+# Per-card result columns: top{rank}_{field}
+RANKED_COLUMN = re.compile(r'^top(\d+)_(.+)$')
+
+
+class ResultFormatError(Exception):
+    """Requested format cannot be produced by this server (its package is not installed)"""
+    pass
+
+
+def project_rows(rows: List[Dict[str, Any]], top: Optional[int] = None, fields: Optional[Iterable[str]] = None,
+                 always: Iterable[str] = ('userid', 'cardgenius_error')) -> List[Dict[str, Any]]:
+    """
+    Rows limited to the first `top` ranked cards and to the requested fields
+
+    Args:
+        rows: Result rows
+        top: Highest card rank to keep (default: all)
+        fields: Per-card field names (card_name keeps top1_card_name, top2_card_name, ...)
+            or whole column names such as avg_amazon_gmv (default: all)
+        always: Columns kept whatever fields lists
+    """
+    if top is None and not fields:
+        return rows
+
+    wanted = set(fields) if fields else None
+    always = set(always)
+
+    def keep(column: str) -> bool:
+        match = RANKED_COLUMN.match(column)
+        if match:
+            return (top is None or int(match.group(1)) <= top) and (wanted is None or match.group(2) in wanted)
+        return wanted is None or column in wanted or column in always
+
+    projected = []
+    keys, selected = None, []
+    for row in rows:
+        # Rows of one job share their columns, so the selection is usually computed once
+        if keys != row.keys():
+            keys = row.keys()
+            selected = [column for column in row if keep(column)]
+        projected.append({column: row[column] for column in selected})
+    return projected
+
+
+def to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Column name -> values, in first-seen column order; missing values are None"""
+    columns: Dict[str, List[Any]] = {}
+    for index, row in enumerate(rows):
+        for key in row:
+            if key not in columns:
+                columns[key] = [None] * index
+        for key, values in columns.items():
+            values.append(row.get(key))
+    return columns
+
+
+def _encode_arrow(envelope: Dict[str, Any], rows: List[Dict[str, Any]]) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ResultFormatError("format=arrow needs the 'pyarrow' package")
+
+    arrays = {}
+    for name, values in to_columns(rows).items():
+        try:
+            arrays[name] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Mixed types (e.g. numbers and error strings): send the column as text
+            arrays[name] = pa.array([None if value is None else str(value) for value in values], type=pa.string())
+
+    # Job fields travel as schema metadata, so readers get them without a second request
+    table = pa.table(arrays).replace_schema_metadata({'cardgenius': json.dumps(envelope, default=str)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_results(envelope: Dict[str, Any], rows: List[Dict[str, Any]], format: str = 'json') -> bytes:
+    """
+    Serialize job fields and result rows in one of RESULT_FORMATS
+
+    Args:
+        envelope: Job fields returned alongside the rows (job_id, status, offset, ...)
+        rows: Result rows as stored by the job store
+        format: Key of RESULT_FORMATS
+
+    Raises:
+        ResultFormatError: when the format's package is not installed
+    """
+    if format == 'arrow':
+        return _encode_arrow(envelope, rows)
+
+    if format == 'json':
+        payload = {**envelope, 'results': rows}
+    else:
+        payload = {**envelope, 'row_count': len(rows), 'columns': to_columns(rows)}
+
+    if format == 'msgpack':
+        try:
+            import msgpack
+        except ImportError:
+            raise ResultFormatError("format=msgpack needs the 'msgpack' package")
+        return msgpack.packb(payload, use_bin_type=True, default=str)
+
+    return json.dumps(payload, default=str, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+@functools.lru_cache(maxsize=None)
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def available_encodings() -> List[str]:
+    """Content encodings this server can produce, preferred first"""
+    return ['br', 'gzip'] if _brotli() is not None else ['gzip']
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """'br' or 'gzip', whichever the Accept-Encoding header prefers (Brotli on ties), or None"""
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip():
+            accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in available_encodings():
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: Optional[str]) -> bytes:
+    """Body compressed with a negotiated encoding ('br', 'gzip' or None)"""
+    if encoding == 'br':
+        return _brotli().compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
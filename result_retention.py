@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Result Retention
+
+Keeps finished job results and output files from growing without bound:
+
+- purge_expired_jobs: deletes finished jobs (and their results) older than a TTL
+- cleanup_output_files: deletes old recommendation xlsx files left by the
+  dashboards, oldest first, by age and by total size
+- spill_results / load_spilled_results: compressed on-disk copies used by the
+  in-memory job store to evict results beyond its memory budget
+- RetentionSweeper: background thread running the periodic cleanups
+"""
+
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Output files written by the Streamlit dashboards ("Keep output file for download")
+OUTPUT_FILE_PATTERNS = ['cardgenius_recommendations_*.xlsx', 'cardgenius_v*_recommendations_*.xlsx']
+
+
+def spill_results(path: str, rows: Dict[int, Dict[str, Any]]) -> int:
+    """Write result rows (position -> row) to a gzip JSONL file; returns the file size"""
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        for position in sorted(rows):
+            f.write(json.dumps([position, rows[position]], default=str))
+            f.write('\n')
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def load_spilled_results(path: str) -> Dict[int, Dict[str, Any]]:
+    """Read rows written by spill_results"""
+    rows = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            position, row = json.loads(line)
+            rows[position] = row
+    return rows
+
+
+def purge_expired_jobs(store: Any, ttl_seconds: float, now: Optional[datetime] = None) -> int:
+    """
+    Delete finished jobs whose completed_at is older than ttl_seconds
+
+    Works with any job_store.JobStore backend. Returns the number of jobs deleted.
+    """
+    cutoff = ((now or datetime.now()) - timedelta(seconds=ttl_seconds)).isoformat()
+    expired: List[str] = []
+    for status in FINISHED_STATUSES:
+        offset = 0
+        while True:
+            page = store.list_jobs(status=status, limit=500, offset=offset)
+            expired.extend(job['job_id'] for job in page
+                           if (job.get('completed_at') or job.get('created_at') or '') < cutoff)
+            if len(page) < 500:
+                break
+            offset += 500
+
+    for job_id in expired:
+        store.delete_job(job_id)
+    if expired:
+        logger.info(f"Purged {len(expired)} jobs older than {ttl_seconds:.0f}s")
+    return len(expired)
+
+
+def cleanup_output_files(directory: str = '.', ttl_seconds: Optional[float] = None,
+                         max_total_bytes: Optional[int] = None,
+                         patterns: Optional[List[str]] = None) -> List[str]:
+    """
+    Delete recommendation output files older than ttl_seconds, then the oldest
+    ones until the rest fit in max_total_bytes
+
+    Returns:
+        Paths of the deleted files
+    """
+    files = []
+    for pattern in patterns or OUTPUT_FILE_PATTERNS:
+        for path in glob.glob(os.path.join(directory, pattern)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    now = time.time()
+    total = sum(size for _, size, _ in files)
+    deleted = []
+    for mtime, size, path in files:
+        expired = ttl_seconds is not None and now - mtime > ttl_seconds
+        over_budget = max_total_bytes is not None and total > max_total_bytes
+        if not (expired or over_budget):
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            deleted.append(path)
+        except OSError as e:
+            logger.warning(f"Could not remove output file {path}: {e}")
+
+    if deleted:
+        logger.info(f"Removed {len(deleted)} old output files from {os.path.abspath(directory)}")
+    return deleted
+
+
+def output_retention_settings() -> Tuple[Optional[float], Optional[int]]:
+    """(ttl_seconds, max_total_bytes) for output files, from CARDGENIUS_OUTPUT_TTL and CARDGENIUS_OUTPUT_MAX_MB"""
+    ttl = float(os.getenv("CARDGENIUS_OUTPUT_TTL", 86400))
+    max_mb = float(os.getenv("CARDGENIUS_OUTPUT_MAX_MB", 1024))
+    return (ttl if ttl > 0 else None), (int(max_mb * 1024 * 1024) if max_mb > 0 else None)
+
+
+class RetentionSweeper:
+    """Daemon thread that periodically purges expired jobs and old output files"""
+
+    def __init__(self, store: Any, job_ttl_seconds: float, interval_seconds: float = 300,
+                 output_dir: Optional[str] = None, output_ttl_seconds: Optional[float] = None,
+                 output_max_bytes: Optional[int] = None):
+        self.store = store
+        self.job_ttl_seconds = job_ttl_seconds
+        self.interval_seconds = interval_seconds
+        self.output_dir = output_dir
+        self.output_ttl_seconds = output_ttl_seconds
+        self.output_max_bytes = output_max_bytes
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention-sweeper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sweep(self):
+        """Run one retention pass"""
+        if self.job_ttl_seconds > 0:
+            purge_expired_jobs(self.store, self.job_ttl_seconds)
+        if self.output_dir:
+            cleanup_output_files(self.output_dir, self.output_ttl_seconds, self.output_max_bytes)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Retention sweep failed: {e}", exc_info=True)
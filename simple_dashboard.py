@@ -14,6 +14,7 @@ from datetime import datetime
 import subprocess
 import sys
 from pathlib import Path
+from result_retention import cleanup_output_files, output_retention_settings
 
 # Page configuration
 st.set_page_config(
@@ -195,6 +196,9 @@ def main():
                 st.header("🚀 Processing")
                 
                 if st.button("▶️ Start Processing", type="primary", use_container_width=True):
+                    # Remove output files from earlier runs past their retention (CARDGENIUS_OUTPUT_TTL / _MAX_MB)
+                    cleanup_output_files('.', *output_retention_settings())
+                    
                     # Create output filename
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                     output_file = f"cardgenius_recommendations_{timestamp}.xlsx"
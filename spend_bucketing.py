@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Spend-Profile Bucketing
+
+Opt-in approximation for very large runs: each spend dimension of the API
+payload is rounded to a bucket before the call, so users whose spends fall in
+the same buckets share one CardGenius API call.
+
+Config (processing.spend_bucketing):
+    {"enabled": true, "mode": "linear", "step": 500}
+    {"enabled": true, "mode": "log", "bins_per_decade": 8, "min_value": 500}
+
+Use validate_spend_bucketing.py to measure ranking agreement against exact
+runs before switching a cohort to bucketed mode.
+"""
+
+import math
+from typing import Dict, Any
+
+# Payload keys carrying user spends; all other keys are sent as 0
+BUCKETED_KEYS = ['amazon_spends', 'flipkart_spends', 'grocery_spends_online', 'other_online_spends']
+
+
+def bucket_value(value: float, config: Dict[str, Any]) -> float:
+    """
+    Round a single spend value to its bucket representative
+
+    linear: nearest multiple of step (e.g. nearest ₹500)
+    log: geometric bins, bins_per_decade per factor of 10; values below
+         min_value fall back to linear rounding with step = min_value
+    """
+    if not value or value <= 0:
+        return 0.0
+
+    mode = config.get('mode', 'linear')
+
+    if mode == 'log':
+        min_value = float(config.get('min_value', 500))
+        if value < min_value:
+            return float(round(value / min_value) * min_value)
+        bins_per_decade = float(config.get('bins_per_decade', 8))
+        exponent = round(math.log10(value) * bins_per_decade) / bins_per_decade
+        return float(round(10 ** exponent))
+
+    step = float(config.get('step', 500))
+    return float(round(value / step) * step)
+
+
+def apply_bucketing(payload: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a copy of the payload with every spend dimension rounded to its bucket"""
+    bucketed = dict(payload)
+    for key in config.get('keys', BUCKETED_KEYS):
+        if isinstance(bucketed.get(key), (int, float)):
+            bucketed[key] = bucket_value(bucketed[key], config)
+    return bucketed
+
+
+def is_enabled(processing_config: Dict[str, Any]) -> bool:
+    """Whether spend bucketing is switched on in the processing config"""
+    bucketing = processing_config.get('spend_bucketing') or {}
+    return bool(bucketing.get('enabled', False))
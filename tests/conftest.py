@@ -0,0 +1,88 @@
+"""
+Shared fixtures: a local fake CardGenius API and the API server wired to it
+
+The API server reads its configuration when imported, so the environment is
+set here first: in-process job store, no warm-up, fast webhook retries and
+cancellation polling.
+"""
+
+import os
+
+import pytest
+
+from fakes import ROOT, FakeCardGenius
+
+os.environ.update({
+    "CARDGENIUS_JOB_STORE": "memory://",
+    "CARDGENIUS_WARMUP": "0",
+    "CARDGENIUS_WEBHOOK_SECRET": "test-webhook-secret",
+    "CARDGENIUS_WEBHOOK_ALLOWED_HOSTS": "127.0.0.1",
+    "CARDGENIUS_WEBHOOK_BASE_DELAY": "0.05",
+    "CARDGENIUS_CANCEL_POLL_SECONDS": "0.05"
+})
+for name in ("CARDGENIUS_JOB_QUEUE", "CARDGENIUS_API_KEYS_FILE", "CARDGENIUS_API_KEY"):
+    os.environ.pop(name, None)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def repo_cwd():
+    """The card registry reads its JSON files relative to the working directory"""
+    previous = os.getcwd()
+    os.chdir(ROOT)
+    yield
+    os.chdir(previous)
+
+
+@pytest.fixture(scope="session")
+def fake_cardgenius():
+    server = FakeCardGenius()
+    yield server
+    server.close()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def runner_config(fake_cardgenius):
+    """Point every batch runner at the fake API, without the pause between requests"""
+    import job_runtime
+
+    original = job_runtime.build_runner_config
+
+    def build_runner_config(top_n_cards):
+        config = original(top_n_cards)
+        config['api'].update(base_url=fake_cardgenius.url, sleep_between_requests=0, max_retries=1, timeout=5)
+        return config
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(job_runtime, "build_runner_config", build_runner_config)
+        patch.setattr(job_runtime, "WARMUP_CONNECT", False)
+        yield build_runner_config
+
+
+@pytest.fixture
+def upstream(fake_cardgenius):
+    """The fake CardGenius API, with no delay and no recorded calls"""
+    fake_cardgenius.reset()
+    yield fake_cardgenius
+    fake_cardgenius.reset()
+
+
+@pytest.fixture(scope="session")
+def server(runner_config):
+    """The api_server module, importing it once the environment and runner config are in place"""
+    import api_server
+
+    api_server.build_runner_config = runner_config
+    return api_server
+
+
+@pytest.fixture(scope="session")
+def client(server):
+    from fastapi.testclient import TestClient
+
+    return TestClient(server.app)
+
+
+@pytest.fixture(scope="session")
+def headers(server):
+    return {"X-API-Key": server.API_KEY}
+
@@ -0,0 +1,159 @@
+"""
+Local stand-ins for the services the API server talks to
+
+    FakeCardGenius   POST endpoint answering like the CardGenius API, with
+                     deterministic cards per payload and an adjustable delay
+    WebhookReceiver  Records webhook deliveries and answers with scripted statuses
+
+Both are plain http.server instances on 127.0.0.1 with a free port, served
+from a daemon thread, so the real HTTP clients (requests sessions) are used.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPEND_KEYS = ['amazon_spends', 'flipkart_spends', 'grocery_spends_online', 'other_online_spends']
+
+_spends = itertools.count(1)
+
+
+def new_users(count: int) -> List[Dict[str, Any]]:
+    """Users with ids and spends never submitted before, so no test's job is deduplicated into another's"""
+    batch = uuid.uuid4().hex[:8]
+    return [{'user_id': f"{batch}-{i}", 'avg_amazon_gmv': 1000 + next(_spends), 'avg_flipkart_gmv': 500}
+            for i in range(count)]
+
+
+def wait_until(predicate: Callable[[], Any], timeout: float = 20.0, interval: float = 0.05) -> Any:
+    """Poll predicate until it returns something truthy; fails the test after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = predicate()
+        if value:
+            return value
+        if time.monotonic() > deadline:
+            raise AssertionError(f"Condition not met within {timeout}s")
+        time.sleep(interval)
+
+
+class LocalServer:
+    """ThreadingHTTPServer on a free local port; handle(method, path, headers, body) -> (status, body)"""
+
+    def __init__(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method: str):
+                body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                status, response = server.handle(method, self.path, dict(self.headers), body)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def do_HEAD(self):
+                self.send_response(405)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+
+    def handle(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        raise NotImplementedError
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeCardGenius(LocalServer):
+    """CardGenius API answering with commissionable cards ranked from a hash of the payload"""
+
+    def __init__(self):
+        with open(os.path.join(ROOT, 'commissionable_cards.json')) as f:
+            cards = json.load(f)['cards']
+        self.card_names = sorted(name for name, card in cards.items() if card.get('commissionable'))
+        # How those cards are named in results (CashKaro display names where one is mapped)
+        with open(os.path.join(ROOT, 'cashkaro_display_names.json')) as f:
+            display_names = json.load(f).get('name_mappings', {})
+        self.result_card_names = {display_names.get(name) or name for name in self.card_names}
+        self.delay = 0.0
+        self.payloads: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def reset(self):
+        with self._lock:
+            self.delay = 0.0
+            self.payloads.clear()
+
+    @property
+    def calls(self) -> int:
+        with self._lock:
+            return len(self.payloads)
+
+    def handle(self, method, path, headers, body):
+        payload = json.loads(body)
+        with self._lock:
+            self.payloads.append(payload)
+            delay = self.delay
+        if delay:
+            time.sleep(delay)
+        return 200, self.response(payload)
+
+    def response(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Same payload, same cards: 25 of the commissionable cards with savings scaled by the spend"""
+        seed = int(hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:8], 16)
+        rnd = random.Random(seed)
+        total = sum(value for value in payload.values() if isinstance(value, (int, float)))
+        savings = []
+        for name in rnd.sample(self.card_names, 25):
+            savings.append({
+                'card_name': name,
+                'total_savings_yearly': round(total * rnd.random() * 0.1, 2),
+                'joining_fees': rnd.choice([0, 500, 1000]),
+                'total_extra_benefits': rnd.choice([0, 250]),
+                'welcomeBenefits': [],
+                'milestone_benefits': [],
+                'redemption_options': [],
+                'recommended_redemption_options': [],
+                'spending_breakdown': {key: {'points_earned': rnd.randint(0, 500), 'savings': rnd.randint(0, 100),
+                                             'explanation': []} for key in SPEND_KEYS}
+            })
+        return {'savings': savings}
+
+
+class WebhookReceiver(LocalServer):
+    """Records deliveries; answers with the scripted statuses in order, then 200"""
+
+    def __init__(self, statuses: List[int] = ()):
+        self.statuses = list(statuses)
+        self.deliveries: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        super().__init__()
+
+    def handle(self, method, path, headers, body):
+        with self._lock:
+            status = self.statuses.pop(0) if self.statuses else 200
+            self.deliveries.append({'path': path, 'headers': headers, 'body': body, 'status': status})
+        return status, {}
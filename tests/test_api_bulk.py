@@ -0,0 +1,72 @@
+"""Bulk uploads: spooling to disk, chunked processing and upload validation"""
+
+import json
+
+import pytest
+
+import job_runtime
+from fakes import new_users, wait_until
+
+
+@pytest.fixture
+def spool_dir(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, 'BULK_SPOOL_DIR', str(tmp_path))
+    return tmp_path
+
+
+def csv_upload(users):
+    lines = ["user_id,avg_amazon_gmv,avg_flipkart_gmv"]
+    lines += [f"{u['user_id']},{u['avg_amazon_gmv']},{u['avg_flipkart_gmv']}" for u in users]
+    return "\n".join(lines).encode()
+
+
+def upload(client, headers, body, content_type, **params):
+    return client.post('/api/v1/bulk-recommendations', content=body, params={'top_n_cards': 3, **params},
+                       headers={**headers, 'Content-Type': content_type})
+
+
+def wait_for_completion(client, headers, job_id):
+    return wait_until(lambda: (lambda job: job['status'] in ('completed', 'failed', 'cancelled') and job)(
+        client.get(f'/api/v1/status/{job_id}', headers=headers).json()))
+
+
+def test_csv_upload_beyond_the_batch_cap_is_processed_in_chunks(client, headers, server, upstream, spool_dir,
+                                                                monkeypatch):
+    monkeypatch.setattr(job_runtime, 'BULK_CHUNK_SIZE', 50)
+    users = new_users(210)
+    response = upload(client, headers, csv_upload(users), 'text/csv')
+    assert response.status_code == 200
+    assert response.json()['total_users'] == 210
+    job_id = response.json()['job_id']
+
+    job = wait_for_completion(client, headers, job_id)
+    assert job['status'] == 'completed'
+    assert job['successful'] == 210
+    assert server.job_store.get_job(job_id)['chunks_completed'] == 5
+    assert upstream.calls == 210
+
+    rows = client.get(f'/api/v1/results/{job_id}?fields=card_name', headers=headers).json()['results']
+    assert [row['userid'] for row in rows] == [u['user_id'] for u in users]
+    # The spool file is removed once the last chunk is done
+    wait_until(lambda: not list(spool_dir.iterdir()))
+
+
+def test_ndjson_upload(client, headers, upstream, spool_dir):
+    users = new_users(3)
+    body = "\n".join(json.dumps(user) for user in users).encode()
+    job_id = upload(client, headers, body, 'application/octet-stream', format='ndjson').json()['job_id']
+
+    assert wait_for_completion(client, headers, job_id)['status'] == 'completed'
+    rows = client.get(f'/api/v1/results/{job_id}', headers=headers).json()['results']
+    assert [row['avg_amazon_gmv'] for row in rows] == [u['avg_amazon_gmv'] for u in users]
+
+
+def test_invalid_uploads_are_rejected_and_not_kept(client, headers, server, upstream, spool_dir, monkeypatch):
+    assert upload(client, headers, b"name,avg_amazon_gmv\nx,100", 'text/csv').status_code == 400
+    assert upload(client, headers, b"user_id,avg_amazon_gmv\n", 'text/csv').status_code == 400
+    assert upload(client, headers, csv_upload(new_users(2)), 'application/xml').status_code == 400
+
+    monkeypatch.setattr(server, 'BULK_MAX_BYTES', 64)
+    assert upload(client, headers, csv_upload(new_users(10)), 'text/csv').status_code == 413
+    assert not list(spool_dir.iterdir())
+    assert upstream.calls == 0
@@ -0,0 +1,90 @@
+"""Debug endpoints: access control, sampling profiler, heap snapshots and runtime saturation"""
+
+import threading
+import time
+import tracemalloc
+
+import pytest
+
+from api_keys import ApiClient, ApiKeyRegistry
+
+OPS = {'X-API-Key': 'ops-key'}
+
+
+@pytest.fixture(autouse=True)
+def keys(server, monkeypatch):
+    """The default key without debug access and an ops key with it"""
+    registry = ApiKeyRegistry([ApiClient("default", server.API_KEY), ApiClient("ops", "ops-key", debug=True)])
+    monkeypatch.setattr(server, 'api_keys', registry)
+    return registry
+
+
+@pytest.mark.parametrize("method, path", [
+    ('GET', '/api/v1/debug/profile?seconds=0.1'),
+    ('POST', '/api/v1/debug/heap/snapshots'),
+    ('GET', '/api/v1/debug/heap/top'),
+    ('GET', '/api/v1/debug/heap/diff?from=1'),
+    ('DELETE', '/api/v1/debug/heap'),
+    ('GET', '/api/v1/debug/runtime')
+])
+def test_debug_endpoints_need_a_debug_key(client, headers, method, path):
+    assert client.request(method, path, headers=headers).status_code == 403
+    assert client.request(method, path).status_code == 401
+
+
+def busy_wait_for_profiler(stop):
+    while not stop.is_set():
+        time.sleep(0.005)
+
+
+def test_profile_returns_collapsed_stacks_of_other_threads(client):
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_wait_for_profiler, args=(stop,), name="profiled worker")
+    thread.start()
+    try:
+        response = client.get('/api/v1/debug/profile?seconds=0.2&interval_ms=5&lines=false', headers=OPS)
+    finally:
+        stop.set()
+        thread.join()
+
+    assert response.status_code == 200
+    assert response.headers['content-disposition'].endswith('.collapsed"')
+    stacks = [line.rsplit(' ', 1) for line in response.text.splitlines()]
+    assert all(count.isdigit() for _, count in stacks)
+    profiled = [stack for stack, _ in stacks if stack.startswith('profiled_worker;')]
+    assert profiled and any('busy_wait_for_profiler (test_api_debug.py)' in stack for stack in profiled)
+
+
+def test_only_one_profile_runs_at_a_time(client, server):
+    assert client.get(f'/api/v1/debug/profile?seconds={server.PROFILE_MAX_SECONDS + 1}',
+                      headers=OPS).status_code == 400
+    with server.profile_lock:
+        assert client.get('/api/v1/debug/profile?seconds=0.1', headers=OPS).status_code == 409
+
+
+def test_heap_snapshots_show_what_grew(client):
+    assert client.get('/api/v1/debug/heap/top', headers=OPS).status_code == 409
+    try:
+        snapshot = client.post('/api/v1/debug/heap/snapshots', headers=OPS).json()
+        assert snapshot['tracing_started'] is True
+        retained = [bytearray(1000) for _ in range(2000)]
+
+        diff = client.get(f"/api/v1/debug/heap/diff?from={snapshot['snapshot_id']}", headers=OPS).json()
+        assert diff['size_diff_bytes'] > 1_000_000
+        assert 'test_api_debug.py' in diff['top'][0]['location']
+
+        top = client.get('/api/v1/debug/heap/top?limit=5&group_by=filename', headers=OPS).json()
+        assert len(top['top']) <= 5 and top['traced_bytes'] > 1_000_000
+        assert client.get('/api/v1/debug/heap/diff?from=999', headers=OPS).status_code == 404
+        del retained
+    finally:
+        assert client.delete('/api/v1/debug/heap', headers=OPS).status_code == 200
+    assert not tracemalloc.is_tracing()
+
+
+def test_runtime_reports_saturation(client):
+    runtime = client.get('/api/v1/debug/runtime', headers=OPS).json()
+    assert set(runtime) >= {'event_loop_lag', 'threadpool', 'job_executor', 'upstream', 'threads'}
+    assert runtime['threadpool']['max_threads'] > 0
+    assert 0 <= runtime['threadpool']['saturation'] <= 1
+    assert runtime['upstream']['max_concurrent'] >= 1
@@ -0,0 +1,57 @@
+"""Server-Sent Events progress stream of a job"""
+
+import json
+
+import pytest
+
+from fakes import new_users, wait_until
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(server, monkeypatch):
+    monkeypatch.setattr(server, 'SSE_POLL_INTERVAL', 0.02)
+
+
+def read_events(client, headers, job_id):
+    """(event, data) pairs of the whole stream, which ends with the job"""
+    response = client.get(f'/api/v1/jobs/{job_id}/events', headers=headers)
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = []
+    for message in response.text.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return response.text, events
+
+
+def test_progress_events_then_a_final_event(client, headers, upstream):
+    upstream.delay = 0.03
+    users = new_users(10)
+    job_id = client.post('/api/v1/recommendations', json={'users': users, 'top_n_cards': 3},
+                         headers=headers).json()['job_id']
+
+    text, events = read_events(client, headers, job_id)
+    assert text.startswith('retry: 3000\n\n')
+    names = [name for name, _ in events]
+    assert names[-1] == 'completed' and names[:-1] and set(names[:-1]) == {'progress'}
+
+    processed = [data['processed_users'] for _, data in events]
+    assert processed == sorted(processed)
+    # An event is only sent when something changed
+    counters = [(data['status'], data['processed_users'], data['queue_position']) for _, data in events]
+    assert all(before != after for before, after in zip(counters, counters[1:]))
+    final = events[-1][1]
+    assert final['job_id'] == job_id and final['processed_users'] == 10 and final['successful'] == 10
+
+
+def test_a_finished_job_sends_only_its_final_event(client, headers, upstream):
+    job_id = client.post('/api/v1/recommendations', json={'users': new_users(2), 'top_n_cards': 3},
+                         headers=headers).json()['job_id']
+    wait_until(lambda: client.get(f'/api/v1/status/{job_id}', headers=headers).json()['status'] == 'completed')
+
+    _, events = read_events(client, headers, job_id)
+    assert [name for name, _ in events] == ['completed']
+
+
+def test_events_of_unknown_jobs_are_not_found(client, headers):
+    assert client.get('/api/v1/jobs/no-such-job/events', headers=headers).status_code == 404
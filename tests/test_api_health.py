@@ -0,0 +1,83 @@
+"""Readiness and scaling signals: /readyz checks in both deployment modes and the /scaling backlog"""
+
+import pytest
+
+from fakes import new_users
+from job_queue import JobQueue
+
+
+def open_circuit(circuit):
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure("HTTP 503")
+
+
+def circuit(state):
+    return {'state': state, 'consecutive_failures': 5 if state == 'open' else 0,
+            'last_error': "HTTP 503" if state == 'open' else None}
+
+
+def test_readyz_fails_while_the_upstream_circuit_is_open(client, server):
+    ready = client.get('/readyz')
+    assert ready.status_code == 200
+    assert ready.json()['checks']['upstream']['source'] == 'api_server'
+
+    open_circuit(server.upstream_circuit)
+    try:
+        response = client.get('/readyz')
+        assert response.status_code == 503
+        upstream = response.json()['checks']['upstream']
+        assert upstream['ok'] is False and upstream['state'] == 'open'
+        assert response.json()['checks']['job_queue']['ok'] is True
+    finally:
+        server.upstream_circuit.record_success()
+    assert client.get('/readyz').status_code == 200
+
+
+def test_readyz_uses_the_worker_circuits_in_queue_mode(client, server, tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "queue.db"))
+    monkeypatch.setattr(server, 'job_queue', queue)
+    # The API process's own circuit makes no difference in this mode
+    open_circuit(server.upstream_circuit)
+    try:
+        upstream = client.get('/readyz').json()['checks']['upstream']
+        assert upstream == {'ok': True, 'source': 'workers', 'workers': 0, 'open_workers': [], 'last_error': None}
+
+        queue.report_upstream('host:1', circuit('open'))
+        queue.report_upstream('host:2', circuit('closed'))
+        assert client.get('/readyz').status_code == 200
+
+        queue.report_upstream('host:2', circuit('open'))
+        response = client.get('/readyz')
+        assert response.status_code == 503
+        upstream = response.json()['checks']['upstream']
+        assert upstream['open_workers'] == ['host:1', 'host:2']
+        assert upstream['last_error'] == "HTTP 503"
+
+        # A worker that stopped reporting no longer counts
+        monkeypatch.setattr(server, 'WORKER_STALE_SECONDS', -1)
+        assert client.get('/readyz').status_code == 200
+    finally:
+        server.upstream_circuit.record_success()
+
+
+def test_scaling_counts_the_unprocessed_users_of_active_jobs(client, server):
+    before = client.get('/scaling').json()
+    job_ids = []
+    for status, total, processed in [('queued', 400, 0), ('processing', 300, 100)]:
+        job_id = f"scaling-{new_users(1)[0]['user_id']}"
+        server.job_store.create_job({'job_id': job_id, 'status': status, 'total_users': total,
+                                     'processed_users': processed, 'created_at': '2026-01-01T00:00:00'})
+        job_ids.append(job_id)
+    try:
+        signal = client.get('/scaling').json()
+        assert signal['backlog_users'] - before['backlog_users'] == 600
+        assert signal['active_jobs'] - before['active_jobs'] == 2
+        assert signal['desired_workers'] >= -(-signal['active_jobs'] // signal['jobs_per_worker'])
+    finally:
+        for job_id in job_ids:
+            server.job_store.delete_job(job_id)
+
+
+@pytest.mark.parametrize("path", ['/healthz', '/readyz', '/scaling'])
+def test_probes_need_no_api_key(client, path):
+    assert client.get(path).status_code == 200
@@ -0,0 +1,324 @@
+"""Batch jobs through the API: scheduling, cancellation, deduplication, result formats and webhooks"""
+
+import io
+import json
+
+import pytest
+
+from api_keys import ApiClient, ApiKeyRegistry
+from fakes import WebhookReceiver, new_users, wait_until
+from job_executor import JobExecutor
+from webhooks import verify_signature
+
+
+def submit(client, headers, users, **fields):
+    return client.post('/api/v1/recommendations', json={'users': users, 'top_n_cards': 3, **fields}, headers=headers)
+
+
+def wait_for_status(client, headers, job_id, *statuses):
+    return wait_until(lambda: (lambda job: job['status'] in statuses and job)(
+        client.get(f'/api/v1/status/{job_id}', headers=headers).json()))
+
+
+def test_batch_job_results(client, headers, upstream):
+    users = new_users(4)
+    response = submit(client, headers, users)
+    assert response.status_code == 200
+    job_id = response.json()['job_id']
+
+    job = wait_for_status(client, headers, job_id, 'completed')
+    assert job['successful'] == 4
+    assert upstream.calls == 4
+
+    page = client.get(f'/api/v1/results/{job_id}?offset=1&limit=2', headers=headers).json()
+    assert [row['userid'] for row in page['results']] == [users[1]['user_id'], users[2]['user_id']]
+    assert page['next_offset'] == 3
+    assert page['results'][0]['top1_card_name'] in upstream.result_card_names
+
+
+def test_status_reports_live_progress_rate_and_eta(client, headers, upstream):
+    upstream.delay = 0.05
+    job_id = submit(client, headers, new_users(20)).json()['job_id']
+
+    running = wait_until(lambda: (lambda job: job['status'] == 'processing' and job['processed_users'] >= 3 and job)(
+        client.get(f'/api/v1/status/{job_id}', headers=headers).json()))
+    assert running['processed_users'] < 20
+    assert running['progress_percentage'] == running['processed_users'] / 20 * 100
+    assert running['rate_per_second'] > 0
+    assert running['eta_seconds'] > 0
+
+    later = client.get(f'/api/v1/status/{job_id}', headers=headers).json()
+    assert later['processed_users'] >= running['processed_users']
+
+    done = wait_for_status(client, headers, job_id, 'completed')
+    assert done['processed_users'] == 20 and done['progress_percentage'] == 100
+    assert done.get('rate_per_second') is None and done.get('eta_seconds') is None
+
+
+def test_full_executor_queue_answers_429_with_retry_after(client, headers, server, upstream, monkeypatch):
+    # One running job and one waiting fill this executor
+    executor = JobExecutor(max_concurrent_jobs=1, max_queued_jobs=1)
+    monkeypatch.setattr(server, 'job_executor', executor)
+    upstream.delay = 0.1
+
+    running = submit(client, headers, new_users(20)).json()['job_id']
+    waiting = submit(client, headers, new_users(2)).json()
+    assert waiting['queue_position'] == 1
+
+    rejected = submit(client, headers, new_users(2))
+    assert rejected.status_code == 429
+    assert int(rejected.headers['Retry-After']) >= 1
+    assert server.job_store.count_jobs('queued') + server.job_store.count_jobs('processing') >= 2
+
+    for job_id in (running, waiting['job_id']):
+        assert client.delete(f'/api/v1/job/{job_id}', headers=headers).status_code == 200
+    wait_for_status(client, headers, running, 'cancelled')
+    executor.shutdown()
+
+
+def test_cancel_keeps_the_results_of_processed_users(client, headers, upstream):
+    upstream.delay = 0.05
+    users = new_users(40)
+    job_id = submit(client, headers, users).json()['job_id']
+    wait_until(lambda: client.get(f'/api/v1/status/{job_id}', headers=headers).json()['processed_users'] >= 5)
+
+    assert client.delete(f'/api/v1/job/{job_id}', headers=headers).status_code == 200
+    job = wait_for_status(client, headers, job_id, 'cancelled')
+    assert 5 <= job['processed_users'] < 40
+
+    results = client.get(f'/api/v1/results/{job_id}', headers=headers).json()
+    assert results['status'] == 'cancelled'
+    assert [row['userid'] for row in results['results']] == [u['user_id'] for u in users[:job['processed_users']]]
+
+
+def test_cancelled_job_with_a_skipped_row_pages_and_streams_every_stored_row(client, headers, upstream):
+    upstream.delay = 0.05
+    users = new_users(9)
+    users[2]['user_id'] = ''
+    job_id = submit(client, headers, users).json()['job_id']
+    wait_until(lambda: client.get(f'/api/v1/status/{job_id}', headers=headers).json()['processed_users'] >= 4)
+
+    assert client.delete(f'/api/v1/job/{job_id}', headers=headers).status_code == 200
+    processed = wait_for_status(client, headers, job_id, 'cancelled')['processed_users']
+    expected = [u['user_id'] for u in users[:processed]]
+
+    rows = client.get(f'/api/v1/results/{job_id}', headers=headers).json()['results']
+    assert [row['userid'] for row in rows] == expected
+    assert rows[2]['cardgenius_error'] == 'skipped: empty user_id'
+
+    page = client.get(f'/api/v1/results/{job_id}?offset=1&limit=2', headers=headers).json()
+    assert [row['userid'] for row in page['results']] == expected[1:3]
+    assert page['next_offset'] == 3
+
+    # The stream ends once every stored row was sent
+    stream = client.get(f'/api/v1/results/{job_id}/stream', headers=headers)
+    assert [json.loads(line)['userid'] for line in stream.text.splitlines()] == expected
+
+
+def test_a_page_cut_short_by_a_missing_row_is_flagged_partial(client, headers, server):
+    job_id = f"holes-{new_users(1)[0]['user_id']}"
+    server.job_store.create_job({'job_id': job_id, 'status': 'cancelled', 'total_users': 10, 'processed_users': 6,
+                                 'successful': 6, 'failed': 0, 'version': 'v1', 'created_at': '2026-01-01T00:00:00'})
+    # Position 3 was never stored
+    server.job_store.save_results(job_id, [{'userid': f'u{i}'} for i in range(3)])
+    server.job_store.save_results(job_id, [{'userid': f'u{i}'} for i in range(4, 7)], start=4)
+
+    page = client.get(f'/api/v1/results/{job_id}?limit=5', headers=headers).json()
+    assert [row['userid'] for row in page['results']] == ['u0', 'u1', 'u2']
+    assert page['partial'] is True
+    assert page['next_offset'] == 3
+
+    everything = client.get(f'/api/v1/results/{job_id}', headers=headers).json()
+    assert everything['partial'] is True and everything['next_offset'] == 3
+
+    tail = client.get(f'/api/v1/results/{job_id}?offset=4&limit=5', headers=headers).json()
+    assert [row['userid'] for row in tail['results']] == ['u4', 'u5', 'u6']
+    assert tail['partial'] is False
+    assert tail['next_offset'] is None
+
+
+def stored_job(server, status, total_users, rows, processed_users=None):
+    """A finished job written straight to the store, with rows stored at their positions"""
+    job_id = f"{status}-{new_users(1)[0]['user_id']}"
+    server.job_store.create_job({'job_id': job_id, 'status': status, 'total_users': total_users,
+                                 'processed_users': total_users if processed_users is None else processed_users,
+                                 'successful': 0, 'failed': 0, 'version': 'v1', 'created_at': '2026-01-01T00:00:00'})
+    for start, run in rows:
+        server.job_store.save_results(job_id, run, start)
+    return job_id
+
+
+def test_batch_status_and_results(client, headers, server, upstream):
+    users = new_users(3)
+    completed = submit(client, headers, users).json()['job_id']
+    wait_for_status(client, headers, completed, 'completed')
+    # A cancelled bulk job: two users processed, two placeholder rows for its started chunk
+    cancelled = stored_job(server, 'cancelled', 10, [(0, [{'userid': 'c0'}, {'userid': 'c1'}] + [
+        {'userid': f'c{i}', 'cardgenius_error': "Job cancelled"} for i in (2, 3)])], processed_users=2)
+    holes = stored_job(server, 'cancelled', 10, [(0, [{'userid': 'h0'}]), (2, [{'userid': 'h2'}])])
+    job_ids = [completed, cancelled, holes, 'missing-job']
+
+    status = client.post('/api/v1/status:batch', json={'job_ids': job_ids}, headers=headers).json()
+    assert list(status['jobs']) == [completed, cancelled, holes]
+    assert status['jobs'][completed]['successful'] == 3
+    assert status['not_found'] == ['missing-job']
+    assert status['summary']['by_status'] == {'completed': 1, 'cancelled': 2}
+    assert status['summary']['finished'] is True
+
+    batch = client.post('/api/v1/results:batch', json={'job_ids': job_ids, 'fields': ['card_name']},
+                        headers=headers).json()
+    assert batch['included'] == [completed, cancelled, holes]
+    assert batch['not_found'] == ['missing-job']
+    assert batch['partial'] == [holes]
+    assert [(row['job_id'], row['userid']) for row in batch['results']] == (
+        [(completed, u['user_id']) for u in users] + [(cancelled, f'c{i}') for i in range(4)] + [(holes, 'h0')])
+
+    assert client.post('/api/v1/status:batch', json={'job_ids': []}, headers=headers).status_code == 400
+
+
+def test_jobs_are_listed_newest_first_in_stable_pages(client, headers, server, monkeypatch):
+    registry = ApiKeyRegistry([ApiClient("default", server.API_KEY), ApiClient("lister", "lister-key")])
+    monkeypatch.setattr(server, 'api_keys', registry)
+    lister = {'X-API-Key': 'lister-key'}
+
+    def create(job_id, status, created_at, client_name='lister'):
+        server.job_store.create_job({'job_id': job_id, 'status': status, 'total_users': 1, 'processed_users': 1,
+                                     'successful': 1, 'failed': 0, 'version': 'v1', 'client': client_name,
+                                     'created_at': created_at, 'completed_at': created_at})
+
+    prefix = new_users(1)[0]['user_id']
+    for i, status in enumerate(['completed', 'failed', 'completed', 'cancelled', 'completed']):
+        create(f"{prefix}-{i}", status, f"2026-01-01T00:00:0{i}")
+    create(f"{prefix}-other", 'completed', "2026-01-01T00:00:09", client_name='default')
+
+    first = client.get('/api/v1/jobs?limit=2', headers=lister).json()
+    assert [job['job_id'] for job in first['jobs']] == [f"{prefix}-4", f"{prefix}-3"]
+    assert first['jobs'][1]['status'] == 'cancelled'
+    assert first['jobs'][1]['created_at'] == "2026-01-01T00:00:03"
+
+    # A job created meanwhile does not shift the following pages
+    create(f"{prefix}-5", 'completed', "2026-01-01T00:00:05")
+    second = client.get('/api/v1/jobs', params={'limit': 2, 'cursor': first['next_cursor']}, headers=lister).json()
+    assert [job['job_id'] for job in second['jobs']] == [f"{prefix}-2", f"{prefix}-1"]
+    last = client.get('/api/v1/jobs', params={'limit': 2, 'cursor': second['next_cursor']}, headers=lister).json()
+    assert [job['job_id'] for job in last['jobs']] == [f"{prefix}-0"]
+    assert last['next_cursor'] is None
+
+    completed = client.get('/api/v1/jobs?status=completed', headers=lister).json()
+    assert [job['job_id'] for job in completed['jobs']] == [f"{prefix}-{i}" for i in (5, 4, 2, 0)]
+    assert client.get('/api/v1/jobs?cursor=not-a-cursor', headers=lister).status_code == 400
+    assert client.get('/api/v1/jobs?limit=0', headers=lister).status_code == 422
+
+
+def test_idempotency_key_returns_the_existing_job(client, headers, upstream):
+    users = new_users(2)
+    keyed = {**headers, 'Idempotency-Key': users[0]['user_id']}
+    first = submit(client, keyed, users).json()
+    again = submit(client, keyed, users).json()
+    assert again['job_id'] == first['job_id']
+    assert again['duplicate'] is True
+
+    # The same key with a different request is an error, not a silent duplicate
+    assert submit(client, keyed, new_users(2)).status_code == 422
+    wait_for_status(client, headers, first['job_id'], 'completed')
+
+
+def test_identical_submissions_are_deduplicated(client, headers, upstream):
+    users = new_users(3)
+    first = submit(client, headers, users).json()
+    wait_for_status(client, headers, first['job_id'], 'completed')
+
+    again = submit(client, headers, users).json()
+    assert again['job_id'] == first['job_id']
+    assert again['status'] == 'completed'
+    assert upstream.calls == 3
+
+    other = submit(client, headers, users, version='v2').json()
+    assert other['job_id'] != first['job_id']
+    wait_for_status(client, headers, other['job_id'], 'completed')
+
+
+@pytest.fixture
+def finished_job(client, headers, upstream):
+    users = new_users(30)
+    job_id = submit(client, headers, users).json()['job_id']
+    wait_for_status(client, headers, job_id, 'completed')
+    return job_id, users
+
+
+def test_result_formats(client, headers, finished_job):
+    job_id, users = finished_job
+    user_ids = [u['user_id'] for u in users]
+    url = f'/api/v1/results/{job_id}?fields=card_name,net_savings'
+    rows = client.get(url, headers=headers).json()['results']
+    assert [row['userid'] for row in rows] == user_ids
+
+    columnar = client.get(f'{url}&format=columnar', headers=headers).json()
+    assert columnar['row_count'] == 30
+    assert columnar['columns']['userid'] == user_ids
+    assert columnar['columns']['top1_card_name'] == [row['top1_card_name'] for row in rows]
+
+    pa = pytest.importorskip("pyarrow")
+    response = client.get(f'{url}&format=arrow', headers=headers)
+    assert response.headers['content-type'] == 'application/vnd.apache.arrow.stream'
+    table = pa.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert table.column('userid').to_pylist() == user_ids
+    assert json.loads(table.schema.metadata[b'cardgenius'])['job_id'] == job_id
+
+
+def test_msgpack_format(client, headers, finished_job):
+    job_id, users = finished_job
+    response = client.get(f'/api/v1/results/{job_id}?format=msgpack', headers=headers)
+    try:
+        import msgpack
+    except ImportError:
+        assert response.status_code == 501
+        return
+    assert msgpack.unpackb(response.content)['columns']['userid'] == [u['user_id'] for u in users]
+
+
+def test_results_are_compressed_when_accepted(client, headers, finished_job):
+    job_id, _ = finished_job
+    response = client.get(f'/api/v1/results/{job_id}', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert response.headers['content-encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['vary']
+    assert response.json()['job_id'] == job_id
+
+    identity = client.get(f'/api/v1/results/{job_id}', headers={**headers, 'Accept-Encoding': 'identity'})
+    assert 'content-encoding' not in identity.headers
+    assert client.get(f'/api/v1/results/{job_id}?format=xml', headers=headers).status_code == 400
+
+
+def test_completion_webhook_is_signed_and_retried(client, headers, server, upstream):
+    receiver = WebhookReceiver(statuses=[503])
+    try:
+        job_id = submit(client, headers, new_users(2), callback_url=f"{receiver.url}/hooks/cardgenius").json()['job_id']
+        wait_until(lambda: len(receiver.deliveries) == 2)
+
+        failed, delivered = receiver.deliveries
+        assert failed['status'] == 503 and delivered['status'] == 200
+        assert delivered['path'] == '/hooks/cardgenius'
+        assert delivered['headers']['X-CardGenius-Delivery'] == failed['headers']['X-CardGenius-Delivery']
+        assert delivered['headers']['X-CardGenius-Event'] == 'job.completed'
+        assert verify_signature("test-webhook-secret", delivered['headers']['X-CardGenius-Timestamp'], delivered['body'],
+                                delivered['headers']['X-CardGenius-Signature'])
+
+        event = json.loads(delivered['body'])
+        assert event['job_id'] == job_id
+        assert event['successful'] == 2
+        assert event['results_url'] == f"/api/v1/results/{job_id}"
+    finally:
+        receiver.close()
+
+
+def test_callback_url_to_an_internal_host_is_rejected(client, headers):
+    response = submit(client, headers, new_users(2), callback_url="http://169.254.169.254/latest/meta-data/")
+    assert response.status_code == 400
+    assert 'public host' in response.json()['detail']
+
+
+def test_callback_url_needs_a_webhook_secret(client, headers, server, monkeypatch):
+    monkeypatch.setattr(server.jobs.webhook_notifier, 'secret', None)
+    response = submit(client, headers, new_users(2), callback_url="https://hooks.example.com/cardgenius")
+    assert response.status_code == 400
+    assert 'CARDGENIUS_WEBHOOK_SECRET' in response.json()['detail']
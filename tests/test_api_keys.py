@@ -0,0 +1,111 @@
+"""Per-key clients: weighted-fair upstream slots, request and concurrency quotas, usage counters"""
+
+import threading
+
+import pytest
+
+from api_keys import ApiClient, ApiKeyRegistry
+from fakes import new_users, wait_until
+from job_executor import JobCancelled, UpstreamBudget
+
+
+def test_free_slots_go_to_tenants_by_weight():
+    budget = UpstreamBudget(1)
+    granted = []
+
+    def request(tenant, weight):
+        with budget.slot(tenant, weight):
+            granted.append(tenant)
+
+    with budget.slot("other"):
+        threads = []
+        # The bulk tenant is in line first, with as many requests as the analysts
+        for tenant, weight in [("bulk", 1)] * 4 + [("analysts", 4)] * 4:
+            threads.append(threading.Thread(target=request, args=(tenant, weight)))
+            threads[-1].start()
+            wait_until(lambda: budget.stats()['waiting'] == len(threads))
+    for thread in threads:
+        thread.join()
+
+    assert granted == ["analysts"] * 3 + ["bulk", "analysts"] + ["bulk"] * 3
+    assert budget.stats() == {'in_use': 0, 'max_concurrent': 1, 'waiting': 0}
+
+
+def test_a_cancelled_waiter_leaves_the_line():
+    budget = UpstreamBudget(1)
+    cancel_event = threading.Event()
+    outcome = []
+
+    def request():
+        try:
+            with budget.slot("bulk", cancel_event=cancel_event):
+                outcome.append("granted")
+        except JobCancelled:
+            outcome.append("cancelled")
+
+    with budget.slot("other"):
+        thread = threading.Thread(target=request)
+        thread.start()
+        wait_until(lambda: budget.stats()['waiting'] == 1)
+        cancel_event.set()
+        thread.join(timeout=5)
+        assert outcome == ["cancelled"]
+        assert budget.stats()['waiting'] == 0
+
+
+@pytest.fixture
+def keys(server, monkeypatch):
+    """Registry with the default key plus a rate-limited and a concurrency-limited client"""
+    registry = ApiKeyRegistry([
+        ApiClient("default", server.API_KEY),
+        ApiClient("analysts", "analysts-key", weight=4, requests_per_minute=2),
+        ApiClient("nightly-bulk", "nightly-key", max_active_jobs=1)
+    ])
+    monkeypatch.setattr(server, 'api_keys', registry)
+    monkeypatch.setattr(server.jobs, 'api_keys', registry)
+    return registry
+
+
+def submit(client, key, users):
+    return client.post('/api/v1/recommendations', json={'users': users, 'top_n_cards': 3},
+                       headers={'X-API-Key': key})
+
+
+def test_requests_beyond_the_rate_quota_are_rejected(client, keys):
+    analysts = {'X-API-Key': 'analysts-key'}
+    assert client.get('/api/v1/usage', headers=analysts).status_code == 200
+    assert client.get('/api/v1/usage', headers=analysts).status_code == 200
+    response = client.get('/api/v1/usage', headers=analysts)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert keys.get('analysts').usage['rejected_rate_limit'] == 1
+
+    # Other clients are not affected
+    assert client.get('/api/v1/usage', headers={'X-API-Key': 'nightly-key'}).status_code == 200
+
+
+def test_active_job_quota_and_usage_counters(client, keys, upstream):
+    nightly = {'X-API-Key': 'nightly-key'}
+    upstream.delay = 0.05
+    job_id = submit(client, 'nightly-key', new_users(5)).json()['job_id']
+    assert submit(client, 'nightly-key', new_users(1)).status_code == 429
+
+    # Jobs belong to the client that submitted them
+    assert client.get(f'/api/v1/status/{job_id}', headers={'X-API-Key': 'analysts-key'}).status_code == 404
+    wait_until(lambda: client.get(f'/api/v1/status/{job_id}', headers=nightly).json()['status'] == 'completed')
+
+    usage = client.get('/api/v1/usage', headers=nightly).json()
+    assert usage['client'] == 'nightly-bulk'
+    assert usage['max_active_jobs'] == 1
+    assert usage['active_jobs'] == 0
+    assert usage['upstream_slots_in_use'] == 0
+    assert usage['usage']['jobs_submitted'] == 1
+    assert usage['usage']['users_submitted'] == 5
+    assert usage['usage']['upstream_calls'] == 5
+    assert usage['usage']['rejected_concurrency'] == 1
+
+    # The finished job frees the slot
+    response = submit(client, 'nightly-key', new_users(1))
+    assert response.status_code == 200
+    job_id = response.json()['job_id']
+    wait_until(lambda: client.get(f'/api/v1/status/{job_id}', headers=nightly).json()['status'] == 'completed')
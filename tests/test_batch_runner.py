@@ -0,0 +1,111 @@
+"""The batch runner against the fake CardGenius API: result rows, progress and the per-row loop"""
+
+import math
+import threading
+
+import pytest
+
+from cardgenius_batch_runner import CardGeniusBatchRunner
+from fakes import new_users
+from job_executor import JobProgress
+from job_runtime import UserSpendingData, user_records
+from response_archive import ResponseArchive, rebuild_records
+
+
+@pytest.fixture
+def config(runner_config):
+    return runner_config(3)
+
+
+def records(users):
+    """Runner input records, as API jobs build them"""
+    return user_records([UserSpendingData(**user) for user in users])
+
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def test_missing_values_are_filled_in_results_and_progress_rows(config, upstream):
+    users = records(new_users(2))
+    # A spend column only one user has is NaN for the other
+    del users[1]['avg_grocery_gmv']
+    progress_rows = {}
+    progress = JobProgress(2, on_results=lambda start, rows: progress_rows.update(enumerate(rows, start)))
+
+    results = CardGeniusBatchRunner(config, progress=progress).process_records(users)
+    progress.flush()
+
+    assert results[1]['avg_grocery_gmv'] == 0
+    assert progress_rows[1]['avg_grocery_gmv'] == 0
+    for row in results + list(progress_rows.values()):
+        assert not [col for col, value in row.items() if is_missing(value)]
+
+
+class CancelAfter:
+    """Progress stand-in that cancels the run once `count` users finished"""
+
+    def __init__(self, count):
+        self.count = count
+        self.cancel_event = threading.Event()
+
+    def record(self, success, position=None, row=None):
+        if position + 1 >= self.count:
+            self.cancel_event.set()
+
+
+def test_archive_rebuilds_the_output_without_api_calls(config, upstream, tmp_path):
+    config['processing'].update(archive_responses=True, archive_file=str(tmp_path / "run.responses.jsonl.gz"))
+    users = records(new_users(3))
+    users[1]['userid'] = ''
+    results = CardGeniusBatchRunner(config).process_records(users)
+    calls = upstream.calls
+
+    rebuilt = rebuild_records(CardGeniusBatchRunner(config), config['processing']['archive_file'])
+    assert upstream.calls == calls
+    assert [row['userid'] for row in rebuilt] == [u['userid'] for u in users]
+    assert rebuilt[0]['top1_card_name'] == results[0]['top1_card_name']
+    assert rebuilt[2]['top3_net_savings'] == results[2]['top3_net_savings']
+
+
+def test_a_cancelled_run_archives_the_rows_it_did_not_reach(config, upstream, tmp_path):
+    archive_file = str(tmp_path / "run.responses.jsonl.gz")
+    config['processing'].update(archive_responses=True, archive_file=archive_file)
+    users = records(new_users(5))
+    progress = CancelAfter(2)
+    runner = CardGeniusBatchRunner(config, progress=progress, cancel_event=progress.cancel_event)
+    runner.process_records(users)
+    assert runner.cancelled
+
+    archived = list(ResponseArchive.iter_records(archive_file))
+    assert [record['user_id'] for record in archived] == [u['userid'] for u in users]
+    assert [record['cancelled'] for record in archived] == [False, False, True, True, True]
+
+    rebuilt = rebuild_records(CardGeniusBatchRunner(config), archive_file)
+    assert [row['userid'] for row in rebuilt] == [u['userid'] for u in users]
+    assert rebuilt[1]['cardgenius_error'] == ''
+    assert [row['cardgenius_error'] for row in rebuilt[2:]] == ["Run cancelled"] * 3
+
+
+def test_incremental_run_only_calls_the_api_for_new_and_changed_users(config, upstream, tmp_path):
+    first_archive = str(tmp_path / "first.responses.jsonl.gz")
+    config['processing'].update(archive_responses=True, archive_file=first_archive)
+    users = records(new_users(4))
+    first = CardGeniusBatchRunner(config).process_records(users)
+    assert upstream.calls == 4
+
+    changed = [dict(user) for user in users]
+    changed[1]['avg_amazon_gmv'] += 5000
+    changed.append(records(new_users(1))[0])
+    config['processing'].update(previous_run=first_archive, archive_file=str(tmp_path / "second.responses.jsonl.gz"))
+    runner = CardGeniusBatchRunner(config)
+    second = runner.process_records(changed)
+
+    assert upstream.calls == 6
+    assert runner.run_stats['reused'] == 3
+    assert runner.run_stats['recomputed'] == 2
+    for i in (0, 2, 3):
+        assert second[i]['top1_card_name'] == first[i]['top1_card_name']
+    # Reused users are archived again, so the next run can build on this one
+    reused = [r for r in ResponseArchive.iter_records(config['processing']['archive_file']) if r['response']]
+    assert len(reused) == 5
@@ -0,0 +1,69 @@
+"""Card name mapping: the indexed best match and vectorized top-k matching against the CardGenius catalog"""
+
+import json
+
+import numpy as np
+import pytest
+
+from benchmark_card_mapping import pairwise_best_match, partner_aliases
+from card_name_mapper import CardNameMapper
+from card_name_vectors import CardNameVectors
+from create_card_mapping import cashkaro_cards
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    with open('cardgenius_all_cards.json', 'r') as f:
+        return json.load(f)
+
+
+def test_indexed_best_match_equals_comparing_every_name(catalog):
+    mapper = CardNameMapper()
+    for name in list(cashkaro_cards) + partner_aliases(catalog, 50):
+        for threshold in (0.0, 0.6):
+            assert mapper.find_best_match(name, catalog, threshold) == \
+                pairwise_best_match(mapper, name, catalog, threshold), name
+
+
+def test_manual_mappings_win_and_a_new_catalog_rebuilds_the_index(catalog):
+    mapper = CardNameMapper()
+    mapper.add_manual_mapping("Fancy Card", catalog[3])
+    assert mapper.find_best_match("Fancy Card", catalog) == (catalog[3], 1.0)
+
+    assert mapper.find_best_match("HDFC Millenia Credit Card", ["HDFC Millenia", "SBI Cashback"])[0] == "HDFC Millenia"
+    assert mapper.find_best_match("HDFC Millenia Credit Card", ["SBI Cashback"], threshold=0.9) is None
+
+
+def test_top_k_equals_a_full_sort_of_the_similarity_matrix(catalog):
+    mapper = CardNameMapper()
+    vectors = CardNameVectors([mapper.comparison_key(name) for name in catalog])
+    keys = [mapper.comparison_key(name) for name in partner_aliases(catalog, 40)]
+
+    # Small chunks: the rows are scored over several matrix products
+    positions, scores = vectors.top_k(keys, k=5, chunk_rows=7)
+    matrix = vectors.similarity(keys)
+    expected = np.argsort(-matrix, axis=1, kind='stable')[:, :5]
+    assert np.array_equal(positions, expected)
+    assert np.allclose(scores, np.take_along_axis(matrix, expected, axis=1))
+    assert (scores >= 0).all() and (scores <= 1 + 1e-6).all()
+
+
+def test_ties_at_the_kth_place_go_to_the_earlier_catalog_position():
+    vectors = CardNameVectors(["axis atlas", "hdfc regalia", "hdfc regalia", "hdfc regalia", "sbi cashback"])
+    positions, scores = vectors.top_k(["hdfc regalia"], k=2)
+    assert positions.tolist() == [[1, 2]]
+    assert scores[0][0] == pytest.approx(1.0)
+
+
+def test_top_matches_list_the_manual_mapping_first(catalog):
+    mapper = CardNameMapper()
+    mapper.add_manual_mapping("Fancy Card", catalog[3])
+    matches = mapper.top_matches(["Fancy Card", "zzzz"] + list(cashkaro_cards)[:5], catalog, k=3)
+
+    assert matches["Fancy Card"][0] == (catalog[3], 1.0)
+    assert len(matches["Fancy Card"]) <= 3
+    # Names sharing no trigram with the catalog have no matches
+    assert matches["zzzz"] == []
+    for ranked in matches.values():
+        assert [score for _, score in ranked] == sorted((score for _, score in ranked), reverse=True)
+    assert mapper.top_matches(["Fancy Card"], [], k=3) == {"Fancy Card": []}
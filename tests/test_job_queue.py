@@ -0,0 +1,171 @@
+"""Durable job queue and worker processes: leases, shutdown and recovery after a worker dies"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+from api_keys import ApiClient, ApiKeyRegistry
+from fakes import new_users, wait_until
+from health import UpstreamCircuit
+from job_executor import JobExecutor, QueueFullError, UpstreamBudget
+from job_queue import JobQueue
+from job_runtime import JobRuntime
+from job_store import SQLiteJobStore
+from job_worker import JobWorker
+from webhooks import WebhookNotifier
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.db"), max_queued=2, max_attempts=2)
+
+
+@pytest.fixture
+def runtime(tmp_path, queue, upstream):
+    """Worker-side runtime sharing the queue and a SQLite job store, calling the fake CardGenius API"""
+    runtime = JobRuntime(
+        job_store=SQLiteJobStore(str(tmp_path / "jobs.db")),
+        job_executor=JobExecutor(max_concurrent_jobs=2, max_queued_jobs=10),
+        upstream_budget=UpstreamBudget(4),
+        api_keys=ApiKeyRegistry([ApiClient("default", "test-key")]),
+        webhook_notifier=WebhookNotifier("test-secret"),
+        job_queue=queue,
+        upstream_session=requests.Session(),
+        cancel_poll_seconds=0.05
+    )
+    yield runtime
+    runtime.job_executor.shutdown()
+
+
+def enqueue_batch(runtime, users):
+    """Create a queued batch job the way the API server does in queue mode"""
+    job_id = f"job-{users[0]['user_id']}"
+    runtime.job_store.create_job({'job_id': job_id, 'status': 'queued', 'total_users': len(users),
+                                  'processed_users': 0, 'successful': 0, 'failed': 0, 'version': 'v1',
+                                  'created_at': '2026-01-01T00:00:00'})
+    runtime.job_queue.enqueue(job_id, 'batch', {'users': users, 'top_n_cards': 3, 'version': 'v1'},
+                              client='default')
+    return job_id
+
+
+def start_worker(runtime, **options):
+    worker = JobWorker(runtime, poll_interval=0.05, heartbeat_interval=0.05, **options)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    return worker, thread
+
+
+def test_queue_is_fifo_and_bounded(queue):
+    assert queue.enqueue('a', 'batch', {}) == 1
+    assert queue.enqueue('b', 'batch', {}) == 2
+    with pytest.raises(QueueFullError) as rejected:
+        queue.enqueue('c', 'batch', {})
+    assert rejected.value.retry_after >= 1
+
+    assert queue.claim('worker-1')['job_id'] == 'a'
+    assert queue.position('b') == 1
+    assert queue.position('a') is None
+    # Only waiting jobs can be taken back
+    assert queue.cancel('a') is None
+    assert queue.cancel('b')['job_id'] == 'b'
+    assert queue.claim('worker-1') is None
+
+
+def test_release_puts_a_job_back_at_its_place(queue):
+    queue.enqueue('a', 'batch', {})
+    queue.enqueue('b', 'batch', {})
+    assert queue.claim('worker-1')['job_id'] == 'a'
+
+    queue.release('a')
+    entry = queue.claim('worker-2')
+    assert entry['job_id'] == 'a'
+    assert entry['attempts'] == 1
+
+
+def test_stale_leases_are_requeued_then_abandoned(queue):
+    queue.enqueue('a', 'batch', {})
+    queue.claim('dead-worker')
+    time.sleep(0.01)
+    assert queue.requeue_stale(0) == (['a'], [])
+
+    assert queue.claim('dead-worker')['attempts'] == 2
+    time.sleep(0.01)
+    requeued, abandoned = queue.requeue_stale(0)
+    assert requeued == []
+    assert [entry['job_id'] for entry in abandoned] == ['a']
+    assert queue.stats()['queued_jobs'] == 0
+
+
+def test_worker_recovers_the_jobs_of_a_dead_worker(runtime, upstream):
+    users = new_users(3)
+    job_id = enqueue_batch(runtime, users)
+    # A worker claimed the job, started it and died
+    runtime.job_queue.claim('dead-host:1')
+    runtime.job_store.update_job(job_id, status='processing')
+    time.sleep(0.3)
+
+    worker, thread = start_worker(runtime, stale_after=0.2)
+    try:
+        job = wait_until(lambda: (runtime.job_store.get_job(job_id) or {}).get('status') == 'completed'
+                         and runtime.job_store.get_job(job_id))
+        assert job['successful'] == 3
+        assert [row['userid'] for row in runtime.job_store.get_results(job_id)] == [u['user_id'] for u in users]
+        wait_until(lambda: runtime.job_queue.stats()['claimed_jobs'] == 0)
+        assert runtime.job_queue.stats()['queued_jobs'] == 0
+    finally:
+        worker.stop()
+        thread.join(5)
+
+
+def test_recovered_job_shows_as_queued(runtime):
+    job_id = enqueue_batch(runtime, new_users(2))
+    runtime.job_queue.claim('dead-host:1')
+    runtime.job_store.update_job(job_id, status='processing')
+    time.sleep(0.3)
+
+    JobWorker(runtime, stale_after=0.2)._recover_stale()
+    assert runtime.job_store.get_job(job_id)['status'] == 'queued'
+    assert runtime.job_queue.position(job_id) == 1
+
+
+def test_shutdown_releases_only_jobs_that_never_started(runtime, upstream):
+    # One executor thread: the second claimed job waits behind the first
+    runtime.job_executor.shutdown()
+    runtime.job_executor = JobExecutor(max_concurrent_jobs=1, max_queued_jobs=10)
+    upstream.delay = 0.2
+    running = enqueue_batch(runtime, new_users(20))
+    waiting = enqueue_batch(runtime, new_users(2))
+    worker, thread = start_worker(runtime, concurrency=2, drain_timeout=0.1)
+    try:
+        wait_until(lambda: upstream.calls >= 1 and runtime.job_queue.stats()['queued_jobs'] == 0)
+        worker.stop()
+        thread.join(5)
+        assert not thread.is_alive()
+
+        assert runtime.job_store.get_job(waiting)['status'] == 'queued'
+        assert runtime.job_queue.position(waiting) == 1
+        # The running job keeps its lease until it goes stale, so no other worker runs it alongside
+        assert runtime.job_store.get_job(running)['status'] == 'processing'
+        assert runtime.job_queue.position(running) is None
+        entry = runtime.job_queue.claim('next-worker')
+        assert entry['job_id'] == waiting and entry['attempts'] == 1
+        assert runtime.job_queue.claim('next-worker') is None
+    finally:
+        # The run is still going in this process; stop it
+        runtime.job_store.update_job(running, cancel_requested=True)
+
+
+def test_workers_report_their_upstream_circuit(runtime):
+    runtime.upstream_circuit = UpstreamCircuit(failure_threshold=1)
+    runtime.upstream_circuit.record_failure("HTTP 503")
+    worker, thread = start_worker(runtime)
+    try:
+        reports = wait_until(lambda: runtime.job_queue.upstream_reports(60))
+        assert reports[worker.worker_id]['state'] == 'open'
+        assert reports[worker.worker_id]['last_error'] == "HTTP 503"
+    finally:
+        worker.stop()
+        thread.join(5)
+    assert runtime.job_queue.upstream_reports(60) == {}
@@ -0,0 +1,133 @@
+"""Job store backends (the same behaviour from MemoryJobStore, SQLiteJobStore and RedisJobStore) and retention"""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from job_store import MemoryJobStore, RedisJobStore, SQLiteJobStore
+from result_retention import cleanup_output_files, purge_expired_jobs
+
+
+def job(job_id, status='queued', created_at='2026-01-01T00:00:00', **fields):
+    return {'job_id': job_id, 'status': status, 'created_at': created_at, 'total_users': 3,
+            'processed_users': 0, **fields}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    if request.param == 'sqlite':
+        return SQLiteJobStore(str(tmp_path / "jobs.db"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisJobStore(fakeredis.FakeRedis())
+
+
+def test_create_update_increment_delete(store):
+    store.create_job(job('a', client='acme'))
+    store.update_job('a', status='processing', started_at='2026-01-01T00:00:01')
+    store.increment_job('a', processed_users=2, successful=1)
+    store.increment_job('a', processed_users=1)
+
+    record = store.get_job('a')
+    assert record['status'] == 'processing'
+    assert record['processed_users'] == 3
+    assert record['successful'] == 1
+    assert record['client'] == 'acme'
+    assert store.get_jobs(['a', 'missing']) == {'a': record}
+
+    store.save_results('a', [{'userid': 'u0'}])
+    assert store.delete_job('a') is True
+    assert store.get_job('a') is None
+    assert store.get_results('a') == []
+    assert store.delete_job('a') is False
+
+
+def test_results_are_read_by_position(store):
+    store.create_job(job('a', status='processing'))
+    store.save_results('a', [{'userid': f'u{i}'} for i in range(5)])
+    # A later bulk chunk finished first: positions 5-7 are missing
+    store.save_results('a', [{'userid': f'u{i}'} for i in range(8, 10)], start=8)
+
+    assert [row['userid'] for row in store.get_results('a')] == ['u0', 'u1', 'u2', 'u3', 'u4']
+    assert [row['userid'] for row in store.get_results('a', 2, 2)] == ['u2', 'u3']
+    assert [row['userid'] for row in store.get_results('a', 8)] == ['u8', 'u9']
+    assert store.get_results('a', 6, 2) == []
+    assert store.count_results('a') == 7
+
+    store.save_results('a', [{'userid': f'u{i}'} for i in range(5, 8)], start=5)
+    assert [row['userid'] for row in store.get_results('a', 3, 4)] == ['u3', 'u4', 'u5', 'u6']
+    assert len(store.get_results('a')) == 10
+    assert store.get_results('missing') == []
+
+
+def test_list_and_count_jobs(store):
+    for i, status in enumerate(['queued', 'processing', 'completed', 'completed']):
+        store.create_job(job(f'j{i}', status=status, created_at=f'2026-01-0{i + 1}T00:00:00',
+                             client='acme' if i % 2 else 'other'))
+
+    assert [j['job_id'] for j in store.list_jobs()] == ['j3', 'j2', 'j1', 'j0']
+    assert [j['job_id'] for j in store.list_jobs(status='completed')] == ['j3', 'j2']
+    assert [j['job_id'] for j in store.list_jobs(client='acme')] == ['j3', 'j1']
+    assert [j['job_id'] for j in store.list_jobs(limit=2, offset=1)] == ['j2', 'j1']
+
+    page = store.list_jobs(limit=2)
+    cursor = (page[-1]['created_at'], page[-1]['job_id'])
+    assert [j['job_id'] for j in store.list_jobs(before=cursor)] == ['j1', 'j0']
+
+    assert store.count_jobs() == 4
+    assert store.count_jobs('completed') == 2
+    store.update_job('j0', status='processing')
+    assert store.count_jobs('queued') == 0
+    assert store.count_jobs('processing') == 2
+
+
+def test_claim_key(store):
+    assert store.claim_key('idem', 'job-1', ttl_seconds=60) is None
+    assert store.claim_key('idem', 'job-2', ttl_seconds=60) == 'job-1'
+    # A holder known to be gone is replaced
+    assert store.claim_key('idem', 'job-2', ttl_seconds=60, stale='job-1') is None
+    assert store.claim_key('idem', 'job-3', ttl_seconds=60) == 'job-2'
+
+
+def test_memory_store_spills_finished_results(tmp_path):
+    store = MemoryJobStore(memory_budget_bytes=1, spill_dir=str(tmp_path))
+    store.create_job(job('a', status='processing'))
+    store.save_results('a', [{'userid': f'u{i}'} for i in range(3)])
+    store.update_job('a', status='completed')
+
+    assert list(tmp_path.iterdir())
+    assert [row['userid'] for row in store.get_results('a', 1)] == ['u1', 'u2']
+    assert store.count_results('a') == 3
+
+
+def test_finished_jobs_expire_after_the_ttl(store):
+    store.create_job(job('old', status='completed', completed_at='2026-01-01T00:00:00'))
+    store.create_job(job('cancelled', status='cancelled', completed_at='2026-01-01T12:00:00'))
+    store.create_job(job('recent', status='failed', completed_at='2026-01-02T11:00:00'))
+    store.create_job(job('running', status='processing'))
+    store.save_results('old', [{'userid': 'u0'}])
+
+    assert purge_expired_jobs(store, ttl_seconds=86400, now=datetime(2026, 1, 2, 12)) == 1
+    assert store.get_job('old') is None and store.count_results('old') == 0
+    assert purge_expired_jobs(store, ttl_seconds=3600, now=datetime(2026, 1, 2, 12)) == 1
+    assert {j['job_id'] for j in store.list_jobs()} == {'recent', 'running'}
+
+
+def test_old_and_excess_output_files_are_removed(tmp_path):
+    now = time.time()
+    for name, age, size in [('cardgenius_recommendations_1.xlsx', 7200, 10),
+                            ('cardgenius_v2_recommendations_2.xlsx', 60, 100),
+                            ('cardgenius_recommendations_3.xlsx', 30, 100),
+                            ('users.xlsx', 7200, 10)]:
+        path = tmp_path / name
+        path.write_bytes(b'x' * size)
+        os.utime(path, (now - age, now - age))
+
+    deleted = cleanup_output_files(str(tmp_path), ttl_seconds=3600, max_total_bytes=150)
+    # The expired file, then the oldest until the rest fit; other files are left alone
+    assert [os.path.basename(path) for path in deleted] == ['cardgenius_recommendations_1.xlsx',
+                                                            'cardgenius_v2_recommendations_2.xlsx']
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['cardgenius_recommendations_3.xlsx', 'users.xlsx']
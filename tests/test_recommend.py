@@ -0,0 +1,89 @@
+"""Synchronous single-user recommendations: the endpoint, its cache and the runners it keeps"""
+
+import threading
+import time
+
+from fakes import new_users
+from recommend_cache import RecommendationCache
+
+
+def recommend(client, headers, user, **fields):
+    return client.post('/api/v1/recommend', json={**user, 'top_n_cards': 3, **fields}, headers=headers)
+
+
+def test_repeated_spend_profiles_are_served_from_the_cache(client, headers, upstream):
+    user, other = new_users(2)
+    first = recommend(client, headers, user).json()
+    assert first['cached'] is False
+    assert first['result']['userid'] == user['user_id']
+    assert first['result']['top1_card_name']
+
+    # Another user with the same spends gets the same cards, with their own id
+    same_spends = recommend(client, headers, {**user, 'user_id': other['user_id']}).json()
+    assert same_spends['cached'] is True
+    assert same_spends['result']['userid'] == other['user_id']
+    assert same_spends['result']['top1_card_name'] == first['result']['top1_card_name']
+    assert upstream.calls == 1
+
+    # Version, card count and spends are part of the key
+    assert recommend(client, headers, user, version='v2').json()['cached'] is False
+    assert recommend(client, headers, user, top_n_cards=2).json()['cached'] is False
+    assert recommend(client, headers, other).json()['cached'] is False
+    assert upstream.calls == 4
+
+
+def test_recommend_validates_its_input(client, headers, upstream):
+    user = new_users(1)[0]
+    assert recommend(client, headers, user, top_n_cards=0).status_code == 422
+    assert recommend(client, headers, user, top_n_cards=1000).status_code == 422
+    assert recommend(client, headers, user, version='v3').status_code == 400
+    assert recommend(client, {'X-API-Key': 'wrong'}, user).status_code == 401
+    assert upstream.calls == 0
+
+
+def test_runners_are_kept_for_the_most_recent_settings_only(client, headers, server, upstream, monkeypatch):
+    monkeypatch.setattr(server, 'RECOMMEND_RUNNERS_MAX', 2)
+    for top_n_cards in (1, 2, 3):
+        assert recommend(client, headers, new_users(1)[0], top_n_cards=top_n_cards).status_code == 200
+    assert len(server.recommend_runners) <= 2
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = RecommendationCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'top1_card_name': 'AXIS ATLAS CC'}
+
+    outcomes = []
+    threads = [threading.Thread(target=lambda: outcomes.append(cache.get_or_compute('key', compute)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(cached for _, cached in outcomes) == [False, True, True, True, True]
+    assert cache.stats()['shared'] == 4
+
+
+def test_cache_entries_expire_and_are_evicted_least_recently_used_first():
+    cache = RecommendationCache(max_entries=2, ttl_seconds=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    # Failed computations are not cached
+    assert cache.get_or_compute('d', lambda: None) == (None, False)
+    assert cache.get('d') is None
+
+    expiring = RecommendationCache(ttl_seconds=0.01)
+    expiring.put('a', 1)
+    time.sleep(0.02)
+    assert expiring.get('a') is None
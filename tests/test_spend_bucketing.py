@@ -0,0 +1,79 @@
+"""Spend bucketing: bucket rounding, shared API calls in bucketed runs and the validation harness"""
+
+import json
+
+import pandas as pd
+import pytest
+
+import spend_bucketing
+import validate_spend_bucketing
+from cardgenius_batch_runner import CardGeniusBatchRunner
+from fakes import new_users
+from job_runtime import UserSpendingData, user_records
+
+
+def test_bucket_values():
+    linear = {'mode': 'linear', 'step': 500}
+    assert spend_bucketing.bucket_value(1240, linear) == 1000
+    assert spend_bucketing.bucket_value(1260, linear) == 1500
+    assert spend_bucketing.bucket_value(0, linear) == 0
+    assert spend_bucketing.bucket_value(-10, linear) == 0
+
+    log = {'mode': 'log', 'bins_per_decade': 4, 'min_value': 500}
+    assert spend_bucketing.bucket_value(300, log) == 500
+    assert spend_bucketing.bucket_value(10000, log) == 10000
+    assert spend_bucketing.bucket_value(10500, log) == spend_bucketing.bucket_value(11000, log)
+
+    payload = {'amazon_spends': 1260, 'flipkart_spends': 240, 'fuel': 1260}
+    assert spend_bucketing.apply_bucketing(payload, linear) == {'amazon_spends': 1500, 'flipkart_spends': 0,
+                                                                'fuel': 1260}
+
+
+def test_users_in_one_bucket_share_an_api_call(runner_config, upstream):
+    config = runner_config(3)
+    config['processing']['spend_bucketing'] = {'enabled': True, 'mode': 'linear', 'step': 500}
+    users = user_records([UserSpendingData(**user) for user in new_users(4)])
+    for user, amazon in zip(users, [10010, 10120, 9900, 20000]):
+        user['avg_amazon_gmv'] = amazon
+        user['avg_flipkart_gmv'] = 500
+
+    runner = CardGeniusBatchRunner(config)
+    results = runner.process_records(users)
+    assert upstream.calls == 2
+    assert runner.run_stats['bucket_shared'] == 2
+    assert results[0]['top1_card_name'] == results[2]['top1_card_name']
+
+
+@pytest.fixture
+def harness_config(runner_config, tmp_path):
+    """Config file and Excel input for validate_spend_bucketing"""
+    users = new_users(6)
+    input_file = tmp_path / "users.xlsx"
+    pd.DataFrame(user_records([UserSpendingData(**user) for user in users])).to_excel(input_file, index=False)
+    config = runner_config(3)
+    config['excel'] = {'input_file': str(input_file), 'sheet_name': 0, 'output_file': str(tmp_path / "out.xlsx")}
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps(config))
+    return str(path), users
+
+
+def test_validation_harness_reports_failing_users_and_carries_on(harness_config, upstream, monkeypatch):
+    config_path, users = harness_config
+    failing = users[2]['user_id']
+    call_api = CardGeniusBatchRunner._call_cardgenius_api
+
+    def flaky(runner, payload, user_id):
+        if user_id == failing:
+            raise RuntimeError("connection reset")
+        return call_api(runner, payload, user_id)
+
+    monkeypatch.setattr(CardGeniusBatchRunner, '_call_cardgenius_api', flaky)
+    summary = validate_spend_bucketing.validate(
+        config_path, {'enabled': True, 'mode': 'linear', 'step': 500}, sample_size=6, seed=1
+    )
+
+    assert summary['errors'] == 1
+    assert summary['failed_users'] == {failing: "connection reset"}
+    assert summary['sampled_users'] == 5
+    assert summary['unique_exact_payloads'] == 6
+    assert 0 <= summary['top1_match'] <= 1
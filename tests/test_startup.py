@@ -0,0 +1,39 @@
+"""Startup: lazy imports of the API server and its warm-up, and the card registry cache"""
+
+import json
+import os
+import subprocess
+import sys
+
+import card_registry
+from fakes import ROOT
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'pyarrow')
+
+
+def test_importing_the_api_server_leaves_pandas_to_the_warm_up():
+    script = (
+        "import json, sys\n"
+        "import api_server\n"
+        "imported = [m for m in %r if m in sys.modules]\n"
+        "api_server.warm_up()\n"
+        "print(json.dumps([imported, 'pandas' in sys.modules]))\n"
+    ) % (HEAVY_MODULES,)
+    # A fresh interpreter: this test process has long imported pandas
+    env = {**os.environ, "CARDGENIUS_WARMUP_CONNECT": "0"}
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True,
+                            check=True, timeout=120).stdout
+    imported, warmed = json.loads(output.strip().splitlines()[-1])
+    assert imported == []
+    assert warmed is True
+
+
+def test_registry_files_are_parsed_once_until_they_change(tmp_path):
+    path = tmp_path / "cards.json"
+    path.write_text(json.dumps({'cards': ['AXIS ATLAS CC']}))
+    first = card_registry.load_registry_file(str(path))
+    assert card_registry.load_registry_file(str(path)) is first
+
+    path.write_text(json.dumps({'cards': ['HDFC REGALIA']}))
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+    assert card_registry.load_registry_file(str(path)) == {'cards': ['HDFC REGALIA']}
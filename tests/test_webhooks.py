@@ -0,0 +1,117 @@
+"""Webhook signatures and the notifier's retry policy, against a local receiver"""
+
+import threading
+import time
+
+import pytest
+
+from fakes import WebhookReceiver
+from webhooks import WebhookNotifier, parse_allowed_hosts, sign_payload, validate_callback_url, verify_signature
+
+
+@pytest.fixture
+def notifier():
+    # The local receiver listens on loopback, which has to be allowed explicitly
+    return WebhookNotifier("test-secret", max_attempts=3, base_delay=0.01,
+                           allowed_hosts=parse_allowed_hosts("127.0.0.1"))
+
+
+def deliver(notifier, receiver, event):
+    """Notify and wait for the outcome: (delivered, attempts, last_error)"""
+    outcome = []
+    done = threading.Event()
+    notifier.notify(f"{receiver.url}/hook", event, on_done=lambda *result: (outcome.append(result), done.set()))
+    assert done.wait(10)
+    return outcome[0]
+
+
+def test_signature_covers_timestamp_and_body():
+    timestamp = str(int(time.time()))
+    body = b'{"event":"job.completed"}'
+    signature = sign_payload("secret", timestamp, body)
+
+    assert signature.startswith("sha256=")
+    assert verify_signature("secret", timestamp, body, signature)
+    assert not verify_signature("other-secret", timestamp, body, signature)
+    assert not verify_signature("secret", timestamp, body + b' ', signature)
+    assert not verify_signature("secret", str(int(timestamp) + 1), body, signature)
+    # Replays of an old delivery are rejected even with a valid signature
+    old = str(int(time.time()) - 3600)
+    assert not verify_signature("secret", old, body, sign_payload("secret", old, body))
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://93.184.216.34/hook",
+    "/hooks/cardgenius",
+    "http://127.0.0.1:9000/hook",
+    "http://localhost/hook",
+    "http://10.1.2.3/hook",
+    "http://192.168.0.10/hook",
+    "http://169.254.169.254/latest/meta-data/",
+    "http://0.0.0.0/hook",
+    "http://[::1]/hook",
+    "http://[::ffff:10.0.0.1]/hook",
+    "http://240.0.0.1/hook",
+    "http://host.invalid/hook",
+])
+def test_callback_urls_to_internal_hosts_are_refused(url):
+    assert not validate_callback_url(url)
+
+
+def test_public_and_allowed_callback_urls():
+    assert validate_callback_url("https://93.184.216.34/hooks/cardgenius")
+    allowed = parse_allowed_hosts(" localhost, 10.0.0.0/8 ,::1")
+    assert validate_callback_url("http://localhost:9000/hook", allowed)
+    assert validate_callback_url("http://10.1.2.3/hook", allowed)
+    assert validate_callback_url("http://[::1]/hook", allowed)
+    assert not validate_callback_url("http://192.168.0.10/hook", allowed)
+
+
+def test_refused_hosts_are_not_delivered_to():
+    receiver = WebhookReceiver()
+    try:
+        assert deliver(WebhookNotifier("test-secret"), receiver, {'event': 'job.completed'}) == \
+            (False, 1, "callback host is not allowed")
+        assert receiver.deliveries == []
+    finally:
+        receiver.close()
+
+
+def test_server_errors_are_retried_until_delivered(notifier):
+    receiver = WebhookReceiver(statuses=[500, 429])
+    try:
+        assert deliver(notifier, receiver, {'event': 'job.completed', 'job_id': 'a'}) == (True, 3, None)
+        assert [d['status'] for d in receiver.deliveries] == [500, 429, 200]
+        for delivery in receiver.deliveries:
+            headers = delivery['headers']
+            assert headers['X-CardGenius-Event'] == 'job.completed'
+            assert verify_signature("test-secret", headers['X-CardGenius-Timestamp'], delivery['body'],
+                                    headers['X-CardGenius-Signature'])
+    finally:
+        receiver.close()
+
+
+def test_nothing_is_sent_without_a_secret():
+    receiver = WebhookReceiver()
+    try:
+        assert deliver(WebhookNotifier(None), receiver, {'event': 'job.completed'}) == (False, 0, "no webhook secret configured")
+        assert receiver.deliveries == []
+    finally:
+        receiver.close()
+
+
+def test_client_errors_are_final(notifier):
+    receiver = WebhookReceiver(statuses=[404])
+    try:
+        assert deliver(notifier, receiver, {'event': 'job.failed'}) == (False, 1, "HTTP 404")
+    finally:
+        receiver.close()
+
+
+def test_gives_up_after_max_attempts(notifier):
+    receiver = WebhookReceiver(statuses=[502, 502, 502, 502])
+    try:
+        assert deliver(notifier, receiver, {'event': 'job.completed'}) == (False, 3, "HTTP 502")
+        assert len(receiver.deliveries) == 3
+    finally:
+        receiver.close()
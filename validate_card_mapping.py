@@ -130,17 +130,23 @@ def create_validation_report(cashkaro_cards, cardgenius_cards):
     print("\n📊 VALIDATION REPORT")
     print("="*80)
     
+    # Map all names in one call, so CardGenius names are indexed once
+    matches = mapper.map_all_cards(cashkaro_cards, cardgenius_cards, threshold=0.5)
+    conflicts = {}
+    
     # Test each mapping
     results = []
     
     for ck_name in cashkaro_cards:
-        match = mapper.find_best_match(ck_name, cardgenius_cards, threshold=0.5)
+        match = matches.get(ck_name)
         
         if match:
             cg_name, score = match
             
-            # Find similar CardGenius cards (potential conflicts)
-            similar = find_similar_cards(cg_name, cardgenius_cards, similarity_threshold=0.75)
+            # Find similar CardGenius cards (potential conflicts), once per CardGenius name
+            if cg_name not in conflicts:
+                conflicts[cg_name] = find_similar_cards(cg_name, cardgenius_cards, similarity_threshold=0.75)
+            similar = conflicts[cg_name]
             
             result = {
                 'cashkaro_name': ck_name,
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Spend Bucketing Validation Harness
+
+Measures how much bucketed (approximate) recommendations differ from exact
+ones on a random sample of users, and how many API calls bucketing saves on
+the full input file.
+
+Usage:
+    python validate_spend_bucketing.py --config config_5k_test.json --sample 200 --step 500
+    python validate_spend_bucketing.py --config config_5k_test.json --mode log --bins-per-decade 8 \
+        --exact-archive results_5k_users.responses.jsonl.gz
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Dict, List, Any, Optional
+
+import pandas as pd
+
+from cardgenius_batch_runner import CardGeniusBatchRunner
+from response_archive import ResponseArchive, canonical_payload_hash
+import spend_bucketing
+
+
+def ranked_card_names(runner: CardGeniusBatchRunner, response: Optional[Dict[str, Any]], user_id: str) -> List[str]:
+    """Top-N card names, in rank order, after commission filtering"""
+    if not response:
+        return []
+    result = runner._process_api_response(response, user_id)
+    top_n = runner.config['processing']['top_n_cards']
+    return [result[f"top{i}_card_name"] for i in range(1, top_n + 1) if result.get(f"top{i}_card_name")]
+
+
+def compare_rankings(exact: List[str], approx: List[str]) -> Dict[str, float]:
+    """Agreement metrics between an exact and an approximate top-N list"""
+    n = max(len(exact), len(approx), 1)
+    return {
+        'top1_match': float(bool(exact) and bool(approx) and exact[0] == approx[0]),
+        'overlap_at_n': len(set(exact) & set(approx)) / n,
+        'exact_order_match': float(exact == approx),
+        'top3_overlap': len(set(exact[:3]) & set(approx[:3])) / max(min(3, len(exact)), 1)
+    }
+
+
+def validate(config_path: str, bucketing_config: Dict[str, Any], sample_size: int, seed: int,
+             exact_archive: Optional[str] = None) -> Dict[str, Any]:
+    """Run the exact-vs-bucketed comparison and return summary metrics"""
+    runner = CardGeniusBatchRunner(config_path)
+    processing_config = runner.config['processing']
+    processing_config.pop('spend_bucketing', None)
+
+    excel_config = runner.config['excel']
+    df = pd.read_excel(excel_config['input_file'], sheet_name=excel_config['sheet_name'])
+    available_columns = list(df.columns)
+    runner._resolve_column_mappings(available_columns)
+    user_id_column = runner.config['column_mappings']['user_id']
+
+    # Call reduction over the whole input file
+    exact_hashes = set()
+    bucket_hashes = set()
+    for _, row in df.iterrows():
+        payload = runner._prepare_payload(row, available_columns)
+        exact_hashes.add(canonical_payload_hash(payload))
+        bucket_hashes.add(canonical_payload_hash(spend_bucketing.apply_bucketing(payload, bucketing_config)))
+
+    print(f"📊 Input users: {len(df)}")
+    print(f"   Unique exact payloads:    {len(exact_hashes)}")
+    print(f"   Unique bucketed payloads: {len(bucket_hashes)} "
+          f"({len(bucket_hashes) / max(len(df), 1) * 100:.1f}% of users need an API call)")
+
+    exact_responses = {}
+    if exact_archive:
+        for record in ResponseArchive.iter_records(exact_archive):
+            if record.get('response') is not None:
+                exact_responses[record['payload_hash']] = record['response']
+        print(f"📦 Loaded {len(exact_responses)} exact responses from {exact_archive}")
+
+    sample = df.sample(n=min(sample_size, len(df)), random_state=seed)
+    bucket_responses = {}
+    api_calls = 0
+    metrics = []
+    errors = {}
+
+    print(f"\n🔬 Comparing exact vs bucketed rankings on {len(sample)} sampled users...")
+    for _, row in sample.iterrows():
+        user_id = str(row.get(user_id_column, ''))
+        try:
+            exact_payload = runner._prepare_payload(row, available_columns)
+            bucket_payload = spend_bucketing.apply_bucketing(exact_payload, bucketing_config)
+            exact_hash = canonical_payload_hash(exact_payload)
+            bucket_hash = canonical_payload_hash(bucket_payload)
+
+            if exact_hash not in exact_responses:
+                api_calls += 1
+                exact_responses[exact_hash] = runner._call_cardgenius_api(exact_payload, user_id)
+                time.sleep(runner.config['api']['sleep_between_requests'])
+            if bucket_hash not in bucket_responses:
+                if bucket_hash != exact_hash:
+                    api_calls += 1
+                bucket_responses[bucket_hash] = (exact_responses[exact_hash] if bucket_hash == exact_hash
+                                                 else runner._call_cardgenius_api(bucket_payload, user_id))
+                if bucket_hash != exact_hash:
+                    time.sleep(runner.config['api']['sleep_between_requests'])
+
+            exact_ranking = ranked_card_names(runner, exact_responses[exact_hash], user_id)
+            bucket_ranking = ranked_card_names(runner, bucket_responses[bucket_hash], user_id)
+        except Exception as e:
+            # One failing user should not cost the rest of the sample
+            print(f"⚠️  User {user_id}: {e}")
+            errors[user_id] = str(e)
+            continue
+        if not exact_ranking:
+            continue
+        metrics.append(compare_rankings(exact_ranking, bucket_ranking))
+
+    summary = {
+        'input_users': len(df),
+        'unique_exact_payloads': len(exact_hashes),
+        'unique_bucketed_payloads': len(bucket_hashes),
+        'sampled_users': len(metrics),
+        'api_calls': api_calls,
+        'errors': len(errors),
+        'failed_users': errors
+    }
+    for key in ['top1_match', 'overlap_at_n', 'exact_order_match', 'top3_overlap']:
+        summary[key] = sum(m[key] for m in metrics) / len(metrics) if metrics else 0.0
+
+    print(f"\n✅ Top-1 agreement:        {summary['top1_match'] * 100:.1f}%")
+    print(f"   Top-3 overlap:          {summary['top3_overlap'] * 100:.1f}%")
+    print(f"   Top-N overlap:          {summary['overlap_at_n'] * 100:.1f}%")
+    print(f"   Identical ranking:      {summary['exact_order_match'] * 100:.1f}%")
+    print(f"   API calls for harness:  {api_calls}")
+    if errors:
+        print(f"   Users with errors:      {len(errors)} (left out of the metrics)")
+
+    return summary
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Validate spend bucketing against exact recommendations')
+    parser.add_argument('--config', required=True, help='Path to configuration JSON file')
+    parser.add_argument('--sample', type=int, default=200, help='Number of users to compare')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for sampling')
+    parser.add_argument('--mode', choices=['linear', 'log'], default='linear', help='Bucketing mode')
+    parser.add_argument('--step', type=float, default=500, help='Linear bucket width in rupees')
+    parser.add_argument('--bins-per-decade', type=float, default=8, help='Log-scale bins per factor of 10')
+    parser.add_argument('--min-value', type=float, default=500, help='Log mode: linear rounding below this value')
+    parser.add_argument('--exact-archive', help='Response archive from an exact run, used instead of exact API calls')
+    parser.add_argument('--report', help='Write the summary as JSON to this file')
+
+    args = parser.parse_args()
+
+    bucketing_config = {
+        'enabled': True,
+        'mode': args.mode,
+        'step': args.step,
+        'bins_per_decade': args.bins_per_decade,
+        'min_value': args.min_value
+    }
+
+    try:
+        summary = validate(args.config, bucketing_config, args.sample, args.seed, args.exact_archive)
+        summary['bucketing'] = bucketing_config
+        if args.report:
+            with open(args.report, 'w') as f:
+                json.dump(summary, f, indent=2)
+            print(f"\n💾 Saved report to: {args.report}")
+    except Exception as e:
+        print(f"❌ Validation failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Example webhook receiver for CardGenius job completion callbacks
+
+Runs a small local HTTP server that verifies the signature of each
+notification and prints it. Submit jobs with
+"callback_url": "http://localhost:9000/cardgenius-webhook" to try it.
+
+Usage:
+    python webhook_receiver_example.py --port 9000 --secret YOUR_SECRET_API_KEY_HERE
+"""
+
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from webhooks import verify_signature
+
+
+def make_handler(secret: str, fail_first: int = 0):
+    """Request handler class bound to the shared secret"""
+    state = {'remaining_failures': fail_first}
+
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+            if state['remaining_failures'] > 0:
+                state['remaining_failures'] -= 1
+                print(f"⚠️  Simulating a receiver error for delivery {self.headers.get('X-CardGenius-Delivery')}")
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            if not verify_signature(secret, self.headers.get('X-CardGenius-Timestamp'), body,
+                                    self.headers.get('X-CardGenius-Signature')):
+                print("❌ Rejected notification with an invalid signature")
+                self.send_response(401)
+                self.end_headers()
+                return
+
+            event = json.loads(body)
+            print(f"✅ {event['event']}: job {event['job_id']} "
+                  f"({event['successful']} successful, {event['failed']} failed)")
+            print(f"   Fetch results from {event['results_url']}")
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description='Local receiver for CardGenius job webhooks')
+    parser.add_argument('--port', type=int, default=9000, help='Port to listen on')
+    parser.add_argument('--secret', default='YOUR_SECRET_API_KEY_HERE',
+                        help='Webhook secret (the server\'s CARDGENIUS_WEBHOOK_SECRET)')
+    parser.add_argument('--fail-first', type=int, default=0, help='Answer the first N deliveries with 503 to test retries')
+    args = parser.parse_args()
+
+    server = HTTPServer(('0.0.0.0', args.port), make_handler(args.secret, args.fail_first))
+    print(f"🔔 Listening for webhooks on http://localhost:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
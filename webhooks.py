@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Webhook Completion Callbacks
+
+When a job created with a callback_url finishes, the API server POSTs a JSON
+notification to that URL instead of making the client poll /status.
+
+Every delivery is signed: X-CardGenius-Signature is
+"sha256=" + HMAC-SHA256(secret, "{timestamp}.{body}") with the timestamp from
+X-CardGenius-Timestamp, so receivers can verify origin and reject replays
+(see verify_signature and webhook_receiver_example.py). Failed deliveries
+are retried with exponential backoff on a background thread.
+
+Callback hosts must resolve to public addresses, so a job cannot make the
+server POST to its own network (loopback, private, link-local and reserved
+ranges, cloud metadata endpoints); CARDGENIUS_WEBHOOK_ALLOWED_HOSTS lists
+the host names and networks that are allowed anyway.
+"""
+
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+import logging
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Receiver errors worth retrying; other 4xx responses are final
+RETRYABLE_STATUS = {408, 425, 429}
+
+
+AllowedHost = Union[str, ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_allowed_hosts(value: str) -> Tuple[AllowedHost, ...]:
+    """Host names and IP networks from a comma-separated list (e.g. hooks.internal,10.0.0.0/8,127.0.0.1)"""
+    allowed = []
+    for entry in value.split(','):
+        entry = entry.strip().lower()
+        if not entry:
+            continue
+        try:
+            allowed.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            allowed.append(entry)
+    return tuple(allowed)
+
+
+def _is_public(address: Union[ipaddress.IPv4Address, ipaddress.IPv6Address]) -> bool:
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def validate_callback_url(url: str, allowed_hosts: Sequence[AllowedHost] = ()) -> bool:
+    """
+    Whether url is an absolute http(s) URL the server may POST to
+
+    Its host must resolve, and only to public addresses, unless the host name
+    or each of its addresses is in allowed_hosts (see parse_allowed_hosts).
+    """
+    parsed = urlparse(url)
+    try:
+        host = parsed.hostname
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError:
+        return False
+    if parsed.scheme not in ('http', 'https') or not host:
+        return False
+    if host in allowed_hosts:
+        return True
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, UnicodeError):
+        return False
+    networks = [entry for entry in allowed_hosts if not isinstance(entry, str)]
+    for address in addresses:
+        # Scoped IPv6 addresses carry their interface after a %
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not _is_public(ip) and not any(ip in network for network in networks):
+            return False
+    return bool(addresses)
+
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    """Signature header value for a webhook body"""
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(secret: str, timestamp: str, body: bytes, signature: str,
+                     tolerance_seconds: int = 300) -> bool:
+    """Check a received webhook's signature and that its timestamp is recent"""
+    try:
+        if abs(time.time() - int(timestamp)) > tolerance_seconds:
+            return False
+    except (TypeError, ValueError):
+        return False
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), signature or '')
+
+
+class WebhookNotifier:
+    """Delivers signed webhook events on a background thread with retries and backoff"""
+
+    def __init__(self, secret: Optional[str], max_attempts: int = 6, base_delay: float = 2.0,
+                 max_delay: float = 300.0, timeout: float = 10.0, allowed_hosts: Sequence[AllowedHost] = ()):
+        self.secret = secret
+        self.allowed_hosts = tuple(allowed_hosts)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._heap: list = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="webhook-notifier", daemon=True)
+        self._thread.start()
+
+    def notify(self, url: str, event: Dict[str, Any],
+               on_done: Optional[Callable[[bool, int, Optional[str]], None]] = None):
+        """
+        Queue an event for delivery to url
+
+        on_done(delivered, attempts, last_error) is called once the event is
+        delivered or all attempts are used up. Without a secret nothing is sent:
+        an unsigned delivery could not be told apart from a forged one.
+        """
+        delivery = {
+            'id': str(uuid.uuid4()),
+            'url': url,
+            'body': json.dumps(event, default=str).encode(),
+            'event': event.get('event', 'job.finished'),
+            'attempt': 0,
+            'on_done': on_done
+        }
+        if not self.secret:
+            logger.error(f"Webhook {delivery['id']} to {url} not sent: CARDGENIUS_WEBHOOK_SECRET is not set")
+            self._finish(delivery, False, "no webhook secret configured")
+            return
+        self._schedule(delivery, 0)
+
+    def _schedule(self, delivery: Dict[str, Any], delay: float):
+        with self._cond:
+            heapq.heappush(self._heap, (time.monotonic() + delay, delivery['id'], delivery))
+            self._cond.notify()
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(timeout=self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, delivery = heapq.heappop(self._heap)
+            self._attempt(delivery)
+
+    def _attempt(self, delivery: Dict[str, Any]):
+        delivery['attempt'] += 1
+        # The host is resolved again: it may point somewhere else than when the job was created
+        if not validate_callback_url(delivery['url'], self.allowed_hosts):
+            logger.error(f"Webhook {delivery['id']} to {delivery['url']} not sent: host is not allowed")
+            self._finish(delivery, False, "callback host is not allowed")
+            return
+        timestamp = str(int(time.time()))
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'CardGenius-Webhook/1.0',
+            'X-CardGenius-Event': delivery['event'],
+            'X-CardGenius-Delivery': delivery['id'],
+            'X-CardGenius-Timestamp': timestamp,
+            'X-CardGenius-Signature': sign_payload(self.secret, timestamp, delivery['body'])
+        }
+
+        error = None
+        retry = True
+        try:
+            response = self.session.post(delivery['url'], data=delivery['body'], headers=headers,
+                                         timeout=self.timeout)
+            if 200 <= response.status_code < 300:
+                logger.info(f"Webhook {delivery['id']} delivered to {delivery['url']} (attempt {delivery['attempt']})")
+                self._finish(delivery, True, None)
+                return
+            error = f"HTTP {response.status_code}"
+            retry = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+
+        if retry and delivery['attempt'] < self.max_attempts:
+            delay = self._backoff(delivery['attempt'])
+            logger.warning(f"Webhook {delivery['id']} to {delivery['url']} failed ({error}), "
+                           f"retrying in {delay:.1f}s")
+            self._schedule(delivery, delay)
+        else:
+            logger.error(f"Webhook {delivery['id']} to {delivery['url']} failed after "
+                         f"{delivery['attempt']} attempts: {error}")
+            self._finish(delivery, False, error)
+
+    def _finish(self, delivery: Dict[str, Any], delivered: bool, error: Optional[str]):
+        if delivery['on_done']:
+            try:
+                delivery['on_done'](delivered, delivery['attempt'], error)
+            except Exception as e:
+                logger.warning(f"Webhook completion callback failed: {e}")